@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Priority classes, most urgent first
+CRITICAL = 'critical'       # Alerts and herd moves
+NORMAL = 'normal'
+BACKGROUND = 'background'   # Dashboard refreshes
+PRIORITIES = (CRITICAL, NORMAL, BACKGROUND)
+
+DEFAULT_CONCURRENCY = 4     # Requests running at once per endpoint
+DEFAULT_QUEUE_SIZE = 32     # Requests waiting per endpoint
+# Longest a request of each class waits for a slot before it is shed
+DEFAULT_MAX_WAIT = {CRITICAL: 5.0, NORMAL: 1.0, BACKGROUND: 0.25}
+SERVICE_TIME_WEIGHT = 0.1   # EWMA weight of the newest request's slot time
+WAIT_SAMPLES = 1024         # Recent queue waits kept per class for percentiles
+
+
+class Overloaded(RuntimeError):
+    """Raised when a request is shed instead of queued"""
+
+    def __init__(self, endpoint, priority, reason, retry_after):
+        super().__init__(f"{endpoint} is overloaded ({reason})")
+        self.endpoint = endpoint
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('priority', 'event', 'admitted', 'evicted')
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.event = threading.Event()
+        self.admitted = False
+        self.evicted = False
+
+
+class AdmissionGate:
+    """Bounded concurrency and a bounded priority queue for one endpoint
+
+    Up to `concurrency` requests run at once; the rest wait in priority
+    order (FIFO within a class) and a finishing request hands its slot
+    straight to the most urgent waiter. A request is shed with
+    `Overloaded` when it can't be served within its class's `max_wait`:
+    up front, when the queue is full of requests at least as urgent or
+    the observed service time says the wait would be too long, or later,
+    when a more urgent request takes its place in a full queue or its
+    wait times out.
+    """
+
+    def __init__(self, name, concurrency=DEFAULT_CONCURRENCY, queue_size=DEFAULT_QUEUE_SIZE, max_wait=None):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = dict(DEFAULT_MAX_WAIT, **(max_wait or {}))
+        self.running = 0
+        self.service_time = None    # EWMA of seconds a request holds a slot
+
+        self._lock = threading.Lock()
+        self._queue = []            # Heap of (rank, sequence, waiter)
+        self._sequence = itertools.count()
+        self._admitted = dict.fromkeys(PRIORITIES, 0)
+        self._shed = {priority: {} for priority in PRIORITIES}
+        self._waits = {priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITIES}
+
+    def _expected_wait(self, ahead):
+        """Seconds until a request with `ahead` queued in front of it gets a slot"""
+        if self.service_time is None:
+            return 0.0
+        return (ahead + 1) * self.service_time / self.concurrency
+
+    def _reject(self, priority, reason):
+        counts = self._shed[priority]
+        counts[reason] = counts.get(reason, 0) + 1
+        retry_after = max(1, math.ceil(self._expected_wait(len(self._queue))))
+        return Overloaded(self.name, priority, reason, retry_after)
+
+    def acquire(self, priority=NORMAL):
+        """Wait for a slot; returns a token for `release` or raises `Overloaded`"""
+        rank = PRIORITIES.index(priority)
+        queued_at = time.monotonic()
+        with self._lock:
+            if self.running < self.concurrency and not self._queue:
+                self.running += 1
+                self._admitted[priority] += 1
+                self._waits[priority].append(0.0)
+                return queued_at
+
+            ahead = sum(1 for entry in self._queue if entry[0] <= rank)
+            if self._expected_wait(ahead) > self.max_wait[priority]:
+                raise self._reject(priority, 'expected_wait')
+            if len(self._queue) >= self.queue_size:
+                # Make room by shedding the newest of the least urgent waiters, if they rank below us
+                victim = max(self._queue, default=None)
+                if victim is None or victim[0] <= rank:
+                    raise self._reject(priority, 'queue_full')
+                self._queue.remove(victim)
+                heapq.heapify(self._queue)
+                victim[2].evicted = True
+                victim[2].event.set()
+
+            waiter = _Waiter(priority)
+            heapq.heappush(self._queue, (rank, next(self._sequence), waiter))
+
+        waiter.event.wait(self.max_wait[priority])
+        with self._lock:
+            if waiter.admitted:
+                self._admitted[priority] += 1
+                self._waits[priority].append(time.monotonic() - queued_at)
+                return time.monotonic()
+            if waiter.evicted:
+                raise self._reject(priority, 'evicted')
+            self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+            heapq.heapify(self._queue)
+            raise self._reject(priority, 'timeout')
+
+    def release(self, token):
+        """Give up a slot taken at `token`, passing it to the next waiter"""
+        held = time.monotonic() - token
+        with self._lock:
+            if self.service_time is None:
+                self.service_time = held
+            else:
+                self.service_time += SERVICE_TIME_WEIGHT * (held - self.service_time)
+            if self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                waiter.admitted = True
+                waiter.event.set()
+            else:
+                self.running -= 1
+
+    def stats(self):
+        with self._lock:
+            classes = {}
+            for priority in PRIORITIES:
+                waits = np.array(self._waits[priority]) * 1000
+                classes[priority] = {
+                    'admitted': self._admitted[priority],
+                    'shed': dict(self._shed[priority]),
+                    'queued': sum(1 for entry in self._queue if entry[2].priority == priority),
+                    'queue_wait_ms': None if len(waits) == 0 else {
+                        'p50': round(float(np.percentile(waits, 50)), 3),
+                        'p95': round(float(np.percentile(waits, 95)), 3),
+                        'p99': round(float(np.percentile(waits, 99)), 3),
+                        'max': round(float(waits.max()), 3)
+                    }
+                }
+            return {
+                'concurrency': self.concurrency,
+                'queue_size': self.queue_size,
+                'running': self.running,
+                'queued': len(self._queue),
+                'service_time_ms': None if self.service_time is None else round(self.service_time * 1000, 3),
+                'max_wait_ms': {priority: wait * 1000 for priority, wait in self.max_wait.items()},
+                'classes': classes
+            }
+
+
+class AdmissionController:
+    """Admission gates by Flask endpoint name; endpoints without one are not limited
+
+    Limits are per process, so in prefork mode each worker has its own.
+    """
+
+    def __init__(self, endpoints, concurrency=DEFAULT_CONCURRENCY, queue_size=DEFAULT_QUEUE_SIZE, max_wait=None):
+        self.enabled = concurrency > 0
+        self.gates = {
+            endpoint: AdmissionGate(endpoint, concurrency, queue_size, max_wait) for endpoint in endpoints
+        } if self.enabled else {}
+
+    def gate(self, endpoint):
+        return self.gates.get(endpoint)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'endpoints': {endpoint: gate.stats() for endpoint, gate in self.gates.items()}
+        }
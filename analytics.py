@@ -0,0 +1,349 @@
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Summed per herd, zone and period; records counts herd-days of tracking
+MEASURES = ('records', 'grazing_hours', 'distance_traveled_km', 'animals_lost',
+            'predator_encounters', 'constraint_violations')
+SOURCE_COLUMNS = {
+    'grazing_hours': 'grazing_hours',
+    'distance_traveled_km': 'distance_traveled_km',
+    'animals_lost': 'animals_lost',
+    'predator_encounters': 'predator_encounters',
+    'constraint_violations': 'constraint_violation'
+}
+COUNT_MEASURES = ('records', 'animals_lost', 'predator_encounters', 'constraint_violations')
+DIMENSIONS = ('herd', 'zone')
+GRANULARITIES = ('day', 'week', 'month', 'year')
+CUBE_GRANULARITIES = ('week', 'month', 'year')  # Days are read from the date-sorted rows
+CSV_CHUNK_ROWS = 100_000    # Rows parsed at a time when building from a file
+MIN_ROW_CAPACITY = 1024     # Rows allocated up front for the day level
+PERIOD_SLACK = 64           # Spare periods allocated when a cube grows in time
+
+
+class AnalyticsError(ValueError):
+    """Raised for malformed tracking rows or analytics queries"""
+
+
+def day_numbers(dates):
+    """Days since 1970-01-01 of dates or datetime64 values"""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+
+def periods_of(days, granularity):
+    """Period number of day numbers at a granularity; weeks start on Monday"""
+    days = np.asarray(days, dtype=np.int64)
+    if granularity == 'day':
+        return days
+    if granularity == 'week':
+        return (days + 3) // 7
+    unit = 'M' if granularity == 'month' else 'Y'
+    return days.astype('datetime64[D]').astype(f'datetime64[{unit}]').astype(np.int64)
+
+
+def period_start(period, granularity):
+    """Day number of the first day of a period"""
+    if granularity == 'day':
+        return int(period)
+    if granularity == 'week':
+        return int(period) * 7 - 3
+    unit = 'M' if granularity == 'month' else 'Y'
+    return int(np.datetime64(int(period), unit).astype('datetime64[D]').astype(np.int64))
+
+
+def period_label(period, granularity):
+    first = date.fromordinal(date(1970, 1, 1).toordinal() + period_start(period, granularity))
+    if granularity == 'day':
+        return first.isoformat()
+    if granularity == 'week':
+        year, week, _ = first.isocalendar()
+        return f'{year}-W{week:02d}'
+    if granularity == 'month':
+        return first.strftime('%Y-%m')
+    return str(first.year)
+
+
+class TrackingCubes:
+    """Rollups of livestock tracking rows by herd, zone and week, month and year
+
+    Weeks, months and years each have a dense cube of sums indexed
+    [period, herd, zone, measure]; herd and zone ids are coded to cube
+    positions in the order they are first seen. Days are kept as coded
+    rows sorted by date (a dense day cube would be mostly empty, as a
+    herd is in one zone a day). `add` folds new rows into every level,
+    so appending tracking rows costs time in the rows added, not in the
+    history already held.
+
+    A query reads whole periods from the coarsest cube that covers them
+    and only the partial months and days at the ends of its range from
+    finer levels, so its cost depends on the range's shape and the
+    number of groups returned rather than on the number of tracking rows.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.first_day = None
+        self.last_day = None
+        self._herds = {}            # herd_id -> herd position
+        self._zones = {}            # zone_id -> zone position
+        self._origins = dict.fromkeys(CUBE_GRANULARITIES, 0)
+        self._cubes = {g: np.zeros((0, 1, 1, len(MEASURES))) for g in CUBE_GRANULARITIES}
+        self._days = np.zeros(0, dtype=np.int64)    # Day level, sorted by day; capacity beyond self.rows
+        self._day_cells = np.zeros((0, 2), dtype=np.int32)
+        self._day_values = np.zeros((0, len(MEASURES)))
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, path):
+        cubes = cls()
+        for chunk in pd.read_csv(path, chunksize=CSV_CHUNK_ROWS):
+            cubes.add(chunk)
+        return cubes
+
+    # Updates
+
+    @staticmethod
+    def _measures(df):
+        missing = [c for c in ('date', 'herd_id', 'current_zone', *SOURCE_COLUMNS.values()) if c not in df.columns]
+        if missing:
+            raise AnalyticsError(f"Missing tracking column(s): {', '.join(missing)}")
+        values = np.empty((len(df), len(MEASURES)))
+        values[:, 0] = 1
+        try:
+            for i, name in enumerate(MEASURES[1:], start=1):
+                values[:, i] = df[SOURCE_COLUMNS[name]].to_numpy(dtype=float)
+        except (ValueError, TypeError) as e:
+            raise AnalyticsError(f"Unparseable tracking value: {e}")
+        return np.nan_to_num(values)
+
+    @staticmethod
+    def _codes(ids, index):
+        """Cube positions of ids, adding unseen ids to `index`"""
+        for value in pd.unique(ids):
+            index.setdefault(int(value), len(index))
+        # Positions follow insertion order, so they are the ids' places in the index
+        return pd.Index(list(index)).get_indexer(ids)
+
+    def _grow(self, granularity, low, high):
+        """Resize a cube to hold periods [low, high] and every coded herd and zone"""
+        cube = self._cubes[granularity]
+        origin = self._origins[granularity]
+        herds, zones = cube.shape[1], cube.shape[2]
+        new_herds = max(herds, len(self._herds))
+        new_zones = max(zones, len(self._zones))
+        if len(cube) == 0:
+            origin, end = low, low
+        else:
+            end = origin + len(cube)
+        new_origin = origin if low >= origin else low - PERIOD_SLACK
+        new_end = end if high < end else high + 1 + PERIOD_SLACK
+        if (new_origin, new_end, new_herds, new_zones) == (origin, end, herds, zones):
+            return
+        if new_herds > herds:
+            new_herds = max(new_herds, 2 * herds)
+        if new_zones > zones:
+            new_zones = max(new_zones, 2 * zones)
+        grown = np.zeros((new_end - new_origin, new_herds, new_zones, len(MEASURES)))
+        start = origin - new_origin
+        grown[start:start + len(cube), :herds, :zones] = cube
+        self._cubes[granularity] = grown
+        self._origins[granularity] = new_origin
+
+    def _store_days(self, days, cells, values):
+        """Insert coded rows into the day level, keeping it sorted by day"""
+        used = self.rows
+        order = np.argsort(days, kind='stable')
+        days, cells, values = days[order], cells[order], values[order]
+        if used and days[0] < self._days[used - 1]:
+            # Rows older than the newest held: merge (rare for a tracking feed)
+            days = np.concatenate([self._days[:used], days])
+            order = np.argsort(days, kind='stable')
+            days = days[order]
+            cells = np.concatenate([self._day_cells[:used], cells])[order]
+            values = np.concatenate([self._day_values[:used], values])[order]
+            used = 0
+        needed = used + len(days)
+        if needed > len(self._days):
+            capacity = max(needed, 2 * len(self._days), MIN_ROW_CAPACITY)
+            self._days = np.resize(self._days, capacity)
+            self._day_cells = np.resize(self._day_cells, (capacity, 2))
+            self._day_values = np.resize(self._day_values, (capacity, len(MEASURES)))
+        self._days[used:needed] = days
+        self._day_cells[used:needed] = cells
+        self._day_values[used:needed] = values
+
+    def add(self, df):
+        """Fold tracking rows (livestock_tracking.csv columns) into every cube"""
+        if df is None or len(df) == 0:
+            return 0
+        values = self._measures(df)
+        try:
+            days = day_numbers(pd.to_datetime(df['date']).to_numpy())
+            herd_ids = df['herd_id'].to_numpy(dtype=np.int64)
+            zone_ids = df['current_zone'].to_numpy(dtype=np.int64)
+        except (ValueError, TypeError) as e:
+            raise AnalyticsError(f"Unparseable tracking row: {e}")
+
+        with self._lock:
+            herds = self._codes(herd_ids, self._herds)
+            zones = self._codes(zone_ids, self._zones)
+            for granularity in CUBE_GRANULARITIES:
+                periods = periods_of(days, granularity)
+                self._grow(granularity, int(periods.min()), int(periods.max()))
+                np.add.at(self._cubes[granularity],
+                          (periods - self._origins[granularity], herds, zones), values)
+            self._store_days(days, np.stack([herds, zones], axis=1), values)
+            self.rows += len(df)
+            first, last = int(days.min()), int(days.max())
+            self.first_day = first if self.first_day is None else min(self.first_day, first)
+            self.last_day = last if self.last_day is None else max(self.last_day, last)
+        return len(df)
+
+    # Queries
+
+    def _block(self, granularity, low, high):
+        """Cube rows for periods [low, high), zero-filled outside the stored range"""
+        if granularity == 'day':
+            return self._day_block(low, high)
+        cube = self._cubes[granularity]
+        origin = self._origins[granularity]
+        block = np.zeros((max(high - low, 0),) + cube.shape[1:])
+        lo, hi = max(low, origin), min(high, origin + len(cube))
+        if lo < hi:
+            block[lo - low:hi - low] = cube[lo - origin:hi - origin]
+        return block
+
+    def _day_block(self, low, high):
+        """Per-day sums for days [low, high), shaped like a cube block"""
+        block = np.zeros((max(high - low, 0),) + self._cubes['year'].shape[1:])
+        days = self._days[:self.rows]
+        i, j = np.searchsorted(days, [low, high])
+        if i < j:
+            herds, zones = self._day_cells[i:j].T
+            np.add.at(block, (days[i:j] - low, herds, zones), self._day_values[i:j])
+        return block
+
+    def _range_sum(self, start, end):
+        """Sums over days [start, end): whole years and months from their cubes, edge days from the day rows"""
+        first_month = int(periods_of(start, 'month'))
+        if period_start(first_month, 'month') < start:
+            first_month += 1
+        end_month = int(periods_of(end, 'month'))
+        if first_month >= end_month:
+            return self._block('day', start, end).sum(axis=0)
+
+        first_year = -(-first_month // 12)
+        end_year = end_month // 12
+        total = (self._block('day', start, period_start(first_month, 'month')).sum(axis=0)
+                 + self._block('day', period_start(end_month, 'month'), end).sum(axis=0))
+        if first_year >= end_year:
+            return total + self._block('month', first_month, end_month).sum(axis=0)
+        return (total
+                + self._block('month', first_month, first_year * 12).sum(axis=0)
+                + self._block('year', first_year, end_year).sum(axis=0)
+                + self._block('month', end_year * 12, end_month).sum(axis=0))
+
+    def _series(self, granularity, start, end):
+        """[period, herd, zone, measure] sums for each period touching days [start, end)"""
+        first = int(periods_of(start, granularity))
+        last = int(periods_of(end - 1, granularity))
+        series = self._block(granularity, first, last + 1)
+        # Periods cut by the range ends only count the days inside it
+        for position, period in ((0, first), (-1, last)):
+            low, high = period_start(period, granularity), period_start(period + 1, granularity)
+            if low < start or high > end:
+                series[position] = self._range_sum(max(low, start), min(high, end))
+        return first, series
+
+    @staticmethod
+    def _positions(ids, index):
+        if ids is None:
+            return sorted(index)
+        return [i for i in dict.fromkeys(int(i) for i in ids) if i in index]
+
+    def query(self, group_by=(), herds=None, zones=None, start=None, end=None, measures=None):
+        """Measure sums grouped by any of herd, zone and one time granularity
+
+        `herds` and `zones` filter by id and `start`/`end` bound the dates
+        (inclusive). Groups without tracking records are left out.
+        Returns a list of dicts with the group keys and requested measures.
+        """
+        group_by = list(dict.fromkeys(group_by))
+        unknown = [g for g in group_by if g not in DIMENSIONS + GRANULARITIES]
+        if unknown:
+            raise AnalyticsError(f"Unknown group_by {', '.join(unknown)}, expected {list(DIMENSIONS + GRANULARITIES)}")
+        granularities = [g for g in group_by if g in GRANULARITIES]
+        if len(granularities) > 1:
+            raise AnalyticsError("group_by takes at most one of " + ', '.join(GRANULARITIES))
+        granularity = granularities[0] if granularities else None
+        measures = list(MEASURES if measures is None else dict.fromkeys(measures))
+        unknown = [m for m in measures if m not in MEASURES]
+        if unknown:
+            raise AnalyticsError(f"Unknown measure(s) {', '.join(unknown)}, expected {list(MEASURES)}")
+
+        with self._lock:
+            if self.rows == 0:
+                return []
+            first = self.first_day if start is None else max(self.first_day, int(day_numbers(start)))
+            last = self.last_day if end is None else min(self.last_day, int(day_numbers(end)))
+            if first > last:
+                return []
+
+            herd_ids = self._positions(herds, self._herds)
+            zone_ids = self._positions(zones, self._zones)
+            if not herd_ids or not zone_ids:
+                return []
+            if granularity is None:
+                first_period, sums = 0, self._range_sum(first, last + 1)[None]
+            else:
+                first_period, sums = self._series(granularity, first, last + 1)
+
+        herd_axis = np.array([self._herds[h] for h in herd_ids])
+        zone_axis = np.array([self._zones[z] for z in zone_ids])
+        sums = sums[:, herd_axis][:, :, zone_axis]
+        if 'herd' not in group_by:
+            sums = sums.sum(axis=1, keepdims=True)
+        if 'zone' not in group_by:
+            sums = sums.sum(axis=2, keepdims=True)
+
+        groups = np.nonzero(sums[..., 0])
+        values = sums[groups][:, [MEASURES.index(m) for m in measures]]
+        counts = [name in COUNT_MEASURES for name in measures]
+        values[:, counts] = values[:, counts].round()
+        values[:, np.logical_not(counts)] = values[:, np.logical_not(counts)].round(2)
+        labels = {}
+        rows = []
+        for p, h, z, row_values in zip(*groups, values.tolist()):
+            row = {}
+            if granularity is not None:
+                if p not in labels:
+                    labels[p] = period_label(first_period + p, granularity)
+                row[granularity] = labels[p]
+            if 'herd' in group_by:
+                row['herd_id'] = herd_ids[h]
+            if 'zone' in group_by:
+                row['zone_id'] = zone_ids[z]
+            for name, value, count in zip(measures, row_values, counts):
+                row[name] = int(value) if count else value
+            rows.append(row)
+        return rows
+
+    def memory_bytes(self):
+        day_level = self._days.nbytes + self._day_cells.nbytes + self._day_values.nbytes
+        return day_level + sum(cube.nbytes for cube in self._cubes.values())
+
+    def stats(self):
+        with self._lock:
+            span = None
+            if self.rows:
+                span = [period_label(self.first_day, 'day'), period_label(self.last_day, 'day')]
+            return {
+                'rows': self.rows,
+                'herds': sorted(self._herds),
+                'zones': sorted(self._zones),
+                'dates': span,
+                'periods': {g: len(cube) for g, cube in self._cubes.items()},
+                'memory_bytes': self.memory_bytes()
+            }
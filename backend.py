@@ -1,351 +1,514 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, request, jsonify, render_template_string, stream_with_context
 from flask_cors import CORS
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
 import numpy as np
 import pandas as pd
 import os
 from datetime import datetime, timedelta
 import json
+import gc
+import atexit
+import queue
+import threading
+import time
 from collections import defaultdict
+from telemetry import TelemetryStore, ZoneLocator
+from geofence import GeofenceEngine
+from forecast import ClosureForecaster, DEFAULT_HORIZON_DAYS, DEFAULT_SAMPLES
+from reloader import DataWatcher, DEFAULT_RELOAD_INTERVAL
+from timeindex import UnknownLookupModeError, NEAREST, LOOKUP_MODES, check_mode
+from ingest import (IngestError, validate_tracking, append_csv, read_appended_rows, TRACKING_COLUMNS,
+                    DEFAULT_MAX_SHEEP_PER_HECTARE)
+from prediction_cache import PredictionCache, DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL, DEFAULT_RESOLUTION
+from herd_state import HerdStateStore, DEFAULT_HERD, DEFAULT_FLUSH_INTERVAL, DEFAULT_CACHE_HERDS
+from allocation import AllocationError, allocate, zone_capacities, zone_hectares, UNASSIGNED
+from raster import (RasterError, LabelMaskCache, open_bands, zonal_ndvi, vegetation_rows, MIN_COVERAGE,
+                    LABEL_CACHE_DIR)
+from server import PreforkServer, memory_usage
+from admission import (AdmissionController, Overloaded, PRIORITIES, CRITICAL, NORMAL, DEFAULT_CONCURRENCY,
+                       DEFAULT_QUEUE_SIZE)
+from analytics import TrackingCubes, AnalyticsError
+from vision import (FlockDetector, VisionError, DetectorBusy, DetectorUnavailable, RateLimited,
+                    DEFAULT_MODEL_PATH as DEFAULT_DETECTOR_MODEL, DEFAULT_MAX_BATCH, DEFAULT_CAMERA_RATE)
+from profiler import SamplingProfiler, DEFAULT_ENDPOINTS as PROFILED_ENDPOINTS
+from policy_table import PolicyTable, META_FILE as POLICY_TABLE_META
+from regions import (RegionRegistry, UnknownRegionError, load_region_configs, estimate_bytes,
+                     DEFAULT_REGION, DEFAULT_MEMORY_BUDGET_MB, REGIONS_FILE)
+from environment import (EnvironmentalDataManager, InvalidDateError, resolve_date, day_of_year, date_string,
+                         BASE_DATE, DATA_FILES, CONSTRAINTS_FILE, VEGETATION_FILE, WEATHER_FILE)
+from model import torch, load_model, predict_action, predict_probabilities
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variables
-model = None
-model_loaded = False
-env_data = None
-
-class SimpleNetwork(nn.Module):
-    """Recreate the exact same network architecture from your training code"""
-    def __init__(self, state_dim, action_dim, hidden_dim=32):
-        super(SimpleNetwork, self).__init__()
-
-        # Must match your training code exactly
-        self.shared = nn.Sequential(
-            nn.Linear(state_dim, hidden_dim),
-            nn.ReLU(),
-            nn.Linear(hidden_dim, hidden_dim // 2),
-            nn.ReLU()
-        )
+TRACKING_FILE = 'livestock_tracking.csv'  # Rolled up into the analytics cubes
+MAX_HISTORY_DAYS = 3660  # Longest range served by one /zones/history request
 
-        self.actor = nn.Linear(hidden_dim // 2, action_dim)
-        self.critic = nn.Linear(hidden_dim // 2, 1)
+# Seconds between checks of the data files for live reload (0 disables)
+DATA_RELOAD_INTERVAL = float(os.environ.get('DATA_RELOAD_INTERVAL', DEFAULT_RELOAD_INTERVAL))
 
-    def forward(self, state):
-        features = self.shared(state)
-        return features
+# Prefork server workers for `python backend.py` (0 runs the development server)
+SERVER_WORKERS = int(os.environ.get('WORKERS', 0))
 
-    def get_action_probs(self, state):
-        features = self.forward(state)
-        logits = self.actor(features)
-        return F.softmax(logits, dim=-1)
+# Memory kept for loaded regions before the least recently used are evicted
+REGION_MEMORY_BUDGET_MB = int(os.environ.get('REGION_MEMORY_BUDGET_MB', DEFAULT_MEMORY_BUDGET_MB))
 
-    def get_value(self, state):
-        features = self.forward(state)
-        return self.critic(features)
+# How /predict answers: 'model' only, 'table' first (model fallback), or
+# 'auto' (model, falling back to the policy table when it can't be loaded)
+PREDICTION_MODES = ('auto', 'model', 'table')
+PREDICTION_MODE = os.environ.get('PREDICTION_MODE', 'auto')
+if PREDICTION_MODE not in PREDICTION_MODES:
+    raise ValueError(f"PREDICTION_MODE must be one of {PREDICTION_MODES}, got {PREDICTION_MODE!r}")
 
+# Prediction cache per region: entries (0 disables), TTL and state quantisation step
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', DEFAULT_CACHE_TTL))
+PREDICTION_CACHE_RESOLUTION = float(os.environ.get('PREDICTION_CACHE_RESOLUTION', DEFAULT_RESOLUTION))
 
-class EnvironmentalDataManager:
-    """Manages environmental data similar to the testing system"""
-    
-    def __init__(self, data_folder='grazing_data'):
-        self.data_folder = data_folder
-        self.constraints = None
-        self.vegetation_df = None
-        self.weather_df = None
-        self.zone_usage_history = {}
-        self.load_or_generate_data()
-        
-    def load_or_generate_data(self):
-        """Load data or generate if missing, matching your testing system"""
-        try:
-            # Try to load actual data
-            with open(f'{self.data_folder}/grazing_constraints.json', 'r') as f:
-                self.constraints = json.load(f)
-            
-            self.vegetation_df = pd.read_csv(f'{self.data_folder}/vegetation_data.csv')
-            self.vegetation_df['date'] = pd.to_datetime(self.vegetation_df['date'])
-            
-            self.weather_df = pd.read_csv(f'{self.data_folder}/weather_data.csv')
-            self.weather_df['date'] = pd.to_datetime(self.weather_df['date'])
-            
-            print("✅ Environmental data loaded from files")
-            
-        except Exception as e:
-            print(f"⚠️ Could not load data files, generating realistic data: {e}")
-            self.generate_realistic_data()
-    
-    def generate_realistic_data(self):
-        """Generate realistic environmental data matching your model's expectations"""
-        # Constraints from your training system
-        self.constraints = {
-            "zone_restrictions": {
-                "protected_areas": [],
-                "seasonal_closures": {},
-                "weather_based": {
-                    "flood_prone": {"zones": [9], "trigger": "rainfall > 25mm"}
-                }
-            },
-            "carrying_capacity_limits": {
-                "max_consecutive_days": 14,
-                "recovery_period_days": 3
-            }
-        }
-        
-        # Generate dates (weekly data for past year + future)
-        start_date = datetime(2024, 1, 1)
-        end_date = datetime(2024, 12, 31)
-        dates = pd.date_range(start_date, end_date, freq='W')
-        
-        # Generate vegetation data with seasonal patterns
-        veg_data = []
-        for date in dates:
-            day_of_year = date.timetuple().tm_yday
-            # Seasonal NDVI pattern - higher in spring/summer, lower in winter
-            seasonal_factor = 0.3 + 0.4 * (1 + np.cos(2 * np.pi * (day_of_year - 120) / 365)) / 2
-            
-            for zone in range(1, 11):  # 10 zones
-                # Different base quality for different zones
-                if zone == 9:  # Flood prone zone
-                    base_ndvi = 0.2 + np.random.normal(0, 0.05)
-                elif zone in [1, 4, 6]:  # High quality zones
-                    base_ndvi = 0.7 + seasonal_factor + np.random.normal(0, 0.1)
-                elif zone in [5, 8, 10]:  # Poor quality zones  
-                    base_ndvi = 0.3 + seasonal_factor * 0.5 + np.random.normal(0, 0.08)
-                else:  # Medium quality zones
-                    base_ndvi = 0.5 + seasonal_factor * 0.8 + np.random.normal(0, 0.1)
-                
-                ndvi = max(0.15, min(0.95, base_ndvi))
-                
-                veg_data.append({
-                    'date': date,
-                    'zone_id': zone,
-                    'ndvi': ndvi,
-                    'biomass_kg_per_hectare': ndvi * 1200,
-                    'carrying_capacity_sheep_per_hectare': ndvi * 12,
-                    'accessible': np.random.random() > 0.05  # 95% usually accessible
-                })
-        
-        self.vegetation_df = pd.DataFrame(veg_data)
-        
-        # Generate weather data with realistic patterns
-        weather_data = []
-        for date in dates:
-            day_of_year = date.timetuple().tm_yday
-            # Seasonal temperature pattern
-            base_temp = 18 + 8 * np.cos(2 * np.pi * (day_of_year - 200) / 365)
-            temperature = base_temp + np.random.normal(0, 4)
-            
-            # Seasonal rainfall pattern (more in winter/spring)
-            seasonal_rain_factor = 1.5 + 0.8 * np.cos(2 * np.pi * (day_of_year - 60) / 365)
-            rainfall = max(0, np.random.exponential(3) * seasonal_rain_factor)
-            
-            weather_data.append({
-                'date': date,
-                'temperature': temperature,
-                'humidity': 65 + np.random.normal(0, 15),
-                'rainfall': rainfall
-            })
-        
-        self.weather_df = pd.DataFrame(weather_data)
-        print("✅ Generated realistic environmental data")
+# Herd state store: seconds between write-behind flushes and herds cached in memory
+HERD_STATE_FLUSH_INTERVAL = float(os.environ.get('HERD_STATE_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL))
+HERD_STATE_CACHE_HERDS = int(os.environ.get('HERD_STATE_CACHE_HERDS', DEFAULT_CACHE_HERDS))
+
+# Raster scenes readable by /ingest/raster, and where zone label masks are cached
+RASTER_FOLDER = os.environ.get('RASTER_FOLDER', 'rasters')
+RASTER_CACHE_DIR = os.environ.get('RASTER_CACHE_DIR', LABEL_CACHE_DIR)
+
+# Admission control for inference endpoints: concurrent requests (0 disables) and queued requests per endpoint
+ADMITTED_ENDPOINTS = ('predict', 'simulate_day', 'allocate_herds')
+ADMISSION_CONCURRENCY = int(os.environ.get('ADMISSION_CONCURRENCY', DEFAULT_CONCURRENCY))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+
+# Camera frame detector: TorchScript model, frames per model call and frames per second per camera
+DETECTOR_MODEL = os.environ.get('DETECTOR_MODEL', DEFAULT_DETECTOR_MODEL)
+DETECTOR_MAX_BATCH = int(os.environ.get('DETECTOR_MAX_BATCH', DEFAULT_MAX_BATCH))
+DETECTOR_CAMERA_RATE = float(os.environ.get('DETECTOR_CAMERA_RATE', DEFAULT_CAMERA_RATE))
+
+# Shared secret for /admin endpoints (X-Admin-Token header); unset leaves them open
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Push channel settings: pending events per subscriber and keep-alive interval
+EVENT_QUEUE_SIZE = 32
+EVENT_HEARTBEAT_SECONDS = 15
+
+
+class EventBroadcaster:
+    """Fans out server-sent events to all subscribed clients
+
+    With prefork workers, `relay` passes each published event on to the
+    other processes, which hand it to their own subscribers with `deliver`.
+    """
+
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self.relay = None
+
+    def subscribe(self, region_id=None):
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[subscriber] = region_id
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber, None)
+
+    @staticmethod
+    def format_event(event, data):
+        """Serialise one event in SSE wire format"""
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def publish(self, event, data, region=None):
+        """Queue an event for every subscriber of the region, in this process and any others"""
+        self.deliver(event, data, region)
+        if self.relay is not None:
+            self.relay(('event', event, data, region))
+
+    def deliver(self, event, data, region=None):
+        """Serialise the payload once and queue it for this process's subscribers of the region"""
+        message = self.format_event(event, data)
+        with self._lock:
+            subscribers = [
+                subscriber for subscriber, region_id in self._subscribers.items()
+                if region is None or region_id is None or region_id == region
+            ]
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Slow client - drop it, the browser reconnects and resyncs
+                self.unsubscribe(subscriber)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+
+def zone_probabilities(probabilities, zone_count):
+    """Action probabilities as one per zone: extra actions dropped, zones without an action at 0"""
+    probabilities = np.asarray(probabilities, dtype=np.float64)[:zone_count]
+    return np.pad(probabilities, (0, zone_count - len(probabilities)))
+
+
+def mask_inaccessible(prediction, accessible):
+    """Prediction restricted to accessible zones, their probabilities renormalised
+
+    The policy's own choice and probabilities stay under 'policy_action'
+    and 'policy_action_probabilities'. With no accessible zone the
+    prediction is left as it is.
+    """
+    probabilities = zone_probabilities(prediction['action_probabilities'], len(accessible))
+    result = dict(prediction, policy_action=prediction['recommended_action'],
+                  policy_action_probabilities=prediction['action_probabilities'], masked_actions=[])
+    if not accessible.any():
+        return result
     
-    def get_zone_quality(self, zone_id, current_date):
-        """Get zone quality for a specific date, matching your testing system"""
-        # Find closest vegetation data
-        veg_data = self.vegetation_df[
-            (self.vegetation_df['zone_id'] == zone_id + 1) &
-            (abs((self.vegetation_df['date'] - current_date).dt.days) <= 7)
-        ]
-        
-        if len(veg_data) > 0:
-            veg_row = veg_data.iloc[0]
-            ndvi = veg_row['ndvi']
-            carrying_capacity = veg_row['carrying_capacity_sheep_per_hectare']
-            accessible = veg_row['accessible']
-        else:
-            # Fallback values
-            ndvi = 0.6
-            carrying_capacity = 7.0
-            accessible = True
-        
-        # Find closest weather data
-        weather_data = self.weather_df[
-            abs((self.weather_df['date'] - current_date).dt.days) <= 3
-        ]
-        
-        if len(weather_data) > 0:
-            weather_row = weather_data.iloc[0]
-            temperature = weather_row['temperature']
-            rainfall = weather_row['rainfall']
-            humidity = weather_row['humidity']
-        else:
-            temperature = 18
-            rainfall = 2
-            humidity = 65
-        
-        # Determine quality categories
-        if not accessible:
-            quality = 'restricted'
-            risk = 'high'
-        elif ndvi < 0.3:
-            quality = 'poor'
-            risk = 'high'
-        elif ndvi < 0.5:
-            quality = 'fair' 
-            risk = 'medium'
-        elif ndvi < 0.7:
-            quality = 'good'
-            risk = 'low'
+    masked = np.where(accessible, probabilities, 0.0)
+    total = masked.sum()
+    masked = masked / total if total > 0 else accessible / accessible.sum()
+    action = int(masked.argmax())
+    result.update({
+        'recommended_action': action,
+        'confidence': float(masked[action]),
+        'action_probabilities': masked.tolist(),
+        'masked_actions': np.flatnonzero(~accessible).tolist()
+    })
+    return result
+
+
+class Region:
+    """Environmental data, model and live herd state for one grazing region"""
+
+    def __init__(self, region_id, config, shared):
+        self.region_id = region_id
+        self.config = config
+        self.shared = shared
+        self._shared_keys = {}
+        self._update_lock = threading.Lock()  # Serialises reloads and appends
+
+        self.herd_state = HerdStateStore(config['herd_state'], region_id, HERD_STATE_FLUSH_INTERVAL,
+                                         HERD_STATE_CACHE_HERDS)
+        # The zone definitions decide how many zones every per-zone table has
+        self.zone_locator = self._share(config['zones_file'], ZoneLocator.from_zones_file)
+        self.env_data = EnvironmentalDataManager(config['data_folder'], share=self._share,
+                                                 herd_store=self.herd_state,
+                                                 zone_count=self.zone_locator.zone_count)
+        self.geofence = GeofenceEngine(self.zone_locator, self.env_data.constraints, self.env_data.get_weather)
+        self.telemetry = TelemetryStore(self.zone_locator, geofence=self.geofence, state_store=self.herd_state)
+        self.forecaster = ClosureForecaster(self.env_data.weather_df, self.env_data.vegetation_df, self.geofence)
+
+        self.model_path = config['model_path']
+        self.model = None
+        self.model_version = 0
+        self.model_load_failed = False  # Not retried until the model file changes
+        self.prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL,
+                                                PREDICTION_CACHE_RESOLUTION)
+        self.policy_table = None
+        self.policy_table_stale = None
+        self.load_policy_table()
+        self.ensure_model()
+        self.analytics = self.load_analytics()
+
+        if not self.env_data.data_generated:
+            watcher.watch(region_id, config['data_folder'], DATA_FILES, self.reload)
+        watcher.watch(self.model_watch_key, os.path.dirname(self.model_path) or '.',
+                      [os.path.basename(self.model_path)], self.reload_model)
+        watcher.watch(self.tracking_watch_key, config['data_folder'], [TRACKING_FILE], self.reload_tracking)
+        print(f"🗺️ Region '{region_id}' loaded")
+
+    def _share(self, path, loader):
+        key, value = self.shared.acquire(path, loader)
+        if value is None:
+            self.shared.release(key)
+            return None
+
+        # A reloaded file replaces the previous version's reference
+        previous = self._shared_keys.pop(path, None)
+        if previous is not None:
+            self.shared.release(previous)
+        self._shared_keys[path] = key
+        return value
+
+    def reload(self, changed_files):
+        """Rebuild data and derived caches after data files changed on disk"""
+        with self._update_lock:
+            self._reload(changed_files)
+
+    def _reload(self, changed_files):
+        weather, _, affected = self.env_data.reload(changed_files)
+
+        if CONSTRAINTS_FILE in changed_files:
+            self.geofence.set_constraints(self.env_data.constraints)
         else:
-            quality = 'excellent'
-            risk = 'low'
-        
-        # Check for flood risk
-        if (zone_id + 1) in self.constraints["zone_restrictions"]["weather_based"]["flood_prone"]["zones"]:
-            if rainfall > 25:
-                quality = 'restricted'
-                risk = 'high'
-        
-        return {
-            'ndvi': ndvi,
-            'carrying_capacity': carrying_capacity,
-            'temperature': temperature,
-            'rainfall': rainfall,
-            'humidity': humidity,
-            'quality': quality,
-            'risk': risk,
-            'accessible': accessible and quality != 'restricted'
+            self.geofence.invalidate(affected)
+
+        data = self.env_data.data
+        rewritten = {name for name, offset in changed_files.items() if offset is None}
+        if VEGETATION_FILE in rewritten or WEATHER_FILE in rewritten:
+            self.forecaster = ClosureForecaster(data.weather_df, data.vegetation_df, self.geofence)
+        elif WEATHER_FILE in changed_files:
+            # Appended days extend the observed history without refitting
+            self.forecaster.observe(weather)
+
+        self.load_policy_table()
+        self.prediction_cache.clear()
+        print(f"🔄 Region '{self.region_id}' reloaded {sorted(changed_files)}")
+        events.publish('reload', {
+            'region': self.region_id,
+            'files': sorted(changed_files),
+            'affected_dates': None if affected is None else len(affected)
+        }, region=self.region_id)
+
+    def append(self, weather_rows=None, vegetation_rows=None):
+        """Append new daily observations and refresh the caches they affect"""
+        with self._update_lock:
+            weather, vegetation, affected = self.env_data.append(
+                weather_rows, vegetation_rows, zone_count=self.zone_locator.zone_count)
+
+            # Our own writes must not come back as a reload from the watcher
+            watcher.acknowledge(self.region_id, [WEATHER_FILE, VEGETATION_FILE])
+            self.geofence.invalidate(affected)
+            if len(weather):
+                self.forecaster.observe(weather)
+            self.load_policy_table()
+            self.prediction_cache.clear()
+
+        summary = {
+            'region': self.region_id,
+            'weather_rows': len(weather),
+            'vegetation_rows': len(vegetation),
+            'affected_dates': len(affected),
+            'last_weather_date': date_string(self.env_data.data.last_weather_date),
+            'last_vegetation_date': date_string(self.env_data.data.last_vegetation_date)
         }
-    
-    def get_all_zones_data(self, current_date):
-        """Get data for all zones at current date"""
-        zones_data = []
-        for zone_id in range(10):
-            zone_data = self.get_zone_quality(zone_id, current_date)
-            zone_data['zone_id'] = zone_id
-            zones_data.append(zone_data)
-        return zones_data
-    
-    def is_zone_accessible(self, zone_id, current_date):
-        """Check if zone is accessible with constraints"""
-        zone_quality = self.get_zone_quality(zone_id, current_date)
-        
-        if not zone_quality['accessible']:
-            return False, "Environmental restrictions", -20
-        
-        # Check flood risk
-        if ((zone_id + 1) in self.constraints["zone_restrictions"]["weather_based"]["flood_prone"]["zones"] and
-            zone_quality["rainfall"] > 25):
-            return False, "Flood risk", -20
-        
-        # Check consecutive days limit
-        max_days = self.constraints["carrying_capacity_limits"]["max_consecutive_days"]
-        if zone_id in self.zone_usage_history:
-            if self.zone_usage_history[zone_id] >= max_days:
-                return False, "Needs recovery period", -10
-        
-        return True, "Accessible", 0
-    
-    def build_state_vector(self, current_zone, current_day, herd_health, days_in_zone, cumulative_reward=0):
-        """Build state vector exactly as your model expects"""
-        current_date = datetime(2024, 1, 1) + timedelta(days=current_day)
-        zone_quality = self.get_zone_quality(current_zone, current_date)
-        
-        return [
-            current_zone / 9.0,  # Current zone (0-1)
-            current_day / 365.0,  # Day of year (0-1)
-            min(max(zone_quality['temperature'] / 30.0, 0), 1),  # Temperature (0-1)
-            min(zone_quality['rainfall'] / 30.0, 1),  # Rainfall (0-1)
-            zone_quality['ndvi'],  # Vegetation quality (0-1)
-            min(zone_quality['carrying_capacity'] / 15.0, 1),  # Capacity (0-1)
-            herd_health / 100.0,  # Herd health (0-1)
-            min(days_in_zone / 20.0, 1),  # Days in zone (0-1)
-            min(max(cumulative_reward / 500.0, -1), 1),  # Cumulative reward (-1 to 1)
-            min(len(self.zone_usage_history) / 10.0, 1),  # Zone diversity (0-1)
-            np.sin(2 * np.pi * current_day / 365),  # Seasonal cycle
-            (current_day % 7) / 7.0  # Week cycle
-        ]
+        events.publish('ingest', summary, region=self.region_id)
+        return summary
 
+    @property
+    def tracking_path(self):
+        return os.path.join(self.config['data_folder'], TRACKING_FILE)
 
-def load_model():
-    """Load the trained model"""
-    global model, model_loaded
+    @property
+    def tracking_watch_key(self):
+        return f'{self.region_id}:tracking'
 
-    model_path = 'simple_model_final.pth'
+    def load_analytics(self):
+        """Roll the region's livestock tracking history up into analytics cubes"""
+        if not os.path.exists(self.tracking_path):
+            return TrackingCubes()
+        return TrackingCubes.from_csv(self.tracking_path)
 
-    if not os.path.exists(model_path):
-        print(f"❌ Model file '{model_path}' not found!")
-        print("Make sure you have:")
-        print("1. Trained your model and saved it as 'simple_model_final.pth'")
-        print("2. Placed the model file in the same directory as this server")
-        model_loaded = False
-        return False
+    def reload_tracking(self, changed_files):
+        """Fold tracking rows appended by another process into the cubes, or rebuild them after a rewrite"""
+        offset = changed_files[TRACKING_FILE]
+        with self._update_lock:
+            if offset is None:
+                self.analytics = self.load_analytics()
+                added = self.analytics.rows
+            else:
+                added = self.analytics.add(read_appended_rows(self.tracking_path, offset))
+        print(f"🔄 Region '{self.region_id}' {'rebuilt' if offset is None else 'extended'} analytics "
+              f"with {added} tracking rows")
+        events.publish('reload', {
+            'region': self.region_id,
+            'files': [TRACKING_FILE],
+            'affected_dates': None
+        }, region=self.region_id)
 
-    try:
-        # Create model with same parameters as training
-        model = SimpleNetwork(state_dim=12, action_dim=10, hidden_dim=32)
+    def append_tracking(self, rows):
+        """Append new livestock tracking rows and fold them into the cubes"""
+        with self._update_lock:
+            rows = validate_tracking(rows, zone_count=self.zone_locator.zone_count)
+            if len(rows):
+                append_csv(self.tracking_path, rows, TRACKING_COLUMNS)
+                # Our own writes must not come back as a reload from the watcher
+                watcher.acknowledge(self.tracking_watch_key, [TRACKING_FILE])
+                self.analytics.add(rows)
 
-        # Load the saved state
-        checkpoint = torch.load("simple_model_final.pth", map_location="cpu", weights_only=False)
+        summary = {
+            'region': self.region_id,
+            'tracking_rows': len(rows),
+            'total_tracking_rows': self.analytics.rows
+        }
+        events.publish('ingest', summary, region=self.region_id)
+        return summary
 
-        # Handle different save formats
-        if isinstance(checkpoint, dict) and 'policy_state_dict' in checkpoint:
-            model.load_state_dict(checkpoint['policy_state_dict'])
-            print("✅ Loaded model from checkpoint format")
-        else:
-            model.load_state_dict(checkpoint)
-            print("✅ Loaded model from direct state_dict format")
+    def ensure_model(self):
+        """Load the region's model if it is not loaded yet
 
-        model.eval()  # Set to evaluation mode
-        model_loaded = True
+        A failed load is tried only once; the model file watcher tries
+        again when the file changes.
+        """
+        if self.model is not None or self.model_load_failed:
+            return self.model is not None
+        with self._update_lock:
+            if self.model is None and not self.model_load_failed:
+                if os.path.exists(self.model_path):
+                    self.model = self._share(self.model_path, load_model)
+                else:
+                    load_model(self.model_path)  # Reports the missing file
+                self.model_load_failed = self.model is None
+                if self.model is not None:
+                    self.model_version += 1
+                    self.check_model_zones()
+                    events.publish('status', self.status_payload(), region=self.region_id)
+        return self.model is not None
 
-        print("🎯 Model loaded successfully!")
-        return True
+    @property
+    def model_watch_key(self):
+        return f'{self.region_id}:model'
 
-    except Exception as e:
-        print(f"❌ Error loading model: {e}")
-        model_loaded = False
-        return False
+    def reload_model(self, changed_files):
+        """Swap in a retrained checkpoint and drop predictions made by the old one"""
+        with self._update_lock:
+            model = self._share(self.model_path, load_model)
+            if model is None:
+                self.model_load_failed = self.model is None
+                raise Exception(f"could not load {self.model_path}")
+            self.model = model
+            self.model_load_failed = False
+            self.model_version += 1
+            self.check_model_zones()
+            self.prediction_cache.clear()
+            self.load_policy_table()
+        print(f"🔄 Region '{self.region_id}' reloaded model (version {self.model_version})")
+        events.publish('status', self.status_payload(), region=self.region_id)
 
+    def check_model_zones(self):
+        """Warn when the model scores a different number of zones than the region defines"""
+        zone_count = self.zone_locator.zone_count
+        if self.model.action_dim != zone_count:
+            print(f"⚠️ Model for '{self.region_id}' has {self.model.action_dim} actions but the region has "
+                  f"{zone_count} zones; zones beyond its actions score 0")
 
-def predict_action(state_vector):
-    """Use the trained model to predict the best action"""
-    global model
+    def prediction_version(self, source):
+        """Identifies which predictor produced a cached result"""
+        if source == 'table':
+            return ('table', self.policy_table.meta['created_at'])
+        return ('model', self.model_version)
 
-    if not model_loaded or model is None:
-        raise Exception("Model not loaded")
+    def load_policy_table(self):
+        """Map the region's distilled policy table, if any, and check it is still current"""
+        meta_path = os.path.join(self.config['policy_table'], POLICY_TABLE_META)
+        if self.policy_table is None and os.path.exists(meta_path):
+            self.policy_table = self._share(meta_path, PolicyTable.open)
+        if self.policy_table is not None:
+            self.policy_table_stale = self.policy_table.stale_reason(self.model_path, self.config['data_folder'],
+                                                                     self.zone_locator.zone_count)
+            if self.policy_table_stale:
+                print(f"⚠️ Policy table for '{self.region_id}' not used: {self.policy_table_stale}")
 
-    try:
-        # Convert to tensor
-        state_tensor = torch.tensor(state_vector, dtype=torch.float32).unsqueeze(0)
-
-        with torch.no_grad():
-            # Get action probabilities
-            action_probs = model.get_action_probs(state_tensor)
-            state_value = model.get_value(state_tensor)
-
-            # Get the recommended action (highest probability)
-            recommended_action = torch.argmax(action_probs, dim=1).item()
-            confidence = action_probs[0][recommended_action].item()
-
-            return {
-                'recommended_action': int(recommended_action),
-                'confidence': float(confidence),
-                'action_probabilities': [float(x) for x in action_probs[0].tolist()],
-                'state_value': float(state_value.item()),
-                'expected_reward': float(state_value.item())
-            }
+    def uses_policy_table(self, zone, current_date, mode, current_day=None):
+        """Whether /predict should answer from the policy table"""
+        if PREDICTION_MODE == 'model' or self.policy_table is None or self.policy_table_stale:
+            return False
+        if not self.policy_table.covers(zone, current_date, mode, current_day):
+            return False
+        return PREDICTION_MODE == 'table' or not self.ensure_model()
 
-    except Exception as e:
-        raise Exception(f"Prediction error: {str(e)}")
+    def prediction_unavailable(self):
+        """Why predictions that need the model can't be served, or None while it may still load"""
+        if not self.model_load_failed:
+            return None
+        if PREDICTION_MODE == 'model':
+            return 'PREDICTION_MODE is model'
+        if self.policy_table is None:
+            return 'no policy table'
+        if self.policy_table_stale:
+            return f'policy table not used: {self.policy_table_stale}'
+        return 'policy table does not cover this request'
+
+    @property
+    def model_loaded(self):
+        return self.model is not None
+
+    def status_payload(self):
+        """Model readiness as broadcast on the push channel"""
+        return {
+            'region': self.region_id,
+            'model_loaded': self.model_loaded,
+            'env_data_loaded': self.env_data is not None,
+            'snapshot_version': self.env_data.snapshot_version,
+            'policy_table': self.policy_table_status(),
+            'prediction_unavailable': self.prediction_unavailable()
+        }
+
+    def policy_table_status(self):
+        if self.policy_table is None:
+            return None
+        return {
+            'entries': self.policy_table.meta['entries'],
+            'start_date': self.policy_table.meta['start_date'],
+            'stale': self.policy_table_stale,
+            'prediction_mode': PREDICTION_MODE
+        }
+
+    def private_bytes(self):
+        """Memory held by this region alone (shared files are counted once elsewhere)"""
+        total = self.telemetry.memory_bytes() + self.env_data.data.index_bytes() + self.analytics.memory_bytes()
+        if self.env_data.data_generated:
+            total += estimate_bytes(self.env_data.vegetation_df) + estimate_bytes(self.env_data.weather_df)
+        return total
+
+    def close(self):
+        watcher.unwatch(self.region_id)
+        watcher.unwatch(self.model_watch_key)
+        watcher.unwatch(self.tracking_watch_key)
+        self.herd_state.close()
+        for key in self._shared_keys.values():
+            self.shared.release(key)
+        self._shared_keys = {}
+
+
+def current_region():
+    """Region named by the request (?region=, X-Region header or JSON body)
+
+    The region is held until the request ends, so eviction can't close
+    it while the request is still using it.
+    """
+    region_id = request.args.get('region') or request.headers.get('X-Region')
+    if region_id is None and request.is_json:
+        region_id = (request.get_json(silent=True) or {}).get('region')
+    region = regions.hold(region_id or DEFAULT_REGION)
+    g.setdefault('held_regions', []).append(region)
+    return region
+
+
+def zone_context(data, zone_id, current_date, mode):
+    """Copy of a zone's memoised quality for a response"""
+    return data.cached_zone_quality(zone_id, current_date, mode).to_dict(with_id=False)
 
 
-# Initialize environmental data manager
-env_data = EnvironmentalDataManager()
+def current_lookup_mode():
+    """Lookup mode named by the request (?mode= or JSON 'lookup_mode'), nearest by default"""
+    mode = request.args.get('mode')
+    if mode is None and request.is_json:
+        mode = (request.get_json(silent=True) or {}).get('lookup_mode')
+    return check_mode(mode or NEAREST)
+
+
+# Push channel, admission gates, frame detector, data file watcher, profiler and lazily loaded regions
+events = EventBroadcaster()
+admission = AdmissionController(ADMITTED_ENDPOINTS, ADMISSION_CONCURRENCY, ADMISSION_QUEUE_SIZE)
+detector = FlockDetector(DETECTOR_MODEL, max_batch=DETECTOR_MAX_BATCH, camera_rate=DETECTOR_CAMERA_RATE)
+profiler = SamplingProfiler()
+label_masks = LabelMaskCache(RASTER_CACHE_DIR)
+prefork = None  # PreforkServer when serving with workers
+watcher = DataWatcher(DATA_RELOAD_INTERVAL)
+regions = RegionRegistry(
+    load_region_configs(REGIONS_FILE),
+    Region,
+    memory_budget_bytes=REGION_MEMORY_BUDGET_MB * 1024 * 1024
+)
+
+
+@atexit.register
+def flush_herd_state():
+    """Write pending herd updates before the process exits"""
+    for _, region in regions.loaded():
+        region.herd_state.close()
 
 # Routes
 @app.route('/')
@@ -355,71 +518,310 @@ def home():
     # For brevity, I'll include the key JavaScript changes below
     return render_template_string(get_enhanced_html())
 
+def request_priority():
+    """X-Priority header if given, else critical for herd moves and named herds, normal otherwise"""
+    priority = request.headers.get('X-Priority')
+    if priority:
+        return priority.lower()
+    if request.endpoint == 'allocate_herds' or 'herd_id' in (request.get_json(silent=True) or {}):
+        return CRITICAL
+    return NORMAL
+
+@app.before_request
+def admit_request():
+    gate = admission.gate(request.endpoint)
+    if gate is None:
+        return None
+    priority = request_priority()
+    if priority not in PRIORITIES:
+        return jsonify({'error': f'Unknown priority {priority!r}, expected one of {list(PRIORITIES)}'}), 400
+    try:
+        g.admission = (gate, gate.acquire(priority))
+    except Overloaded as e:
+        return jsonify({
+            'error': f'Server busy, retry in {e.retry_after}s',
+            'reason': e.reason,
+            'priority': e.priority
+        }), 503, {'Retry-After': str(e.retry_after)}
+    return None
+
+@app.teardown_request
+def release_admission(exc):
+    admitted = g.pop('admission', None)
+    if admitted is not None:
+        gate, token = admitted
+        gate.release(token)
+
+@app.teardown_request
+def release_regions(exc):
+    for region in g.pop('held_regions', []):
+        regions.release(region)
+
+@app.before_request
+def start_request_profile():
+    # A single attribute check when profiling is off
+    if profiler.active and profiler.should_profile(request.endpoint):
+        g.profile = profiler.begin(request.endpoint, request.full_path)
+
+@app.teardown_request
+def finish_request_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.end(profile)
+
+def admin_denied():
+    """Error response when an admin request lacks the configured token"""
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Admin token required'}), 403
+    return None
+
+@app.route('/admin/profile', methods=['GET'])
+def profile_status():
+    """Profiler state and the most recent profiled requests"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    return jsonify(profiler.stats()), 200
+
+@app.route('/admin/profile/start', methods=['POST'])
+def profile_start():
+    """Profile a sampled fraction of requests, optionally for a fixed window"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        interval_ms = data.get('interval_ms')
+        profiler.start(
+            fraction=float(data.get('fraction', 1.0)),
+            duration=float(data['duration_seconds']) if data.get('duration_seconds') else None,
+            endpoints=data.get('endpoints', PROFILED_ENDPOINTS),
+            interval=float(interval_ms) / 1000 if interval_ms else None
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(profiler.stats()), 200
+
+@app.route('/admin/profile/stop', methods=['POST'])
+def profile_stop():
+    denied = admin_denied()
+    if denied:
+        return denied
+    profiler.stop()
+    return jsonify(profiler.stats()), 200
+
+@app.route('/admin/profile/flamegraph')
+def profile_flamegraph():
+    """Collapsed stacks (flamegraph.pl / speedscope input), aggregated or for ?request=<id>"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    stacks = profiler.collapsed(request.args.get('request', type=int))
+    if stacks is None:
+        return jsonify({'error': 'Unknown profiled request'}), 404
+    return Response(stacks, mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename="profile.folded"'})
+
+@app.errorhandler(UnknownRegionError)
+def unknown_region(e):
+    return jsonify({'error': f'Unknown region {e.args[0]!r}'}), 404
+
+@app.errorhandler(VisionError)
+def bad_frame(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.errorhandler(RateLimited)
+def camera_rate_limited(e):
+    return jsonify({'error': str(e), 'camera_id': e.camera_id}), 429, {'Retry-After': str(e.retry_after)}
+
+@app.errorhandler(DetectorBusy)
+def detector_busy(e):
+    return jsonify({'error': str(e), 'reason': e.reason}), 503, {'Retry-After': str(e.retry_after)}
+
+@app.errorhandler(DetectorUnavailable)
+def detector_unavailable(e):
+    return jsonify({'error': f'Detection unavailable: {e}'}), 503
+
+@app.errorhandler(AnalyticsError)
+def bad_analytics_query(e):
+    return jsonify({'error': str(e)}), 400
+
+@app.errorhandler(UnknownLookupModeError)
+def unknown_lookup_mode(e):
+    return jsonify({'error': f'Unknown lookup mode {e.args[0]!r}, expected one of {list(LOOKUP_MODES)}'}), 400
+
 @app.route('/status')
 def status():
     """Health + model status endpoint"""
-    global model_loaded, env_data
+    region = current_region()
     info = {
-        'model_loaded': bool(model_loaded),
-        'env_data_loaded': env_data is not None,
+        'region': region.region_id,
+        'model_loaded': region.model_loaded,
+        'env_data_loaded': region.env_data is not None,
         'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'regions': regions.stats(),
+        'policy_table': region.policy_table_status(),
+        'prediction_unavailable': region.prediction_unavailable(),
+        'prediction_cache': region.prediction_cache.stats(),
+        'herd_state': region.herd_state.stats(),
+        'admission': admission.stats(),
     }
-    if model_loaded:
+    if region.model_loaded:
         info['model_info'] = {
-            'state_dim': 12,
-            'action_dim': 10,
-            'hidden_dim': 32,
+            'state_dim': region.model.state_dim,
+            'action_dim': region.model.action_dim,
+            'hidden_dim': region.model.hidden_dim,
+            'zone_count': region.zone_locator.zone_count,
         }
     return jsonify(info), 200
 
+@app.route('/workers')
+def worker_health():
+    """Per-worker liveness, load and memory (prefork mode), or this process's"""
+    if prefork is None:
+        rss, private = memory_usage()
+        return jsonify({
+            'mode': 'single',
+            'workers': [{'pid': os.getpid(), 'rss_bytes': rss, 'private_bytes': private}]
+        }), 200
+    workers = prefork.board.snapshot()
+    return jsonify({
+        'mode': 'prefork',
+        'served_by': os.getpid(),
+        'workers': workers,
+        'total_private_bytes': sum(w['private_bytes'] for w in workers)
+    }), 200
+
+@app.route('/events')
+def event_stream():
+    """Server-sent events: model status, day advances and zone changes"""
+    region = current_region()
+    subscriber = events.subscribe(region.region_id)
+    # Current status first so clients never need to poll /status
+    status = EventBroadcaster.format_event('status', region.status_payload())
+    # The stream outlives the request's use of the region; don't keep it from being evicted
+    release_regions(None)
+
+    def generate():
+        try:
+            yield status
+            while True:
+                try:
+                    yield subscriber.get(timeout=EVENT_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            events.unsubscribe(subscriber)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/zones/<int:current_day>')
 def get_zones_data(current_day):
     """Get current environmental data for all zones"""
+    region = current_region()
+    mode = current_lookup_mode()
     try:
-        current_date = datetime(2024, 1, 1) + timedelta(days=current_day)
-        zones_data = env_data.get_all_zones_data(current_date)
-        
-        # Add geographical coordinates (you can adjust these)
-        coordinates = [
-            {"lat": 33.533, "lng": -5.11},
-            {"lat": 33.535, "lng": -5.105},
-            {"lat": 33.537, "lng": -5.115},
-            {"lat": 33.539, "lng": -5.108},
-            {"lat": 33.541, "lng": -5.112},
-            {"lat": 33.531, "lng": -5.102},
-            {"lat": 33.529, "lng": -5.118},
-            {"lat": 33.543, "lng": -5.105},
-            {"lat": 33.527, "lng": -5.108},
-            {"lat": 33.545, "lng": -5.118}
-        ]
+        current_date = resolve_date(current_day, request.args.get('date'))
+        zones = region.env_data.data.zones_for_date(current_date, mode)
         
-        for i, zone in enumerate(zones_data):
-            zone.update(coordinates[i])
-            zone['display_id'] = i + 1
+        # Geographical coordinates from the region's zone definitions
+        centers = region.zone_locator.centers
+        zones_data = zones.to_dicts(lat=centers[:, 0], lng=centers[:, 1], display_id=np.asarray(zones.zone_ids) + 1)
         
+        temperature, rainfall, _ = zones.weather
         return jsonify({
             'zones': zones_data,
             'current_date': current_date.isoformat(),
             'weather_summary': {
-                'avg_temp': np.mean([z['temperature'] for z in zones_data]),
-                'avg_rainfall': np.mean([z['rainfall'] for z in zones_data])
+                'avg_temp': float(temperature),
+                'avg_rainfall': float(rainfall)
+            }
+        }), 200
+        
+    except InvalidDateError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/zones/history')
+def get_zones_history():
+    """Daily per-zone vegetation and weather between two dates, in one batched lookup"""
+    region = current_region()
+    mode = current_lookup_mode()
+    try:
+        start = resolve_date(0, request.args.get('start'))
+        end = resolve_date(364, request.args.get('end'))
+        dates = pd.date_range(start, end, freq='D')
+        if not 0 < len(dates) <= MAX_HISTORY_DAYS:
+            return jsonify({'error': f'Date range must cover 1 to {MAX_HISTORY_DAYS} days'}), 400
+        
+        data = region.env_data.data
+        zone_count = region.zone_locator.zone_count
+        vegetation = data.vegetation_batch(
+            np.arange(zone_count)[:, None], dates.values[None, :], mode)
+        weather = data.weather_batch(dates, mode)
+        
+        zones = [
+            {
+                'zone_id': z,
+                'ndvi': np.round(vegetation['ndvi'][z], 4).tolist(),
+                'carrying_capacity': np.round(vegetation['carrying_capacity'][z], 2).tolist(),
+                'accessible': vegetation['accessible'][z].tolist()
             }
+            for z in range(zone_count)
+        ]
+        return jsonify({
+            'dates': [d.date().isoformat() for d in dates],
+            'mode': mode,
+            'weather': {name: np.round(values, 2).tolist() for name, values in weather.items()},
+            'zones': zones
         }), 200
         
+    except InvalidDateError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/forecast/<int:current_day>')
+def forecast_closures(current_day):
+    """Monte Carlo closure probabilities and expected NDVI per zone"""
+    region = current_region()
+    try:
+        start_date = resolve_date(current_day, request.args.get('date'))
+        horizon = request.args.get('horizon', DEFAULT_HORIZON_DAYS, type=int)
+        samples = request.args.get('samples', DEFAULT_SAMPLES, type=int)
+        seed = request.args.get('seed', type=int)
+        
+        result = region.forecaster.forecast(start_date, horizon=horizon, n_samples=samples, seed=seed)
+        return jsonify(result), 200
+        
+    except InvalidDateError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/predict', methods=['POST'])
 def predict():
     """Enhanced prediction endpoint with environmental context"""
+    region = current_region()
+    env_data = region.env_data
+    mode = current_lookup_mode()
     try:
-        if not model_loaded:
-            load_model()
-        if not model_loaded:
-            return jsonify({'error': 'Model not loaded'}), 503
-
         data = request.get_json() or {}
         
+        # Herds with collar telemetry get their zone state from the latest fixes
+        herd_id = data.get('herd_id', DEFAULT_HERD)
+        herd_state = None
+        if 'herd_id' in data:
+            herd_state = region.telemetry.herd_state(herd_id)
+        if herd_state is not None and herd_state['current_zone'] is not None:
+            data.setdefault('current_zone', herd_state['current_zone'])
+            data.setdefault('days_in_zone', herd_state['days_in_zone'])
+        
         # Extract parameters
         current_zone = data.get('current_zone', 0)
         current_day = data.get('current_day', 150)
@@ -427,21 +829,53 @@ def predict():
         days_in_zone = data.get('days_in_zone', 1)
         cumulative_reward = data.get('cumulative_reward', 0.0)
         
+        # An explicit date may be in any year; the model sees its day of year
+        current_date = resolve_date(current_day, data.get('date'))
+        if data.get('date'):
+            current_day = day_of_year(current_date)
+        
+        # Pin one data snapshot so a concurrent reload can't mix old and new values
+        data = env_data.data
+        usage = env_data.zone_usage(herd_id)
+        
         # Build state vector using environmental data
         state_vector = env_data.build_state_vector(
-            current_zone, current_day, herd_health, days_in_zone, cumulative_reward
+            current_zone, current_day, herd_health, days_in_zone, cumulative_reward, data=data,
+            current_date=current_date, mode=mode, usage=usage
         )
         
-        # Get prediction
-        result = predict_action(state_vector)
+        # Get prediction, from the distilled table when it covers the request
+        if region.uses_policy_table(current_zone, current_date, mode, current_day):
+            source = 'table'
+        elif region.ensure_model():
+            source = 'model'
+        else:
+            return jsonify({'error': 'Model not loaded', 'reason': region.prediction_unavailable()}), 503
+        
+        # Nearly identical states share one cached prediction
+        cache_key = region.prediction_cache.key(state_vector, region.prediction_version(source))
+        prediction = region.prediction_cache.get(cache_key)
+        if prediction is None:
+            if source == 'table':
+                prediction = region.policy_table.predict(
+                    current_zone, current_date, herd_health, days_in_zone, cumulative_reward,
+                    len(usage))
+            else:
+                prediction = predict_action(region.model, state_vector)
+            prediction['prediction_source'] = source
+            region.prediction_cache.put(cache_key, prediction)
+        
+        # Only zones open to this herd today can be recommended
+        result = mask_inaccessible(prediction, env_data.accessible_zones(
+            current_date, data=data, mode=mode, usage=usage))
         
         # Add environmental context
-        current_date = datetime(2024, 1, 1) + timedelta(days=current_day)
-        recommended_zone_quality = env_data.get_zone_quality(result['recommended_action'], current_date)
-        current_zone_quality = env_data.get_zone_quality(current_zone, current_date)
+        recommended_zone_quality = zone_context(data, result['recommended_action'], current_date, mode)
+        current_zone_quality = zone_context(data, current_zone, current_date, mode)
         
         # Check accessibility
-        accessible, reason, penalty = env_data.is_zone_accessible(result['recommended_action'], current_date)
+        accessible, reason, penalty = env_data.is_zone_accessible(
+            result['recommended_action'], current_date, data=data, mode=mode, usage=usage)
         
         result.update({
             'environmental_context': {
@@ -459,33 +893,399 @@ def predict():
         
         return jsonify(result), 200
 
+    except InvalidDateError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def herd_zone_scores(region, herds, current_day, current_date, data, mode, usages):
+    """Policy probability of each zone for each herd, (herds, zones)
+
+    Herds may bring their own 'scores'; the rest go through the prediction
+    cache, with cache misses answered by the policy table or one batched
+    forward pass of the model.
+    """
+    zone_count = region.zone_locator.zone_count
+    scores = np.zeros((len(herds), zone_count))
+    pending = []
+    for i, herd in enumerate(herds):
+        if herd.get('scores') is not None:
+            if len(herd['scores']) != zone_count:
+                raise AllocationError(f"Herd {i}: expected {zone_count} scores")
+            scores[i] = herd['scores']
+            continue
+
+        zone = herd['current_zone']
+        state_vector = region.env_data.build_state_vector(
+            zone, current_day, herd['herd_health'], herd['days_in_zone'], herd['cumulative_reward'],
+            data=data, current_date=current_date, mode=mode, usage=usages[i])
+        if region.uses_policy_table(zone, current_date, mode, current_day):
+            source = 'table'
+        elif region.ensure_model():
+            source = 'model'
+        else:
+            raise Exception(f'Model not loaded: {region.prediction_unavailable()}')
+        cache_key = region.prediction_cache.key(state_vector, region.prediction_version(source))
+        prediction = region.prediction_cache.get(cache_key)
+        if prediction is None and source == 'table':
+            prediction = region.policy_table.predict(
+                zone, current_date, herd['herd_health'], herd['days_in_zone'], herd['cumulative_reward'],
+                len(usages[i]))
+            prediction['prediction_source'] = source
+            region.prediction_cache.put(cache_key, prediction)
+        if prediction is None:
+            pending.append((i, state_vector, cache_key))
+        else:
+            scores[i] = zone_probabilities(prediction['action_probabilities'], zone_count)
+
+    if pending:
+        vectors = [state_vector for _, state_vector, _ in pending]
+        for (i, _, _), probs in zip(pending, predict_probabilities(region.model, vectors)):
+            scores[i] = zone_probabilities(probs, zone_count)
+    return scores
+
+@app.route('/allocate', methods=['POST'])
+def allocate_herds():
+    """Jointly assign herds to zones within carrying capacity, access and rest-day limits"""
+    region = current_region()
+    env_data = region.env_data
+    mode = current_lookup_mode()
+    try:
+        data = request.get_json() or {}
+        current_day = data.get('current_day', 150)
+        current_date = resolve_date(current_day, data.get('date'))
+        if data.get('date'):
+            current_day = day_of_year(current_date)
+        
+        herds = []
+        for i, herd in enumerate(data.get('herds') or []):
+            herd = dict(herd)
+            if 'size' not in herd:
+                raise AllocationError(f"Herd {i} has no size")
+            # Collar telemetry fills in where the herd is, as in /predict
+            state = region.telemetry.herd_state(herd['herd_id']) if 'herd_id' in herd else None
+            if state is not None and state['current_zone'] is not None:
+                herd.setdefault('current_zone', state['current_zone'])
+                herd.setdefault('days_in_zone', state['days_in_zone'])
+            herd.setdefault('current_zone', 0)
+            herd.setdefault('days_in_zone', 1)
+            herd.setdefault('herd_health', 85.0)
+            herd.setdefault('cumulative_reward', 0.0)
+            herds.append(herd)
+        if not herds:
+            raise AllocationError("No herds to allocate")
+        
+        # Pin one data snapshot for the whole allocation
+        snapshot = env_data.data
+        zone_count = region.zone_locator.zone_count
+        zones = snapshot.zones_for_date(current_date, mode)
+        limits = snapshot.constraints["carrying_capacity_limits"]
+        max_days = limits["max_consecutive_days"]
+        
+        # Zone closures apply to every herd; rest periods depend on each herd's history
+        open_zones = env_data.accessible_zones(current_date, data=snapshot, mode=mode, usage={})
+        usages = [env_data.zone_usage(herd['herd_id']) if 'herd_id' in herd else {} for herd in herds]
+        allowed = np.tile(open_zones, (len(herds), 1))
+        for i, (herd, usage) in enumerate(zip(herds, usages)):
+            for zone, days in usage.items():
+                if days >= max_days and 0 <= zone < zone_count:
+                    allowed[i, zone] = False
+            if herd['days_in_zone'] >= max_days and 0 <= herd['current_zone'] < zone_count:
+                allowed[i, herd['current_zone']] = False
+        
+        capacities = zone_capacities(
+            zones.rows['carrying_capacity'], zone_hectares(region.zone_locator.radius_km),
+            limits.get("max_sheep_per_hectare", DEFAULT_MAX_SHEEP_PER_HECTARE), open_zones)
+        scores = herd_zone_scores(region, herds, current_day, current_date, snapshot, mode, usages)
+        sizes = [herd['size'] for herd in herds]
+        assignment, stats = allocate(sizes, scores, allowed, capacities)
+        
+        assignments = []
+        for i, (herd, zone) in enumerate(zip(herds, assignment.tolist())):
+            placed = zone != UNASSIGNED
+            assignments.append({
+                'herd_id': herd.get('herd_id'),
+                'size': herd['size'],
+                'current_zone': herd['current_zone'],
+                'zone_id': zone if placed else None,
+                'display_id': zone + 1 if placed else None,
+                'score': round(float(scores[i, zone]), 4) if placed else None
+            })
+        load = np.zeros(zone_count, dtype=np.int64)
+        counts = np.zeros(zone_count, dtype=np.int64)
+        placed = assignment >= 0
+        np.add.at(load, assignment[placed], np.asarray(sizes)[placed])
+        np.add.at(counts, assignment[placed], 1)
+        
+        return jsonify({
+            'date': current_date.isoformat(),
+            'assignments': assignments,
+            'zones': [
+                {
+                    'zone_id': z,
+                    'capacity': int(capacities[z]),
+                    'assigned_sheep': int(load[z]),
+                    'herds': int(counts[z])
+                }
+                for z in range(zone_count)
+            ],
+            **stats
+        }), 200
+        
+    except AllocationError as e:
+        return jsonify({'error': str(e)}), 400
+    except InvalidDateError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/telemetry/fixes', methods=['POST'])
+def ingest_fixes():
+    """Bulk collar fix ingestion (NDJSON or packed binary records)"""
+    region = current_region()
+    try:
+        payload = request.get_data()
+        if request.mimetype == 'application/octet-stream':
+            fixes = TelemetryStore.parse_binary(payload)
+        else:
+            fixes = TelemetryStore.parse_ndjson(payload)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        summary = region.telemetry.ingest(fixes)
+        if prefork is not None:
+            # Every worker keeps the herd's buffers and alert state
+            prefork.broadcast(('fixes', region.region_id, fixes))
+        for violation in summary['violations']:
+            events.publish('violation', violation, region=region.region_id)
+        return jsonify(summary), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/telemetry/herds/<int:herd_id>')
+def herd_telemetry(herd_id):
+    """Current zone state derived from a herd's collar fixes"""
+    state = current_region().telemetry.herd_state(herd_id)
+    if state is None:
+        return jsonify({'error': f'No telemetry for herd {herd_id}'}), 404
+    return jsonify(state), 200
+
+@app.route('/geofence/violations')
+def geofence_violations():
+    """Most recent geofence violations, newest first"""
+    region = current_region()
+    limit = request.args.get('limit', 100, type=int)
+    recent = list(region.geofence.recent)[-limit:][::-1] if limit > 0 else []
+    return jsonify({'violations': recent, 'count': len(recent)}), 200
+
+@app.route('/ingest', methods=['POST'])
+def ingest_observations():
+    """Append new daily weather and vegetation rows to the region's data"""
+    region = current_region()
+    try:
+        data = request.get_json() or {}
+        summary = region.append(data.get('weather'), data.get('vegetation'))
+        return jsonify(summary), 200
+    except IngestError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/ingest/tracking', methods=['POST'])
+def ingest_tracking():
+    """Append new livestock tracking rows to the region's history and analytics"""
+    region = current_region()
+    try:
+        data = request.get_json() or {}
+        return jsonify(region.append_tracking(data.get('rows') or [])), 200
+    except IngestError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def list_arg(name, cast=str):
+    """Comma-separated query parameter as a list, or None when absent"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return [cast(item.strip()) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise AnalyticsError(f"Invalid {name} {value!r}")
+
+@app.route('/analytics')
+def tracking_analytics():
+    """Tracking measures summed by herd, zone and/or day, week, month or year, from the rollup cubes
+
+    ?group_by=zone,month&herds=1,2&zones=3&start=2024-03-01&end=2024-06-30&measures=animals_lost
+    """
+    region = current_region()
+    started = time.perf_counter()
+    try:
+        start = resolve_date(0, request.args['start']) if request.args.get('start') else None
+        end = resolve_date(0, request.args['end']) if request.args.get('end') else None
+    except ValueError as e:
+        raise AnalyticsError(f"Invalid date: {e}")
+    group_by = list_arg('group_by') or []
+    rows = region.analytics.query(group_by, herds=list_arg('herds', int), zones=list_arg('zones', int),
+                                  start=start, end=end, measures=list_arg('measures'))
+    return jsonify({
+        'region': region.region_id,
+        'group_by': group_by,
+        'start': date_string(start),
+        'end': date_string(end),
+        'rows': rows,
+        'count': len(rows),
+        'query_ms': round((time.perf_counter() - started) * 1000, 3)
+    }), 200
+
+@app.route('/analytics/status')
+def analytics_status():
+    """Size and coverage of the region's analytics cubes"""
+    return jsonify(current_region().analytics.stats()), 200
+
+def raster_path(name):
+    """Path of a scene inside RASTER_FOLDER; names can't reach outside it"""
+    folder = os.path.realpath(RASTER_FOLDER)
+    path = os.path.realpath(os.path.join(folder, name))
+    if os.path.commonpath([folder, path]) != folder:
+        raise RasterError(f"{name} is outside the raster folder")
+    if not os.path.exists(path):
+        raise RasterError(f"{name} not found")
+    return path
+
+@app.route('/ingest/raster', methods=['POST'])
+def ingest_raster():
+    """Append per-zone NDVI computed from a local raster scene"""
+    denied = admin_denied()
+    if denied:
+        return denied
+    region = current_region()
+    try:
+        data = request.get_json() or {}
+        if not data.get('date'):
+            raise IngestError("date is required")
+        paths = [raster_path(data[band]) if data.get(band) else None for band in ('ndvi', 'red', 'nir')]
+        ndvi, red, nir = open_bands(*paths)
+        stats = zonal_ndvi(region.zone_locator, ndvi=ndvi, red=red, nir=nir,
+                           scale=float(data.get('scale', 1.0)), offset=float(data.get('offset', 0.0)),
+                           label_cache=label_masks)
+        rows = vegetation_rows(stats, data['date'], float(data.get('min_coverage', MIN_COVERAGE)))
+        summary = region.append(vegetation_rows=rows)
+        summary['zonal_stats'] = stats.astype(object).where(stats.notna(), None).to_dict('records')
+        summary['seconds'] = stats.attrs['seconds']
+        return jsonify(summary), 200
+    except (IngestError, RasterError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def detect_frame():
+    """Detections for the request's frame (multipart 'file' or a raw image body)"""
+    upload = request.files.get('file')
+    data = upload.read() if upload is not None else request.get_data()
+    camera_id = request.form.get('camera_id') or request.headers.get('X-Camera-Id') or request.remote_addr
+    return detector.detect(camera_id, data)
+
+@app.route('/detect_predators', methods=['POST'])
+def detect_predators():
+    """Sheep count, predators and boxes (percent of the frame) for one camera frame"""
+    return jsonify(detect_frame()), 200
+
+@app.route('/flock/count', methods=['POST'])
+def count_flock():
+    """Sheep in one camera frame, without the boxes"""
+    result = detect_frame()
+    return jsonify({
+        'camera_id': result['camera_id'],
+        'sheep_count': result['sheep_count'],
+        'predator_count': len(result['predators_detected']),
+        'timing_ms': result['timing_ms']
+    }), 200
+
+@app.route('/detector/status')
+def detector_status():
+    """Detector model, queue, batching, throughput and latency"""
+    detector.load()
+    return jsonify(detector.stats()), 200
+
 @app.route('/simulate_day', methods=['POST'])
 def simulate_day():
     """Simulate moving to next day with environmental changes"""
+    region = current_region()
+    env_data = region.env_data
     try:
         data = request.get_json() or {}
         current_day = data.get('current_day', 150)
         selected_zone = data.get('selected_zone', 0)
+        since_version = data.get('since_version')
+        herd_id = data.get('herd_id', DEFAULT_HERD)
         
-        # Update zone usage history
-        env_data.zone_usage_history[selected_zone] = env_data.zone_usage_history.get(selected_zone, 0) + 1
+        # Update zone usage history (written to the herd store in the background)
+        env_data.record_zone_day(selected_zone, herd_id)
         
         # Calculate new day and get updated environmental conditions
-        new_day = (current_day + 1) % 365
-        new_date = datetime(2024, 1, 1) + timedelta(days=new_day)
+        if data.get('date'):
+            # Dated simulations run on across year boundaries
+            new_date = resolve_date(current_day, data['date']) + timedelta(days=1)
+            new_day = day_of_year(new_date)
+        else:
+            new_day = (current_day + 1) % 365
+            new_date = BASE_DATE + timedelta(days=new_day)
         
-        zones_data = env_data.get_all_zones_data(new_date)
+        previous_version = env_data.snapshot_version
+        version, snapshot = env_data.publish_snapshot(new_date)
         
-        return jsonify({
+        # Push the day advance and changed zones to subscribed dashboards
+        events.publish('day', {
             'new_day': new_day,
             'new_date': new_date.isoformat(),
-            'zones': zones_data,
-            'zone_usage_history': dict(env_data.zone_usage_history)
-        }), 200
+            'version': version
+        }, region=region.region_id)
+        if version != previous_version:
+            changes = env_data.snapshot_delta(previous_version, version)
+            if changes is None:
+                changes = {'zones': snapshot['zones'].to_dicts(), 'zone_usage_history': snapshot['usage']}
+            events.publish('zones', {
+                'day': new_day,
+                'version': version,
+                'base_version': previous_version,
+                'zones': changes['zones'],
+                'zone_usage_history': changes['zone_usage_history']
+            }, region=region.region_id)
+        response = {
+            'new_day': new_day,
+            'new_date': new_date.isoformat(),
+            'version': version
+        }
         
+        # Send only what changed since the version the client last saw
+        delta = None
+        if since_version is not None:
+            delta = env_data.snapshot_delta(since_version, version)
+        if delta is not None:
+            response.update({
+                'delta': True,
+                'base_version': since_version,
+                'zones': delta['zones'],
+                'zone_usage_history': delta['zone_usage_history']
+            })
+        else:
+            response.update({
+                'delta': False,
+                'zones': snapshot['zones'].to_dicts(),
+                'zone_usage_history': snapshot['usage']
+            })
+        if herd_id != DEFAULT_HERD:
+            # Snapshots track the default herd; a named herd gets its own history
+            response['herd_id'] = herd_id
+            response['herd_zone_usage'] = env_data.zone_usage(herd_id)
+        
+        return jsonify(response), 200
+        
+    except InvalidDateError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -500,6 +1300,7 @@ def get_enhanced_html():
         let environmentalData = null;
         let currentDay = 150;
         let zoneUsageHistory = {};
+        let modelLoaded = false;
         
         // Load environmental data for current day
         async function loadEnvironmentalData(day = currentDay) {
@@ -662,18 +1463,77 @@ def get_enhanced_html():
             }
         }
         
+        // Subscribe to server pushes instead of polling
+        function subscribeToServerEvents() {
+            const source = new EventSource('/events');
+            source.addEventListener('status', (event) => {
+                modelLoaded = JSON.parse(event.data).model_loaded;
+            });
+            source.addEventListener('day', (event) => {
+                const data = JSON.parse(event.data);
+                currentDay = data.new_day;
+                document.getElementById('current-day').textContent = `Day ${currentDay}`;
+                loadEnvironmentalData(currentDay);
+            });
+            source.onerror = () => checkServerStatus();
+        }
+        
         // Initialize with environmental data
         document.addEventListener('DOMContentLoaded', function() {
             initMap();
             loadEnvironmentalData();
             checkServerStatus();
-            setInterval(checkServerStatus, 5000);
+            subscribeToServerEvents();
         });
     </script>
     '''
 
+def freeze_shared_state():
+    """Keep the collector off objects inherited by workers, so their pages stay shared"""
+    gc.collect()
+    gc.freeze()
+
+def init_worker(slot):
+    if torch is not None:
+        # Workers split the cores instead of each running a full thread pool
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // SERVER_WORKERS))
+
+def close_worker(slot):
+    for _, region in regions.loaded():
+        region.herd_state.close()
+
+def apply_relayed(message):
+    """Apply an event or telemetry batch that another prefork process accepted"""
+    kind = message[0]
+    if kind == 'event':
+        _, event, data, region_id = message
+        events.deliver(event, data, region=region_id)
+    elif kind == 'fixes':
+        _, region_id, fixes = message
+        # Regions not loaded here rebuild herd zone state from the herd store when they load
+        region = regions.peek(region_id)
+        if region is not None:
+            region.telemetry.ingest(fixes, replica=True)
+
 if __name__ == '__main__':
-    # Load model and initialize
-    load_model()
+    # Load the default region (data and model) before serving
+    region = regions.get(DEFAULT_REGION)
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    if SERVER_WORKERS > 0:
+        # Zones for the model's year are memoised once here instead of in every worker
+        for day in range(365):
+            region.env_data.data.zones_for_date(BASE_DATE + timedelta(days=day))
+        # So is the detector model, if there is one
+        detector.load()
+        # The master watches the data files; a reload there restarts the workers on it
+        # Pushed events and collar fixes are relayed through the master to every worker
+        prefork = PreforkServer(app, port=port, workers=SERVER_WORKERS, before_fork=freeze_shared_state,
+                                worker_init=init_worker, worker_exit=close_worker,
+                                poll=watcher.poll, poll_interval=DATA_RELOAD_INTERVAL, stream_paths=('/events',),
+                                on_message=apply_relayed)
+        events.relay = prefork.broadcast
+        prefork.run()
+    else:
+        if DATA_RELOAD_INTERVAL > 0:
+            watcher.start()
+        app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -4,9 +4,29 @@ import json
 from datetime import datetime, timedelta
 import os
 
+DEFAULT_ZONES_FILE = 'public/zones.json'
+DEFAULT_ZONE_COUNT = 10  # Zones generated when there is no zones file
+
+
+def load_zone_ids(zones_file):
+    """1-based zone ids from the zone definitions, or the default ten zones"""
+    if zones_file and os.path.exists(zones_file):
+        with open(zones_file, 'r') as f:
+            return np.array(sorted(zone['id'] for zone in json.load(f)))
+    return np.arange(1, DEFAULT_ZONE_COUNT + 1)
+
+
 class GrazingDataGenerator:
-    def __init__(self, output_folder='grazing_data'):
+    def __init__(self, output_folder='grazing_data', zones_file=DEFAULT_ZONES_FILE, years=1, herds=3,
+                 grid_size=50, zone_count=None):
+        """`zone_count`, if given, replaces the zones file with zones 1..zone_count"""
         self.output_folder = output_folder
+        self.zone_ids = load_zone_ids(zones_file) if zone_count is None else np.arange(1, zone_count + 1)
+        self.years = years            # Calendar years generated from 2024
+        self.herds = herds            # Herds tracked
+        self.grid_size = grid_size    # Topography points per side
+        # Larger ranges repeat the constraints of the first ten zones
+        self.zone_profile = (self.zone_ids - 1) % 10 + 1
         self.create_output_folder()
 
         # First generate constraints, then use them in data generation
@@ -17,31 +37,35 @@ class GrazingDataGenerator:
         if not os.path.exists(self.output_folder):
             os.makedirs(self.output_folder)
 
+    def profile_zones(self, profiles):
+        """Ids of the zones laid out like the given zones of the first ten"""
+        return self.zone_ids[np.isin(self.zone_profile, profiles)].tolist()
+
     def generate_constraints(self):
         """Generate realistic grazing constraints for the region"""
         constraints = {
             "zone_restrictions": {
-                "protected_areas": [8, 9],  # Zones 8 and 9 are nature reserves
+                "protected_areas": self.profile_zones([8, 9]),  # Zones 8 and 9 are nature reserves
                 "seasonal_closures": {
                     "breeding_season": {
-                        "zones": [3, 7],
+                        "zones": self.profile_zones([3, 7]),
                         "months": [4, 5, 6],  # April-June breeding season
                         "reason": "Wildlife breeding protection"
                     },
                     "vegetation_recovery": {
-                        "zones": [1, 2, 5],
+                        "zones": self.profile_zones([1, 2, 5]),
                         "months": [2, 3],  # Feb-March recovery period
                         "reason": "Vegetation recovery period"
                     }
                 },
                 "weather_based": {
                     "flood_prone": {
-                        "zones": [4, 6],
+                        "zones": self.profile_zones([4, 6]),
                         "trigger": "rainfall > 15mm",
                         "reason": "Flood risk"
                     },
                     "extreme_temperature": {
-                        "zones": [0, 1, 2],  # Higher elevation zones
+                        "zones": self.profile_zones([1, 2]),  # Higher elevation zones
                         "trigger": "temperature < 5C",
                         "reason": "Cold weather protection"
                     }
@@ -54,11 +78,11 @@ class GrazingDataGenerator:
             },
             "water_access_requirements": {
                 "max_distance_from_water_km": 2.0,
-                "zones_without_water": [8, 9]  # These zones lack water sources
+                "zones_without_water": self.profile_zones([8, 9])  # These zones lack water sources
             },
             "terrain_restrictions": {
                 "max_slope_degrees": 25,
-                "unsafe_terrain_zones": [9]  # Rocky/dangerous terrain
+                "unsafe_terrain_zones": self.profile_zones([9])  # Rocky/dangerous terrain
             }
         }
 
@@ -68,40 +92,42 @@ class GrazingDataGenerator:
 
         return constraints
 
-    def is_zone_accessible(self, zone_id, date, weather_data=None):
-        """Check if a zone is accessible based on constraints"""
-        month = date.month
-
-        # Check protected areas
-        if zone_id in self.constraints["zone_restrictions"]["protected_areas"]:
-            return False, "Protected area"
+    def zones_accessible(self, date, weather_data=None):
+        """Check every zone against the constraints at once: (accessible, reasons) arrays over zone_ids"""
+        restrictions = self.constraints["zone_restrictions"]
 
-        # Check seasonal closures
-        seasonal = self.constraints["zone_restrictions"]["seasonal_closures"]
-        for closure_name, closure_data in seasonal.items():
-            if zone_id in closure_data["zones"] and month in closure_data["months"]:
-                return False, closure_data["reason"]
+        # Protected areas, then seasonal closures
+        checks = [(restrictions["protected_areas"], "Protected area")]
+        for closure_name, closure_data in restrictions["seasonal_closures"].items():
+            if date.month in closure_data["months"]:
+                checks.append((closure_data["zones"], closure_data["reason"]))
 
-        # Check weather-based restrictions if weather data provided
+        # Weather-based restrictions if weather data provided
         if weather_data:
-            weather_restrictions = self.constraints["zone_restrictions"]["weather_based"]
-
-            # Flood check
-            if (zone_id in weather_restrictions["flood_prone"]["zones"] and
-                weather_data.get("rainfall", 0) > 15):
-                return False, weather_restrictions["flood_prone"]["reason"]
+            weather_restrictions = restrictions["weather_based"]
+            if weather_data.get("rainfall", 0) > 15:
+                flood = weather_restrictions["flood_prone"]
+                checks.append((flood["zones"], flood["reason"]))
+            if weather_data.get("temperature", 20) < 5:
+                cold = weather_restrictions["extreme_temperature"]
+                checks.append((cold["zones"], cold["reason"]))
+
+        # A zone failing several checks reports the first
+        reasons = np.full(len(self.zone_ids), "Accessible", dtype=object)
+        for zones, reason in reversed(checks):
+            reasons[np.isin(self.zone_ids, zones)] = reason
+        return reasons == "Accessible", reasons
 
-            # Temperature check
-            if (zone_id in weather_restrictions["extreme_temperature"]["zones"] and
-                weather_data.get("temperature", 20) < 5):
-                return False, weather_restrictions["extreme_temperature"]["reason"]
-
-        return True, "Accessible"
+    def is_zone_accessible(self, zone_id, date, weather_data=None):
+        """Check if a zone is accessible based on constraints"""
+        accessible, reasons = self.zones_accessible(date, weather_data)
+        position = int(np.searchsorted(self.zone_ids, zone_id))
+        return bool(accessible[position]), reasons[position]
 
     def generate_weather_data(self):
         """Generate weather data for the region"""
         start_date = datetime(2024, 1, 1)
-        end_date = datetime(2024, 12, 31)
+        end_date = datetime(2024 + self.years - 1, 12, 31)
 
         weather_data = []
         current_date = start_date
@@ -150,82 +176,69 @@ class GrazingDataGenerator:
         start_date = datetime(2024, 1, 1)
         vegetation_data = []
 
+        weather_dates = pd.to_datetime(weather_df['date'])
+        weather_weeks = weather_dates.dt.isocalendar().week
+
         # Generate weekly data for each zone
-        for week in range(52):
+        for week in range(52 * self.years):
             current_date = start_date + timedelta(weeks=week)
 
-            # Get weather data for this week
+            # Get weather data for this week (its ISO week number within its generated year)
             week_weather = weather_df[
-                pd.to_datetime(weather_df['date']).dt.isocalendar().week == week + 1
+                (weather_weeks == week % 52 + 1) & (weather_dates.dt.year == start_date.year + week // 52)
             ]
             avg_temp = week_weather['temperature'].mean() if len(week_weather) > 0 else 15
             total_rainfall = week_weather['rainfall'].sum() if len(week_weather) > 0 else 0
 
-            for zone_id in range(1, 11):  # Zones 1-10
-                # Check if zone is accessible
-                accessible, reason = self.is_zone_accessible(
-                    zone_id, current_date,
-                    {"temperature": avg_temp, "rainfall": total_rainfall}
-                )
-
-                if accessible:
-                    # Normal vegetation calculation
-                    # Seasonal NDVI pattern
-                    month = current_date.month
-                    if month in [3, 4, 5]:  # Spring - best grazing
-                        base_ndvi = 0.7
-                    elif month in [9, 10, 11]:  # Autumn - good grazing
-                        base_ndvi = 0.6
-                    elif month in [12, 1, 2]:  # Winter - poor grazing
-                        base_ndvi = 0.3
-                    else:  # Summer - moderate grazing
-                        base_ndvi = 0.4
-
-                    # Weather effects on vegetation
-                    temp_factor = 1 - abs(avg_temp - 20) / 30
-                    rain_factor = min(total_rainfall / 20, 1.0)
-
-                    ndvi = base_ndvi * temp_factor * rain_factor
-                    ndvi = np.clip(ndvi + np.random.normal(0, 0.05), 0, 1)
-
-                    # Zone-specific adjustments
-                    if zone_id in [8, 9]:  # Higher elevation zones
-                        ndvi *= 0.8
-                    elif zone_id in [4, 6]:  # Flood-prone areas - better soil
-                        ndvi *= 1.1
-
-                    biomass = ndvi * 1200  # kg per hectare
-                    carrying_capacity = min(ndvi * 12, self.constraints["carrying_capacity_limits"]["max_sheep_per_hectare"])
-
-                    # Grass quality based on NDVI
-                    if ndvi > 0.6:
-                        grass_quality = 'excellent'
-                    elif ndvi > 0.4:
-                        grass_quality = 'good'
-                    elif ndvi > 0.2:
-                        grass_quality = 'poor'
-                    else:
-                        grass_quality = 'very_poor'
-
-                else:
-                    # Restricted zone - set poor values
-                    ndvi = 0.0
-                    biomass = 0.0
-                    carrying_capacity = 0.0
-                    grass_quality = 'restricted'
-
-                vegetation_data.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'zone_id': zone_id,
-                    'ndvi': round(ndvi, 3),
-                    'biomass_kg_per_hectare': round(biomass, 1),
-                    'carrying_capacity_sheep_per_hectare': round(carrying_capacity, 1),
-                    'grass_quality': grass_quality,
-                    'accessible': accessible,
-                    'restriction_reason': reason if not accessible else None
-                })
-
-        df = pd.DataFrame(vegetation_data)
+            # Check which zones are accessible
+            accessible, reasons = self.zones_accessible(
+                current_date, {"temperature": avg_temp, "rainfall": total_rainfall}
+            )
+
+            # Normal vegetation calculation, for all zones at once
+            # Seasonal NDVI pattern
+            month = current_date.month
+            if month in [3, 4, 5]:  # Spring - best grazing
+                base_ndvi = 0.7
+            elif month in [9, 10, 11]:  # Autumn - good grazing
+                base_ndvi = 0.6
+            elif month in [12, 1, 2]:  # Winter - poor grazing
+                base_ndvi = 0.3
+            else:  # Summer - moderate grazing
+                base_ndvi = 0.4
+
+            # Weather effects on vegetation
+            temp_factor = 1 - abs(avg_temp - 20) / 30
+            rain_factor = min(total_rainfall / 20, 1.0)
+
+            ndvi = base_ndvi * temp_factor * rain_factor
+            ndvi = np.clip(ndvi + np.random.normal(0, 0.05, len(self.zone_ids)), 0, 1)
+
+            # Zone-specific adjustments
+            ndvi *= np.select([np.isin(self.zone_profile, [8, 9]),   # Higher elevation zones
+                               np.isin(self.zone_profile, [4, 6])],  # Flood-prone areas - better soil
+                              [0.8, 1.1], default=1.0)
+
+            biomass = ndvi * 1200  # kg per hectare
+            carrying_capacity = np.minimum(ndvi * 12, self.constraints["carrying_capacity_limits"]["max_sheep_per_hectare"])
+
+            # Grass quality based on NDVI
+            grass_quality = np.select([ndvi > 0.6, ndvi > 0.4, ndvi > 0.2],
+                                      ['excellent', 'good', 'poor'], default='very_poor')
+
+            # Restricted zones - set poor values
+            vegetation_data.append(pd.DataFrame({
+                'date': current_date.strftime('%Y-%m-%d'),
+                'zone_id': self.zone_ids,
+                'ndvi': np.where(accessible, ndvi, 0.0).round(3),
+                'biomass_kg_per_hectare': np.where(accessible, biomass, 0.0).round(1),
+                'carrying_capacity_sheep_per_hectare': np.where(accessible, carrying_capacity, 0.0).round(1),
+                'grass_quality': np.where(accessible, grass_quality, 'restricted'),
+                'accessible': accessible,
+                'restriction_reason': np.where(accessible, None, reasons)
+            }))
+
+        df = pd.concat(vegetation_data, ignore_index=True)
         df.to_csv(f'{self.output_folder}/vegetation_data.csv', index=False)
         return df
 
@@ -234,12 +247,12 @@ class GrazingDataGenerator:
         livestock_data = []
         start_date = datetime(2024, 1, 1)
 
-        # Track 3 herds
-        for herd_id in range(1, 4):
+        # Track the herds
+        for herd_id in range(1, self.herds + 1):
             current_zone = np.random.choice([1, 2, 3])  # Start in accessible zones
             days_in_zone = 0
 
-            for day in range(365):
+            for day in range(365 * self.years):
                 current_date = start_date + timedelta(days=day)
 
                 # Get weather for this day
@@ -260,13 +273,10 @@ class GrazingDataGenerator:
                 max_days = self.constraints["carrying_capacity_limits"]["max_consecutive_days"]
                 if not accessible or days_in_zone >= max_days:
                     # Find accessible zone
-                    possible_zones = []
-                    for test_zone in range(1, 11):
-                        zone_accessible, _ = self.is_zone_accessible(test_zone, current_date, weather_data)
-                        if zone_accessible:
-                            possible_zones.append(test_zone)
+                    zones_accessible, _ = self.zones_accessible(current_date, weather_data)
+                    possible_zones = self.zone_ids[zones_accessible]
 
-                    if possible_zones:
+                    if len(possible_zones):
                         current_zone = np.random.choice(possible_zones)
                         days_in_zone = 1
                     else:
@@ -320,23 +330,25 @@ class GrazingDataGenerator:
         topo_data = []
 
         # Generate grid points across the region
-        lat_range = np.linspace(33.5, 33.6, 50)  # Ifrane region
-        lon_range = np.linspace(-5.2, -5.0, 50)
+        lat_range = np.linspace(33.5, 33.6, self.grid_size)  # Ifrane region
+        lon_range = np.linspace(-5.2, -5.0, self.grid_size)
 
         for i, lat in enumerate(lat_range):
             for j, lon in enumerate(lon_range):
-                # Determine which zone this point belongs to
-                zone_id = ((i // 5) % 10) + 1
+                # Determine which zone this point belongs to: rows are split evenly across the zones
+                position = i * len(self.zone_ids) // self.grid_size
+                zone_id = self.zone_ids[position]
 
                 # Base elevation (Ifrane is mountainous)
                 base_elevation = 1650 + np.random.normal(0, 200)
 
                 # Zone-specific elevation adjustments
-                if zone_id in [8, 9]:  # Higher, more dangerous zones
+                profile = self.zone_profile[position]
+                if profile in [8, 9]:  # Higher, more dangerous zones
                     elevation = base_elevation + 300
                     slope = np.random.uniform(15, 35)
                     terrain_type = 'mountainous'
-                elif zone_id in [4, 6]:  # Lower, flatter zones
+                elif profile in [4, 6]:  # Lower, flatter zones
                     elevation = base_elevation - 100
                     slope = np.random.uniform(2, 12)
                     terrain_type = 'valley'
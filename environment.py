@@ -0,0 +1,627 @@
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from timeindex import TimeSeriesIndex, ZoneTimeIndex, NEAREST, to_days, from_day
+from ingest import (validate_weather, validate_vegetation, append_csv, read_appended_rows, WEATHER_COLUMNS,
+                    VEGETATION_COLUMNS, DEFAULT_MAX_SHEEP_PER_HECTARE)
+from herd_state import HerdStateStore, DEFAULT_HERD
+from zone_quality import ZoneTable
+
+# Number of published environment snapshots kept for delta responses
+SNAPSHOT_HISTORY = 64
+
+# Data files watched for live reload, and the +/- day windows used by lookups
+CONSTRAINTS_FILE = 'grazing_constraints.json'
+VEGETATION_FILE = 'vegetation_data.csv'
+WEATHER_FILE = 'weather_data.csv'
+VEGETATION_WINDOW_DAYS = 7
+WEATHER_WINDOW_DAYS = 3
+DATA_FILES = (CONSTRAINTS_FILE, VEGETATION_FILE, WEATHER_FILE)
+
+# Columns held in the time indexes, and the values used where there is no data
+WEATHER_INDEX_COLUMNS = ('temperature', 'rainfall', 'humidity')
+VEGETATION_INDEX_COLUMNS = ('ndvi', 'carrying_capacity_sheep_per_hectare', 'accessible')
+DEFAULT_WEATHER = {'temperature': 18, 'rainfall': 2, 'humidity': 65}
+DEFAULT_VEGETATION = {'ndvi': 0.6, 'carrying_capacity': 7.0, 'accessible': True}
+
+# Zones generated when there are neither zone definitions nor data files
+DEFAULT_ZONE_COUNT = 10
+
+# Requests that give a day number instead of a date count from here
+BASE_DATE = datetime(2024, 1, 1)
+
+
+class InvalidDateError(ValueError):
+    """Raised when a request gives a date that is not YYYY-MM-DD"""
+
+
+def changed_dates(old_df, new_df, window_days):
+    """Calendar dates whose lookups can differ between two versions of a dated table
+
+    Rows present in only one version mark their date as changed; lookups
+    search +/- window_days around a date, so the window is included too.
+    """
+    columns = [c for c in new_df.columns if c in old_df.columns]
+    diff = pd.concat([old_df[columns], new_df[columns]]).drop_duplicates(keep=False)
+    return dates_around(diff['date'], window_days)
+
+
+def dates_around(dates, window_days):
+    """Calendar dates within +/- window_days of any of the given dates"""
+    affected = set()
+    for day in pd.to_datetime(pd.Series(dates)).dt.date.unique():
+        for offset in range(-window_days, window_days + 1):
+            affected.add(day + timedelta(days=offset))
+    return affected
+
+
+def newer_than(df, last_date):
+    """Rows of a dated table after last_date (an empty table for None)"""
+    if df is None:
+        return pd.DataFrame()
+    return df if last_date is None else df[df['date'] > last_date]
+
+
+def date_string(timestamp):
+    return None if timestamp is None else timestamp.date().isoformat()
+
+
+def resolve_date(current_day, date_value=None):
+    """Calendar date of a request: an ISO date if given, else a day number from BASE_DATE"""
+    if date_value:
+        try:
+            return datetime.fromisoformat(str(date_value)[:10])
+        except ValueError:
+            raise InvalidDateError(f"Invalid date {date_value!r}, expected YYYY-MM-DD") from None
+    return BASE_DATE + timedelta(days=current_day)
+
+
+def day_of_year(date):
+    """0-based day of the year, as used in the model's state vector"""
+    return date.timetuple().tm_yday - 1
+
+
+def read_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compact_frame(df):
+    """Text columns as categoricals and integer columns at their narrowest width, values unchanged
+
+    Float columns stay float64: the lookup indexes and the forecaster
+    read them, and their exact values end up in responses.
+    """
+    for name in df.columns:
+        column = df[name]
+        if column.dtype == object or pd.api.types.is_string_dtype(column.dtype):
+            df[name] = column.astype('category')
+        elif pd.api.types.is_integer_dtype(column.dtype):
+            df[name] = pd.to_numeric(column, downcast='integer')
+    return df
+
+
+def read_dated_csv(path):
+    df = pd.read_csv(path)
+    df['date'] = pd.to_datetime(df['date'])
+    return compact_frame(df)
+
+
+class EnvironmentSnapshot:
+    """Immutable view of a region's environmental data plus derived caches
+
+    Readers take one reference to the current snapshot and use it for a
+    whole lookup; reloads build a new snapshot and swap it in atomically,
+    so no request ever sees a mix of old and new data.
+
+    Lookups go through per-zone time indexes (binary search over sorted
+    dates), so any calendar date in any year costs O(log n). The frames
+    themselves are only needed for bulk consumers and are concatenated
+    lazily after appends.
+    """
+    
+    def __init__(self, constraints, vegetation_df, weather_df, zones_by_date=None,
+                 vegetation_index=None, weather_index=None, zone_count=None):
+        self.constraints = constraints
+        self._vegetation_parts = list(vegetation_df) if isinstance(vegetation_df, (list, tuple)) else [vegetation_df]
+        self._weather_parts = list(weather_df) if isinstance(weather_df, (list, tuple)) else [weather_df]
+        self._zones_by_date = dict(zones_by_date or {})
+        self.vegetation_index = vegetation_index or ZoneTimeIndex.from_frame(self.vegetation_df, VEGETATION_INDEX_COLUMNS)
+        self.weather_index = weather_index or TimeSeriesIndex.from_frame(self.weather_df, WEATHER_INDEX_COLUMNS)
+        # Zones come from the region's zone definitions; without them, from the vegetation data
+        self.zone_count = zone_count or int(self.vegetation_df['zone_id'].max())
+    
+    @property
+    def vegetation_df(self):
+        if len(self._vegetation_parts) > 1:
+            self._vegetation_parts = [compact_frame(pd.concat(self._vegetation_parts, ignore_index=True))]
+        return self._vegetation_parts[0]
+    
+    @property
+    def weather_df(self):
+        if len(self._weather_parts) > 1:
+            self._weather_parts = [compact_frame(pd.concat(self._weather_parts, ignore_index=True))]
+        return self._weather_parts[0]
+    
+    @property
+    def last_vegetation_date(self):
+        day = self.vegetation_index.last_day
+        return None if day is None else from_day(day)
+    
+    @property
+    def last_weather_date(self):
+        day = self.weather_index.last_day
+        return None if day is None else from_day(day)
+    
+    def index_bytes(self):
+        return self.vegetation_index.memory_bytes() + self.weather_index.memory_bytes()
+    
+    def weather_batch(self, dates, mode=NEAREST):
+        """Weather for many dates at once, seasonal defaults where there is no data"""
+        values = self.weather_index.lookup(WEATHER_INDEX_COLUMNS, to_days(dates), WEATHER_WINDOW_DAYS, mode)
+        return {name: np.nan_to_num(v, nan=DEFAULT_WEATHER[name]) for name, v in values.items()}
+    
+    def vegetation_batch(self, zone_ids, dates, mode=NEAREST):
+        """NDVI, carrying capacity and accessibility for (0-based zone, date) pairs"""
+        zone_ids = np.asarray(zone_ids) + 1
+        days = to_days(dates)
+        values = self.vegetation_index.lookup(
+            ('ndvi', 'carrying_capacity_sheep_per_hectare'), zone_ids, days, VEGETATION_WINDOW_DAYS, mode)
+        # Accessibility is a flag, never interpolated
+        accessible = self.vegetation_index.lookup(
+            ('accessible',), zone_ids, days, VEGETATION_WINDOW_DAYS, NEAREST)['accessible']
+        
+        # Fallback values where a zone has no sample near the date
+        missing = np.isnan(values['ndvi'])
+        return {
+            'ndvi': np.where(missing, DEFAULT_VEGETATION['ndvi'], values['ndvi']),
+            'carrying_capacity': np.where(missing, DEFAULT_VEGETATION['carrying_capacity'],
+                                          values['carrying_capacity_sheep_per_hectare']),
+            'accessible': np.where(missing | np.isnan(accessible), DEFAULT_VEGETATION['accessible'], accessible != 0)
+        }
+    
+    def get_weather(self, current_date, mode=NEAREST):
+        """Get weather nearest a date, falling back to seasonal defaults"""
+        weather = self.weather_batch([current_date], mode)
+        return {name: values[0] for name, values in weather.items()}
+    
+    def zones_quality(self, zone_ids, current_date, mode=NEAREST):
+        """Quality of several zones on one date, as a ZoneTable"""
+        vegetation = self.vegetation_batch(zone_ids, np.full(len(zone_ids), current_date), mode)
+        weather = self.get_weather(current_date, mode)
+        flood_zones = self.constraints["zone_restrictions"]["weather_based"]["flood_prone"]["zones"]
+        flooded = np.isin(np.asarray(zone_ids) + 1, flood_zones) & (weather['rainfall'] > 25)
+        return ZoneTable(zone_ids, vegetation['ndvi'], vegetation['carrying_capacity'],
+                         vegetation['accessible'], flooded, weather)
+    
+    def get_zone_quality(self, zone_id, current_date, mode=NEAREST):
+        """Get zone quality for a specific date, matching your testing system"""
+        return self.zones_quality([zone_id], current_date, mode).to_dicts(with_ids=False)[0]
+    
+    def cached_zone_quality(self, zone_id, current_date, mode=NEAREST):
+        """Zone quality from the per-date memo, as a read-only mapping"""
+        zones = self.zones_for_date(current_date, mode)
+        if 0 <= zone_id < len(zones):
+            return zones[zone_id]
+        return self.zones_quality([zone_id], current_date, mode)[0]
+    
+    def get_all_zones_data(self, current_date, mode=NEAREST):
+        """Get data for all zones at current date"""
+        return self.zones_for_date(current_date, mode).to_dicts()
+    
+    def zones_for_date(self, current_date, mode=NEAREST):
+        """ZoneTable of all zones for a date, memoised for the lifetime of the snapshot"""
+        key = (current_date.date(), mode)
+        zones = self._zones_by_date.get(key)
+        if zones is None:
+            zones = self.zones_quality(np.arange(self.zone_count), current_date, mode)
+            self._zones_by_date[key] = zones
+        return zones
+    
+    def derive(self, constraints, vegetation_df, weather_df, affected_dates):
+        """New snapshot over new data, keeping cached dates that are unaffected
+
+        `affected_dates` of None means every cached date is stale. A table
+        given as None is unchanged: its parts and index are carried over
+        without concatenating them.
+        """
+        if affected_dates is None:
+            kept = {}
+        else:
+            kept = {key: z for key, z in list(self._zones_by_date.items()) if key[0] not in affected_dates}
+        return EnvironmentSnapshot(
+            constraints,
+            self._vegetation_parts if vegetation_df is None else vegetation_df,
+            self._weather_parts if weather_df is None else weather_df,
+            kept,
+            vegetation_index=self.vegetation_index if vegetation_df is None else None,
+            weather_index=self.weather_index if weather_df is None else None,
+            zone_count=self.zone_count
+        )
+    
+    def extend(self, vegetation_rows, weather_rows):
+        """New snapshot with rows appended, keeping cached dates they cannot affect
+        
+        Only the new rows are indexed; history is neither copied nor
+        re-sorted. Returns (snapshot, affected dates).
+        """
+        vegetation_parts, weather_parts = self._vegetation_parts, self._weather_parts
+        vegetation_index, weather_index = self.vegetation_index, self.weather_index
+        affected = set()
+        if len(vegetation_rows):
+            vegetation_parts = vegetation_parts + [vegetation_rows]
+            vegetation_index = vegetation_index.extend(vegetation_rows, VEGETATION_INDEX_COLUMNS)
+            affected |= dates_around(vegetation_rows['date'], VEGETATION_WINDOW_DAYS)
+        if len(weather_rows):
+            weather_parts = weather_parts + [weather_rows]
+            weather_index = weather_index.extend(
+                to_days(weather_rows['date']), {name: weather_rows[name] for name in WEATHER_INDEX_COLUMNS})
+            affected |= dates_around(weather_rows['date'], WEATHER_WINDOW_DAYS)
+        
+        kept = {key: z for key, z in list(self._zones_by_date.items()) if key[0] not in affected}
+        snapshot = EnvironmentSnapshot(self.constraints, vegetation_parts, weather_parts, kept,
+                                       vegetation_index=vegetation_index, weather_index=weather_index,
+                                       zone_count=self.zone_count)
+        return snapshot, affected
+
+
+class EnvironmentalDataManager:
+    """Manages environmental data similar to the testing system"""
+    
+    def __init__(self, data_folder='grazing_data', share=None, herd_store=None, zone_count=None):
+        self.data_folder = data_folder
+        self.share = share
+        self.data = None
+        self._zone_count = zone_count  # From the zone definitions; None takes it from the data
+        self.herd_store = herd_store or HerdStateStore(':memory:', 'default')
+        self.data_generated = False
+        self._update_lock = threading.Lock()
+
+        # Versioned snapshots of (zones, usage history) for delta responses
+        self._snapshot_count = 0
+        self._snapshot_epoch = uuid.uuid4().hex[:8]
+        self._snapshots = OrderedDict()  # Version token -> snapshot
+        self._snapshot_lock = threading.Lock()
+
+        self.load_or_generate_data()
+    
+    @property
+    def constraints(self):
+        return self.data.constraints
+
+    @property
+    def zone_count(self):
+        return self.data.zone_count
+
+    @property
+    def zone_usage_history(self):
+        """Days per zone of the herd used by requests that name none"""
+        return self.zone_usage()
+
+    def zone_usage(self, herd_id=DEFAULT_HERD):
+        return self.herd_store.zone_usage(herd_id)
+
+    def record_zone_day(self, zone_id, herd_id=DEFAULT_HERD):
+        self.herd_store.record_zone_day(herd_id, zone_id)
+    
+    @property
+    def vegetation_df(self):
+        return self.data.vegetation_df
+    
+    @property
+    def weather_df(self):
+        return self.data.weather_df
+    
+    def data_path(self, filename):
+        return f'{self.data_folder}/{filename}'
+        
+    def load_or_generate_data(self):
+        """Load data or generate if missing, matching your testing system"""
+        try:
+            # Try to load actual data
+            self.data = EnvironmentSnapshot(
+                self._read(self.data_path(CONSTRAINTS_FILE), read_json),
+                self._read(self.data_path(VEGETATION_FILE), read_dated_csv),
+                self._read(self.data_path(WEATHER_FILE), read_dated_csv),
+                zone_count=self._zone_count
+            )
+            
+            print("✅ Environmental data loaded from files")
+            
+        except Exception as e:
+            print(f"⚠️ Could not load data files, generating realistic data: {e}")
+            self.generate_realistic_data()
+    
+    def _read(self, path, loader):
+        """Load a read-only file, shared with other regions when possible"""
+        if self.share is None:
+            return loader(path)
+        return self.share(path, loader)
+    
+    def reload(self, changed_files):
+        """Re-read changed data files and atomically publish a new snapshot
+
+        `changed_files` maps file names to the byte offset where appended
+        rows start, or None when the whole file must be re-read. Returns
+        (weather rows appended, vegetation rows appended, affected dates);
+        the affected dates are None when everything was invalidated (e.g.
+        new constraints). Appends never concatenate the history. Raises on
+        unreadable files, leaving the current snapshot in place.
+        """
+        changed_files = dict.fromkeys(changed_files) if not isinstance(changed_files, dict) else changed_files
+        with self._update_lock:
+            current = self.data
+            
+            # Rows appended by another process: read only the new bytes
+            appended = {
+                name: read_appended_rows(self.data_path(name), offset)
+                for name, offset in changed_files.items()
+                if offset is not None and name in (VEGETATION_FILE, WEATHER_FILE)
+            }
+            # Rows this process appended itself are already in memory
+            vegetation_rows = validate_vegetation(
+                newer_than(appended.get(VEGETATION_FILE), current.last_vegetation_date),
+                current.last_vegetation_date)
+            weather_rows = validate_weather(
+                newer_than(appended.get(WEATHER_FILE), current.last_weather_date),
+                current.last_weather_date)
+            if appended:
+                current, affected = current.extend(vegetation_rows, weather_rows)
+            else:
+                affected = set()
+            
+            constraints = current.constraints
+            vegetation_df = weather_df = None
+            if CONSTRAINTS_FILE in changed_files:
+                constraints = self._read(self.data_path(CONSTRAINTS_FILE), read_json)
+                affected = None
+            if VEGETATION_FILE in changed_files and VEGETATION_FILE not in appended:
+                vegetation_df = self._read(self.data_path(VEGETATION_FILE), read_dated_csv)
+                if affected is not None:
+                    affected |= changed_dates(current.vegetation_df, vegetation_df, VEGETATION_WINDOW_DAYS)
+            if WEATHER_FILE in changed_files and WEATHER_FILE not in appended:
+                weather_df = self._read(self.data_path(WEATHER_FILE), read_dated_csv)
+                if affected is not None:
+                    affected |= changed_dates(current.weather_df, weather_df, WEATHER_WINDOW_DAYS)
+            
+            if constraints is not current.constraints or vegetation_df is not None or weather_df is not None:
+                current = current.derive(constraints, vegetation_df, weather_df, affected)
+            self.data = current
+            self.data_generated = False
+            return weather_rows, vegetation_rows, affected
+    
+    def append(self, weather_rows=None, vegetation_rows=None, zone_count=None):
+        """Validate new daily observations, append them to the data files and
+        publish a snapshot that includes them
+
+        History is neither re-read nor rewritten; only cached dates within
+        the lookup windows of the new rows are invalidated. Returns
+        (weather rows, vegetation rows, affected dates). Raises IngestError
+        when any row is invalid, in which case nothing is written.
+        """
+        with self._update_lock:
+            current = self.data
+            max_sheep = current.constraints.get('carrying_capacity_limits', {}).get(
+                'max_sheep_per_hectare', DEFAULT_MAX_SHEEP_PER_HECTARE)
+            weather = validate_weather(
+                [] if weather_rows is None else weather_rows, current.last_weather_date)
+            vegetation = validate_vegetation(
+                [] if vegetation_rows is None else vegetation_rows, current.last_vegetation_date,
+                zone_count, max_sheep)
+            
+            if not self.data_generated:
+                if len(weather):
+                    append_csv(self.data_path(WEATHER_FILE), weather, WEATHER_COLUMNS)
+                if len(vegetation):
+                    append_csv(self.data_path(VEGETATION_FILE), vegetation, VEGETATION_COLUMNS)
+            
+            self.data, affected = current.extend(vegetation, weather)
+            return weather, vegetation, affected
+    
+    def generate_realistic_data(self):
+        """Generate realistic environmental data matching your model's expectations"""
+        zone_count = self._zone_count or DEFAULT_ZONE_COUNT
+        zones = np.arange(1, zone_count + 1)
+        # Larger ranges repeat the ten-zone layout of the training region
+        profile = (zones - 1) % 10 + 1
+        
+        # Constraints from your training system
+        constraints = {
+            "zone_restrictions": {
+                "protected_areas": [],
+                "seasonal_closures": {},
+                "weather_based": {
+                    "flood_prone": {"zones": zones[profile == 9].tolist(), "trigger": "rainfall > 25mm"}
+                }
+            },
+            "carrying_capacity_limits": {
+                "max_consecutive_days": 14,
+                "recovery_period_days": 3
+            }
+        }
+        
+        # Generate dates (weekly data for past year + future)
+        start_date = datetime(2024, 1, 1)
+        end_date = datetime(2024, 12, 31)
+        dates = pd.date_range(start_date, end_date, freq='W')
+        
+        # Generate vegetation data with seasonal patterns, (week, zone) at once
+        day_of_year = dates.dayofyear.to_numpy()[:, None]
+        # Seasonal NDVI pattern - higher in spring/summer, lower in winter
+        seasonal_factor = 0.3 + 0.4 * (1 + np.cos(2 * np.pi * (day_of_year - 120) / 365)) / 2
+        shape = (len(dates), zone_count)
+        
+        # Different base quality for different zones
+        base_ndvi = np.select(
+            [profile == 9, np.isin(profile, [1, 4, 6]), np.isin(profile, [5, 8, 10])],  # Flood prone, high, poor
+            [0.2 + np.random.normal(0, 0.05, shape),
+             0.7 + seasonal_factor + np.random.normal(0, 0.1, shape),
+             0.3 + seasonal_factor * 0.5 + np.random.normal(0, 0.08, shape)],
+            default=0.5 + seasonal_factor * 0.8 + np.random.normal(0, 0.1, shape)  # Medium quality zones
+        )
+        ndvi = np.clip(base_ndvi, 0.15, 0.95).ravel()
+        
+        vegetation_df = compact_frame(pd.DataFrame({
+            'date': np.repeat(dates, zone_count),
+            'zone_id': np.tile(zones, len(dates)),
+            'ndvi': ndvi,
+            'biomass_kg_per_hectare': ndvi * 1200,
+            'carrying_capacity_sheep_per_hectare': ndvi * 12,
+            'accessible': np.random.random(len(ndvi)) > 0.05  # 95% usually accessible
+        }))
+        
+        # Generate weather data with realistic patterns
+        weather_data = []
+        for date in dates:
+            day_of_year = date.timetuple().tm_yday
+            # Seasonal temperature pattern
+            base_temp = 18 + 8 * np.cos(2 * np.pi * (day_of_year - 200) / 365)
+            temperature = base_temp + np.random.normal(0, 4)
+            
+            # Seasonal rainfall pattern (more in winter/spring)
+            seasonal_rain_factor = 1.5 + 0.8 * np.cos(2 * np.pi * (day_of_year - 60) / 365)
+            rainfall = max(0, np.random.exponential(3) * seasonal_rain_factor)
+            
+            weather_data.append({
+                'date': date,
+                'temperature': temperature,
+                'humidity': 65 + np.random.normal(0, 15),
+                'rainfall': rainfall
+            })
+        
+        weather_df = compact_frame(pd.DataFrame(weather_data))
+        self.data = EnvironmentSnapshot(constraints, vegetation_df, weather_df, zone_count=zone_count)
+        self.data_generated = True
+        print("✅ Generated realistic environmental data")
+    
+    def get_weather(self, current_date, mode=NEAREST):
+        return self.data.get_weather(current_date, mode)
+    
+    def get_zone_quality(self, zone_id, current_date, mode=NEAREST):
+        return self.data.get_zone_quality(zone_id, current_date, mode)
+    
+    def get_all_zones_data(self, current_date, mode=NEAREST):
+        return self.data.get_all_zones_data(current_date, mode)
+    
+    @property
+    def snapshot_version(self):
+        """Token of the latest snapshot, as handed to clients
+
+        Tokens name the process and data manager that issued them, so a
+        version from another prefork worker, or from before the region was
+        reloaded, never matches a snapshot here and gets a full payload.
+        """
+        return f'{os.getpid()}.{self._snapshot_epoch}.{self._snapshot_count}'
+
+    def publish_snapshot(self, current_date):
+        """Publish the zones and usage history for a date, returning its version
+
+        The version only advances when the content differs from the latest
+        published snapshot, so repeated calls with unchanged data are free.
+        """
+        with self._snapshot_lock:
+            zones = self.data.zones_for_date(current_date)
+
+            usage = self.zone_usage_history
+            latest = self._snapshots.get(self.snapshot_version)
+            if latest is not None and latest['zones'] is zones and latest['usage'] == usage:
+                return self.snapshot_version, latest
+
+            self._snapshot_count += 1
+            snapshot = {'zones': zones, 'usage': usage}
+            self._snapshots[self.snapshot_version] = snapshot
+            while len(self._snapshots) > SNAPSHOT_HISTORY:
+                self._snapshots.popitem(last=False)
+            return self.snapshot_version, snapshot
+
+    def snapshot_delta(self, base_version, version):
+        """Return the zones and usage entries changed between two versions
+
+        Returns None when the base version is no longer retained or was
+        issued elsewhere, in which case the caller should fall back to a
+        full payload.
+        """
+        if base_version == version:
+            return {'zones': [], 'zone_usage_history': {}}
+
+        base = self._snapshots.get(base_version)
+        current = self._snapshots.get(version)
+        if base is None or current is None:
+            return None
+
+        zones = []
+        if base['zones'] is not current['zones']:
+            zones = current['zones'].changes_since(base['zones'])
+
+        usage = {k: v for k, v in current['usage'].items() if base['usage'].get(k) != v}
+        return {'zones': zones, 'zone_usage_history': usage}
+
+    def is_zone_accessible(self, zone_id, current_date, data=None, mode=NEAREST, usage=None):
+        """Check if zone is accessible with constraints"""
+        data = data or self.data
+        usage = self.zone_usage_history if usage is None else usage
+        zone_quality = data.cached_zone_quality(zone_id, current_date, mode)
+        
+        if not zone_quality['accessible']:
+            return False, "Environmental restrictions", -20
+        
+        # Check flood risk
+        if ((zone_id + 1) in data.constraints["zone_restrictions"]["weather_based"]["flood_prone"]["zones"] and
+            zone_quality["rainfall"] > 25):
+            return False, "Flood risk", -20
+        
+        # Check consecutive days limit
+        max_days = data.constraints["carrying_capacity_limits"]["max_consecutive_days"]
+        if zone_id in usage:
+            if usage[zone_id] >= max_days:
+                return False, "Needs recovery period", -10
+        
+        return True, "Accessible", 0
+    
+    def accessible_zones(self, current_date, data=None, mode=NEAREST, usage=None):
+        """`is_zone_accessible` for every zone at once, as a boolean array over 0-based zones"""
+        data = data or self.data
+        usage = self.zone_usage_history if usage is None else usage
+        # Environmental restrictions, flooding included, are already folded into the table
+        accessible = data.zones_for_date(current_date, mode).rows['accessible'].copy()
+        
+        max_days = data.constraints["carrying_capacity_limits"]["max_consecutive_days"]
+        resting = [zone for zone, days in usage.items() if days >= max_days and 0 <= zone < len(accessible)]
+        accessible[resting] = False
+        return accessible
+    
+    def build_state_vector(self, current_zone, current_day, herd_health, days_in_zone, cumulative_reward=0, data=None,
+                           current_date=None, mode=NEAREST, usage=None):
+        """Build state vector exactly as your model expects
+
+        `current_day` is the day of the year; `current_date` defaults to
+        that day counted from BASE_DATE. `usage` is the herd's zone usage
+        history, the default herd's when omitted.
+        """
+        current_date = current_date or BASE_DATE + timedelta(days=current_day)
+        usage = self.zone_usage_history if usage is None else usage
+        data = data or self.data
+        zone_quality = data.cached_zone_quality(current_zone, current_date, mode)
+        zone_count = data.zone_count
+        
+        return [
+            current_zone / max(zone_count - 1, 1),  # Current zone (0-1)
+            current_day / 365.0,  # Day of year (0-1)
+            min(max(zone_quality['temperature'] / 30.0, 0), 1),  # Temperature (0-1)
+            min(zone_quality['rainfall'] / 30.0, 1),  # Rainfall (0-1)
+            zone_quality['ndvi'],  # Vegetation quality (0-1)
+            min(zone_quality['carrying_capacity'] / 15.0, 1),  # Capacity (0-1)
+            herd_health / 100.0,  # Herd health (0-1)
+            min(days_in_zone / 20.0, 1),  # Days in zone (0-1)
+            min(max(cumulative_reward / 500.0, -1), 1),  # Cumulative reward (-1 to 1)
+            min(len(usage) / zone_count, 1),  # Zone diversity (0-1)
+            np.sin(2 * np.pi * current_day / 365),  # Seasonal cycle
+            (current_day % 7) / 7.0  # Week cycle
+        ]
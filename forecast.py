@@ -0,0 +1,229 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from geofence import REASON_NAMES
+
+DEFAULT_HORIZON_DAYS = 14
+DEFAULT_SAMPLES = 2000
+MAX_SAMPLES = 20000
+MAX_HORIZON_DAYS = 90
+
+WET_DAY_MM = 0.05        # Rainfall above this counts as a wet day
+NDVI_WINDOW_DAYS = 7     # Vegetation responds to the trailing week of weather
+
+# Seasonal base NDVI by month, as in GrazingDataGenerator.generate_vegetation_data
+SEASONAL_BASE_NDVI = np.array([0.0, 0.3, 0.3, 0.7, 0.7, 0.7, 0.4, 0.4, 0.4, 0.6, 0.6, 0.6, 0.3])
+
+
+def seasonal_design(day_of_year):
+    """Design matrix for an annual harmonic: [1, sin, cos]"""
+    angle = 2 * np.pi * np.asarray(day_of_year, dtype=np.float64) / 365.0
+    return np.stack([np.ones_like(angle), np.sin(angle), np.cos(angle)], axis=-1)
+
+
+def vegetation_response(month, avg_temp, total_rain):
+    """NDVI before zone adjustment, following the data generator's model"""
+    temp_factor = 1 - np.abs(avg_temp - 20) / 30
+    rain_factor = np.minimum(total_rain / 20, 1.0)
+    return SEASONAL_BASE_NDVI[month] * temp_factor * rain_factor
+
+
+class WeatherScenarioModel:
+    """Seasonal AR(1) temperature and monthly wet-day/exponential rainfall
+
+    Mirrors the processes in data-generation.py (harmonic temperature with
+    Gaussian noise, month-dependent rain probability and exponential
+    amounts) with parameters fitted to the observed weather series.
+    """
+
+    def __init__(self, temp_coefs, temp_phi, temp_sigma, wet_prob, wet_mean, residuals):
+        self.temp_coefs = temp_coefs
+        self.temp_phi = temp_phi
+        self.temp_sigma = temp_sigma
+        self.wet_prob = wet_prob
+        self.wet_mean = wet_mean
+        self.residuals = residuals
+
+    @classmethod
+    def fit(cls, weather_df):
+        weather = weather_df.sort_values('date')
+        dates = pd.to_datetime(weather['date'])
+        temperature = weather['temperature'].to_numpy(dtype=np.float64)
+        rainfall = weather['rainfall'].to_numpy(dtype=np.float64)
+
+        # Temperature: harmonic mean plus AR(1) residuals
+        X = seasonal_design(dates.dt.dayofyear.to_numpy())
+        temp_coefs, *_ = np.linalg.lstsq(X, temperature, rcond=None)
+        residuals = temperature - X @ temp_coefs
+        phi = 0.0
+        if len(residuals) > 2 and residuals.std() > 0:
+            phi = float(np.clip(np.corrcoef(residuals[1:], residuals[:-1])[0, 1], 0.0, 0.99))
+        sigma = float(residuals.std() * np.sqrt(1 - phi ** 2))
+
+        # Rainfall: wet-day probability and mean wet-day amount per month
+        months = dates.dt.month.to_numpy()
+        wet = rainfall > WET_DAY_MM
+        overall_prob = wet.mean() if len(wet) else 0.0
+        overall_mean = rainfall[wet].mean() if wet.any() else 1.0
+        wet_prob = np.full(13, overall_prob)
+        wet_mean = np.full(13, overall_mean)
+        for month in range(1, 13):
+            in_month = months == month
+            if in_month.any():
+                wet_prob[month] = wet[in_month].mean()
+                if wet[in_month].any():
+                    wet_mean[month] = rainfall[in_month & wet].mean()
+
+        return cls(temp_coefs, phi, sigma, wet_prob, wet_mean,
+                   pd.Series(residuals, index=dates.to_numpy()))
+
+    def seasonal_temperature(self, day_of_year):
+        return seasonal_design(day_of_year) @ self.temp_coefs
+
+    def expected_rainfall(self, month):
+        return self.wet_prob[month] * self.wet_mean[month]
+
+    def sample(self, start_date, horizon, n_samples, rng):
+        """Sample (n_samples, horizon) temperature and rainfall trajectories"""
+        days = pd.date_range(start_date, periods=horizon, freq='D')
+        months = days.month.to_numpy()
+
+        # Start the AR(1) process from the last observed residual
+        observed = self.residuals[self.residuals.index < pd.Timestamp(start_date)]
+        residual = np.full(n_samples, observed.iloc[-1] if len(observed) else 0.0)
+
+        noise = rng.normal(0.0, self.temp_sigma, size=(n_samples, horizon))
+        anomalies = np.empty((n_samples, horizon))
+        for d in range(horizon):
+            residual = self.temp_phi * residual + noise[:, d]
+            anomalies[:, d] = residual
+        temperature = self.seasonal_temperature(days.dayofyear.to_numpy())[None, :] + anomalies
+
+        wet = rng.random((n_samples, horizon)) < self.wet_prob[months][None, :]
+        amounts = rng.exponential(1.0, size=(n_samples, horizon)) * self.wet_mean[months][None, :]
+        rainfall = np.where(wet, amounts, 0.0)
+
+        return temperature, rainfall
+
+
+class ClosureForecaster:
+    """Per-zone, per-day closure probabilities and expected NDVI by Monte Carlo"""
+
+    def __init__(self, weather_df, vegetation_df, geofence):
+        weather = weather_df.sort_values('date')
+        self.daily_weather = weather.set_index(pd.to_datetime(weather['date']))[['temperature', 'rainfall']]
+        self.geofence = geofence
+        self.weather_model = WeatherScenarioModel.fit(weather_df)
+        self.zone_factors = self._fit_zone_factors(vegetation_df)
+
+    def observe(self, weather_rows):
+        """Add newly observed days to the history without refitting the model"""
+        if not len(weather_rows):
+            return
+        dates = pd.to_datetime(weather_rows['date'])
+        new = weather_rows.set_index(dates)[['temperature', 'rainfall']]
+        self.daily_weather = pd.concat([self.daily_weather, new])
+
+        model = self.weather_model
+        residuals = new['temperature'].to_numpy(dtype=np.float64) - \
+            model.seasonal_temperature(dates.dt.dayofyear.to_numpy())
+        model.residuals = pd.concat([model.residuals, pd.Series(residuals, index=dates.to_numpy())])
+
+    def _fit_zone_factors(self, vegetation_df):
+        """Least-squares NDVI multiplier per zone against the generator's model"""
+        n = self.geofence.locator.zone_count
+        factors = np.ones(n)
+
+        daily = self.daily_weather
+        window_temp = daily['temperature'].rolling(NDVI_WINDOW_DAYS, min_periods=1).mean()
+        window_rain = daily['rainfall'].rolling(NDVI_WINDOW_DAYS, min_periods=1).sum()
+
+        veg = vegetation_df[vegetation_df['accessible'].astype(bool)]
+        dates = pd.to_datetime(veg['date'])
+        avg_temp = window_temp.reindex(dates).to_numpy()
+        total_rain = window_rain.reindex(dates).to_numpy()
+        predicted = vegetation_response(dates.dt.month.to_numpy(), avg_temp, total_rain)
+        observed = veg['ndvi'].to_numpy(dtype=np.float64)
+        zone_idx = veg['zone_id'].to_numpy() - 1
+
+        usable = np.isfinite(predicted) & (predicted > 0.02) & (zone_idx >= 0) & (zone_idx < n)
+        num = np.bincount(zone_idx[usable], weights=observed[usable] * predicted[usable], minlength=n)
+        den = np.bincount(zone_idx[usable], weights=predicted[usable] ** 2, minlength=n)
+        fitted = den > 0
+        factors[fitted] = num[fitted] / den[fitted]
+        return factors
+
+    def _weather_history(self, start_date, days):
+        """Observed weather for the days before start_date, seasonal means where missing"""
+        history_dates = pd.date_range(start_date - timedelta(days=days), periods=days, freq='D')
+        observed = self.daily_weather.reindex(history_dates)
+        model = self.weather_model
+        temperature = observed['temperature'].to_numpy(dtype=np.float64, copy=True)
+        rainfall = observed['rainfall'].to_numpy(dtype=np.float64, copy=True)
+        missing_t = np.isnan(temperature)
+        missing_r = np.isnan(rainfall)
+        temperature[missing_t] = model.seasonal_temperature(history_dates.dayofyear.to_numpy())[missing_t]
+        rainfall[missing_r] = model.expected_rainfall(history_dates.month.to_numpy())[missing_r]
+        return temperature, rainfall
+
+    def forecast(self, start_date, horizon=DEFAULT_HORIZON_DAYS, n_samples=DEFAULT_SAMPLES, seed=None):
+        rng = np.random.default_rng(seed)
+        horizon = int(np.clip(horizon, 1, MAX_HORIZON_DAYS))
+        n_samples = int(np.clip(n_samples, 1, MAX_SAMPLES))
+
+        temperature, rainfall = self.weather_model.sample(start_date, horizon, n_samples, rng)
+        sampled = {'temperature': temperature, 'rainfall': rainfall}
+        days = pd.date_range(start_date, periods=horizon, freq='D')
+        months = days.month.to_numpy()
+        n = self.geofence.locator.zone_count
+        rules = self.geofence.rules
+
+        # Deterministic closures (protected, unsafe terrain, seasonal) per day
+        fixed = (rules.static_mask[:n][None, :] | rules.month_masks[months, :n]) != 0
+        closed = np.broadcast_to(fixed[None, :, :], (n_samples, horizon, n)).copy()
+
+        # Weather-triggered closures, one boolean trajectory per rule
+        rule_probabilities = {}
+        for zones, (field, op, threshold), flag in rules.weather_rules:
+            values = sampled.get(field)
+            if values is None:
+                continue
+            triggered = values > threshold if op == '>' else values < threshold
+            closed[:, :, zones] |= triggered[:, :, None]
+            rule_probabilities[flag] = (zones, triggered.mean(axis=0))
+
+        # Expected NDVI from the trailing weather window, zero while closed
+        hist_t, hist_r = self._weather_history(start_date, NDVI_WINDOW_DAYS - 1)
+        full_t = np.concatenate([np.broadcast_to(hist_t, (n_samples, len(hist_t))), temperature], axis=1)
+        full_r = np.concatenate([np.broadcast_to(hist_r, (n_samples, len(hist_r))), rainfall], axis=1)
+        csum_t = np.cumsum(np.pad(full_t, ((0, 0), (1, 0))), axis=1)
+        csum_r = np.cumsum(np.pad(full_r, ((0, 0), (1, 0))), axis=1)
+        w = NDVI_WINDOW_DAYS
+        avg_temp = (csum_t[:, w:] - csum_t[:, :-w]) / w
+        total_rain = csum_r[:, w:] - csum_r[:, :-w]
+        base_ndvi = vegetation_response(months[None, :], avg_temp, total_rain)
+        ndvi = np.clip(base_ndvi[:, :, None] * self.zone_factors[None, None, :], 0, 1)
+        expected_ndvi = np.where(closed, 0.0, ndvi).mean(axis=0)
+
+        closure_probability = closed.mean(axis=0)
+
+        zones = []
+        for z in range(n):
+            zone = {
+                'zone_id': z,
+                'closure_probability': np.round(closure_probability[:, z], 4).tolist(),
+                'expected_ndvi': np.round(expected_ndvi[:, z], 4).tolist()
+            }
+            for flag, (rule_zones, probability) in rule_probabilities.items():
+                if z in rule_zones:
+                    zone[f'{REASON_NAMES[flag]}_probability'] = np.round(probability, 4).tolist()
+            zones.append(zone)
+
+        return {
+            'start_date': days[0].isoformat(),
+            'dates': [d.date().isoformat() for d in days],
+            'samples': n_samples,
+            'zones': zones
+        }
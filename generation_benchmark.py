@@ -0,0 +1,343 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+GENERATOR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data-generation.py')
+# Generator stages in dependency order: (method, stages whose output it takes)
+STAGE_METHODS = {
+    'weather': ('generate_weather_data', ()),
+    'vegetation': ('generate_vegetation_data', ('weather',)),
+    'topography': ('generate_topographical_data', ()),
+    'water_sources': ('generate_water_sources', ()),
+    'livestock_tracking': ('generate_livestock_tracking', ('vegetation', 'weather'))
+}
+STAGES = tuple(STAGE_METHODS)
+# Sizes swept one axis at a time; the first value of each axis is the base case.
+# Years spans 16x because the per-herd-day filtering in livestock tracking
+# only costs a few percent more per row for each year of history.
+DEFAULT_AXES = {
+    'years': (1, 4, 16),
+    'zones': (10, 40, 160),
+    'herds': (1, 2, 4),
+    'grid': (50, 100, 200)
+}
+DEFAULT_REPEAT = 3
+DEFAULT_SEED = 42
+DEFAULT_OUT = 'generation_benchmark.json'
+SUPER_LINEAR_GROWTH = 1.2   # Flag when time per row grows this much across an axis, in the fastest and median runs
+MIN_FLAG_SECONDS = 0.1      # Stages faster than this at every size are too noisy to flag
+MAX_SLOWDOWN = 1.25         # Largest time or memory ratio against a baseline before it is a regression
+MIN_COMPARE_SECONDS = 0.05  # Timings below this are not compared
+MIN_COMPARE_MB = 1.0        # Peaks below this are not compared
+
+
+def load_generator_class(path=GENERATOR_FILE):
+    """GrazingDataGenerator from data-generation.py, which can't be imported by name"""
+    spec = importlib.util.spec_from_file_location('data_generation', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.GrazingDataGenerator
+
+
+def case_key(params):
+    return ','.join(f"{axis}={params[axis]}" for axis in DEFAULT_AXES)
+
+
+def benchmark_cases(axes):
+    """The base case plus every case that changes one axis from it"""
+    base = {axis: values[0] for axis, values in axes.items()}
+    cases = {case_key(base): base}
+    for axis, values in axes.items():
+        for value in values[1:]:
+            params = dict(base, **{axis: value})
+            cases.setdefault(case_key(params), params)
+    return base, list(cases.values())
+
+
+def run_stages(generator_class, params, seed, on_stage):
+    """Run every stage in dependency order, calling `on_stage(stage, run)` around each
+
+    `run()` generates the stage's data and returns it; stages write
+    their CSVs into a scratch folder that is removed afterwards.
+    """
+    np.random.seed(seed)
+    with tempfile.TemporaryDirectory() as folder:
+        generator = generator_class(folder, zone_count=params['zones'], years=params['years'],
+                                    herds=params['herds'], grid_size=params['grid'])
+        frames = {}
+        for stage, (name, inputs) in STAGE_METHODS.items():
+            method = getattr(generator, name)
+            args = [frames[source] for source in inputs]
+            frames[stage] = on_stage(stage, lambda: method(*args))
+    return frames
+
+
+def time_case(generator_class, params, repeat, seed):
+    """Seconds per run of each stage, plus the rows it produced"""
+    seconds = {stage: [] for stage in STAGES}
+    rows = {}
+
+    def timed(stage, run):
+        started = time.perf_counter()
+        df = run()
+        seconds[stage].append(time.perf_counter() - started)
+        rows[stage] = len(df)
+        return df
+
+    for _ in range(repeat):
+        run_stages(generator_class, params, seed, timed)
+    return seconds, rows
+
+
+def peak_memory(generator_class, params, seed):
+    """Peak traced allocation of each stage in MB, measured in a separate untimed run"""
+    peaks = {}
+
+    def traced(stage, run):
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        df = run()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[stage] = round((peak - start) / 2**20, 3)
+        return df
+
+    tracemalloc.start()
+    try:
+        run_stages(generator_class, params, seed, traced)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def log_slope(x, y):
+    x, y = np.log(np.asarray(x, dtype=float)), np.log(np.maximum(np.asarray(y, dtype=float), 1e-9))
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def scaling(cases, base, axes):
+    """Log-log slopes of time and rows against each axis, per stage
+
+    A stage is super-linear along an axis when its time grows faster
+    than its output: `excess` is the time exponent minus the rows
+    exponent, so it also catches stages whose output stays the same
+    size while their time grows (e.g. tracking against zone count).
+    It is flagged when the time per row at the largest size is at least
+    SUPER_LINEAR_GROWTH times that at the smallest, fitted from both the
+    fastest and the median run, so one noisy timing can't flag a stage.
+    Stages that stay under MIN_FLAG_SECONDS are never flagged.
+    """
+    results = {}
+    for stage in STAGES:
+        results[stage] = {}
+        for axis, values in axes.items():
+            if len(values) < 2:
+                continue
+            sweep = [
+                case for case in cases
+                if all(case['params'][other] == base[other] for other in axes if other != axis)
+            ]
+            sweep.sort(key=lambda case: case['params'][axis])
+            sizes = [case['params'][axis] for case in sweep]
+            stats = [case['stages'][stage] for case in sweep]
+            span = sizes[-1] / sizes[0]
+            rows_exponent = log_slope(sizes, [s['rows'] for s in stats])
+            time_exponent = log_slope(sizes, [s['seconds'] for s in stats])
+            median_exponent = log_slope(sizes, [s.get('median_seconds', s['seconds']) for s in stats])
+            excess = time_exponent - rows_exponent
+            growth = span ** excess
+            median_growth = span ** (median_exponent - rows_exponent)
+            results[stage][axis] = {
+                'sizes': sizes,
+                'time_exponent': round(time_exponent, 3),
+                'rows_exponent': round(rows_exponent, 3),
+                'excess': round(excess, 3),
+                'time_per_row_growth': round(growth, 3),
+                'median_time_per_row_growth': round(median_growth, 3),
+                'super_linear': bool(
+                    min(growth, median_growth) >= SUPER_LINEAR_GROWTH and
+                    max(s['seconds'] for s in stats) >= MIN_FLAG_SECONDS
+                )
+            }
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(GENERATOR_FILE),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': git_commit()
+    }
+
+
+def run_benchmark(axes=DEFAULT_AXES, repeat=DEFAULT_REPEAT, seed=DEFAULT_SEED, memory=True, log=print):
+    """Time (and optionally trace) every case
+
+    Repeats go round all the cases in turn, so a slow spell on the
+    machine lands on every size rather than on one end of a sweep.
+    """
+    generator_class = load_generator_class()
+    base, params_list = benchmark_cases(axes)
+    seconds = {case_key(params): {stage: [] for stage in STAGES} for params in params_list}
+    rows = {}
+    for run in range(repeat):
+        for params in params_list:
+            key = case_key(params)
+            log(f"⏱️  {key} (run {run + 1}/{repeat})")
+            run_seconds, rows[key] = time_case(generator_class, params, 1, seed)
+            for stage in STAGES:
+                seconds[key][stage] += run_seconds[stage]
+
+    cases = []
+    for params in params_list:
+        key = case_key(params)
+        if memory:
+            log(f"📏 {key} (peak memory)")
+        peaks = peak_memory(generator_class, params, seed) if memory else {}
+        stages = {}
+        for stage in STAGES:
+            best = min(seconds[key][stage])
+            stage_rows = rows[key][stage]
+            stages[stage] = {
+                'rows': stage_rows,
+                'seconds': round(best, 6),
+                'median_seconds': round(statistics.median(seconds[key][stage]), 6),
+                'rows_per_second': round(stage_rows / best, 1) if best > 0 else None,
+                'peak_memory_mb': peaks.get(stage)
+            }
+        cases.append({'case': key, 'params': params, 'stages': stages})
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'settings': {
+            'axes': {axis: list(values) for axis, values in axes.items()},
+            'base': base,
+            'repeat': repeat,
+            'seed': seed
+        },
+        'cases': cases,
+        'scaling': scaling(cases, base, axes)
+    }
+
+
+def compare(report, baseline, max_slowdown=MAX_SLOWDOWN):
+    """Time and memory ratios against a baseline report for the cases and stages both have
+
+    Only minimum times are compared, and ratios of timings or peaks
+    too small to measure reliably are reported but never flagged.
+    """
+    previous = {case['case']: case['stages'] for case in baseline['cases']}
+    rows = []
+    for case in report['cases']:
+        if case['case'] not in previous:
+            continue
+        for stage, current in case['stages'].items():
+            before = previous[case['case']].get(stage)
+            if before is None:
+                continue
+            entry = {'case': case['case'], 'stage': stage, 'regressions': []}
+            for metric, floor in (('seconds', MIN_COMPARE_SECONDS), ('peak_memory_mb', MIN_COMPARE_MB)):
+                old, new = before.get(metric), current.get(metric)
+                if not old or new is None:
+                    entry[f'{metric}_ratio'] = None
+                    continue
+                ratio = new / old
+                entry[f'{metric}_ratio'] = round(ratio, 3)
+                if ratio > max_slowdown and max(old, new) >= floor:
+                    entry['regressions'].append(metric)
+            rows.append(entry)
+    return rows
+
+
+def print_report(report):
+    print(f"\n{'case':<36} {'stage':<20} {'rows':>9} {'seconds':>9} {'rows/s':>11} {'peak MB':>8}")
+    for case in report['cases']:
+        for stage, stats in case['stages'].items():
+            rate = stats['rows_per_second']
+            peak = stats['peak_memory_mb']
+            print(f"{case['case']:<36} {stage:<20} {stats['rows']:>9,} {stats['seconds']:>9.4f} "
+                  f"{'-' if rate is None else f'{rate:,.0f}':>11} {'-' if peak is None else f'{peak:.2f}':>8}")
+
+    print("\n📈 Scaling (log-log slope of time and rows per axis):")
+    for stage, axes in report['scaling'].items():
+        for axis, fit in axes.items():
+            flag = '  ⚠️  super-linear' if fit['super_linear'] else ''
+            print(f"   {stage:<20} {axis:<6} time^{fit['time_exponent']:.2f} rows^{fit['rows_exponent']:.2f} "
+                  f"time/row x{fit['time_per_row_growth']:.2f} (median x{fit['median_time_per_row_growth']:.2f}){flag}")
+
+
+def parse_sizes(text):
+    return tuple(int(value) for value in text.split(','))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the stages of data-generation.py across dataset sizes')
+    for axis, values in DEFAULT_AXES.items():
+        parser.add_argument(f'--{axis}', type=parse_sizes, default=values,
+                            help=f"Comma-separated sizes, the first is the base case (default: "
+                                 f"{','.join(map(str, values))})")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed runs per case; the fastest and median are kept')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced run that measures peak memory')
+    parser.add_argument('--out', default=DEFAULT_OUT, help='Where to write the JSON report')
+    parser.add_argument('--compare', help='Baseline report to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=MAX_SLOWDOWN,
+                        help='Time or memory ratio above which a stage counts as a regression')
+    args = parser.parse_args()
+
+    axes = {axis: getattr(args, axis) for axis in DEFAULT_AXES}
+    report = run_benchmark(axes, args.repeat, args.seed, memory=not args.no_memory)
+    print_report(report)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        report['comparison'] = {
+            'baseline': args.compare,
+            'baseline_commit': baseline.get('environment', {}).get('git_commit'),
+            'max_slowdown': args.max_slowdown,
+            'stages': compare(report, baseline, args.max_slowdown)
+        }
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✓ Report written to {args.out}")
+
+    if args.compare:
+        regressions = [entry for entry in report['comparison']['stages'] if entry['regressions']]
+        print(f"\n🔍 Compared with {args.compare}: {len(report['comparison']['stages'])} stage timings, "
+              f"{len(regressions)} regressions")
+        for entry in regressions:
+            print(f"   ❌ {entry['case']} {entry['stage']}: time x{entry['seconds_ratio']}, "
+                  f"memory x{entry['peak_memory_mb_ratio']}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
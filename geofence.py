@@ -0,0 +1,193 @@
+import re
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+
+import numpy as np
+
+# Restriction flags, combined into one bitmap entry per zone
+PROTECTED_AREA = 1
+SEASONAL_CLOSURE = 2
+FLOOD_RISK = 4
+EXTREME_TEMPERATURE = 8
+UNSAFE_TERRAIN = 16
+OUT_OF_BOUNDS = 32
+
+REASON_NAMES = {
+    PROTECTED_AREA: 'protected_area',
+    SEASONAL_CLOSURE: 'seasonal_closure',
+    FLOOD_RISK: 'flood_risk',
+    EXTREME_TEMPERATURE: 'extreme_temperature',
+    UNSAFE_TERRAIN: 'unsafe_terrain',
+    OUT_OF_BOUNDS: 'out_of_bounds'
+}
+
+VIOLATION_COOLDOWN_SECONDS = 1800  # Re-alert the same animal/zone at most this often
+RECENT_VIOLATIONS = 1000
+MAX_ALERT_KEYS = 100000  # Cooldown entries kept before expired ones are pruned
+
+TRIGGER_PATTERN = re.compile(r'(\w+)\s*([<>])\s*([-\d.]+)')
+
+# Precomputed restriction masks; replaced as a whole when constraints change
+GeofenceRules = namedtuple('GeofenceRules', ['static_mask', 'month_masks', 'weather_rules'])
+
+
+def parse_trigger(trigger):
+    """Parse a constraint trigger such as 'rainfall > 15mm' into (field, op, threshold)"""
+    match = TRIGGER_PATTERN.search(trigger or '')
+    if not match:
+        return None
+    field, op, threshold = match.groups()
+    return field, op, float(threshold)
+
+
+def reason_names(flags):
+    return [name for bit, name in REASON_NAMES.items() if flags & bit]
+
+
+class GeofenceEngine:
+    """Classifies batches of positions against zone restrictions in one pass
+
+    Zone ids in the constraints file are 1-based; the bitmap is indexed by
+    0-based zone index with one extra slot at the end for positions outside
+    every zone.
+    """
+
+    def __init__(self, locator, constraints, weather_lookup, cooldown=VIOLATION_COOLDOWN_SECONDS):
+        self.locator = locator
+        self.weather_lookup = weather_lookup
+        self.cooldown = cooldown
+        self.recent = deque(maxlen=RECENT_VIOLATIONS)
+        self._last_alert = {}
+        self._bitmaps = {}
+        self._lock = threading.Lock()
+        self.set_constraints(constraints)
+
+    def set_constraints(self, constraints):
+        """Precompute the restriction masks from the constraints and swap them in"""
+        n = self.locator.zone_count
+        restrictions = constraints.get('zone_restrictions', {})
+
+        static_mask = np.zeros(n + 1, dtype=np.uint8)
+        static_mask[self._zone_indices(restrictions.get('protected_areas', []))] |= PROTECTED_AREA
+        terrain = constraints.get('terrain_restrictions', {})
+        static_mask[self._zone_indices(terrain.get('unsafe_terrain_zones', []))] |= UNSAFE_TERRAIN
+        static_mask[n] = OUT_OF_BOUNDS
+
+        # month -> zones closed that month
+        month_masks = np.zeros((13, n + 1), dtype=np.uint8)
+        for closure in restrictions.get('seasonal_closures', {}).values():
+            zones = self._zone_indices(closure.get('zones', []))
+            for month in closure.get('months', []):
+                month_masks[month, zones] |= SEASONAL_CLOSURE
+
+        weather_rules = []
+        weather_based = restrictions.get('weather_based', {})
+        for name, flag in (('flood_prone', FLOOD_RISK), ('extreme_temperature', EXTREME_TEMPERATURE)):
+            rule = weather_based.get(name)
+            trigger = parse_trigger(rule.get('trigger')) if rule else None
+            if trigger:
+                weather_rules.append((self._zone_indices(rule.get('zones', [])), trigger, flag))
+
+        self.rules = GeofenceRules(static_mask, month_masks, weather_rules)
+        self._bitmaps = {}
+
+        unknown = sorted(set(self._unknown_zones(restrictions, terrain)))
+        if unknown:
+            print(f"⚠️ Geofence constraints name zones outside 1..{n}, ignoring them: {unknown}")
+
+    def invalidate(self, days=None):
+        """Drop cached bitmaps for the given dates (all of them when None)"""
+        if days is None:
+            self._bitmaps = {}
+        else:
+            self._bitmaps = {d: b for d, b in list(self._bitmaps.items()) if d not in days}
+
+    def _zone_indices(self, zone_ids):
+        n = self.locator.zone_count
+        return np.array([z - 1 for z in zone_ids if 1 <= z <= n], dtype=np.intp)
+
+    def _unknown_zones(self, restrictions, terrain):
+        """Zone ids in the constraints that no 1-based zone index matches"""
+        n = self.locator.zone_count
+        lists = [restrictions.get('protected_areas', []), terrain.get('unsafe_terrain_zones', [])]
+        lists += [closure.get('zones', []) for closure in restrictions.get('seasonal_closures', {}).values()]
+        lists += [rule.get('zones', []) for rule in restrictions.get('weather_based', {}).values() if rule]
+        return [z for zone_ids in lists for z in zone_ids if not 1 <= z <= n]
+
+    def bitmap_for(self, day):
+        """Restriction flags per zone for a calendar day, cached"""
+        bitmaps = self._bitmaps
+        bitmap = bitmaps.get(day)
+        if bitmap is not None:
+            return bitmap
+
+        rules = self.rules
+        bitmap = rules.static_mask | rules.month_masks[day.month]
+        weather = self.weather_lookup(datetime(day.year, day.month, day.day))
+        for zones, (field, op, threshold), flag in rules.weather_rules:
+            value = weather.get(field)
+            if value is None:
+                continue
+            if (op == '>' and value > threshold) or (op == '<' and value < threshold):
+                bitmap[zones] |= flag
+
+        bitmaps[day] = bitmap
+        return bitmap
+
+    def classify(self, timestamps, zones):
+        """Restriction flags for each position given its timestamp and zone index"""
+        days = np.asarray(timestamps).astype(np.int64).astype('datetime64[s]').astype('datetime64[D]')
+        unique_days, day_index = np.unique(days, return_inverse=True)
+        table = np.stack([self.bitmap_for(d.item()) for d in unique_days]) if len(unique_days) else \
+            np.zeros((0, self.locator.zone_count + 1), dtype=np.uint8)
+
+        # zone -1 (outside) lands on the trailing out-of-bounds slot
+        return table[day_index, zones]
+
+    def check(self, fixes, zones):
+        """Classify a batch of fixes and return newly raised violation events"""
+        flags = self.classify(fixes['timestamp'], zones)
+        violating = np.flatnonzero(flags)
+        if len(violating) == 0:
+            return []
+
+        # Keep the first violation per (herd, animal, zone) in this batch
+        keys = np.stack([fixes['herd'][violating], fixes['animal'][violating],
+                         zones[violating].astype(np.int32)], axis=1)
+        _, first = np.unique(keys, axis=0, return_index=True)
+        violating = violating[np.sort(first)]
+
+        new_events = []
+        with self._lock:
+            for i in violating.tolist():
+                key = (int(fixes['herd'][i]), int(fixes['animal'][i]), int(zones[i]))
+                timestamp = float(fixes['timestamp'][i])
+                last = self._last_alert.get(key)
+                if last is not None and timestamp - last < self.cooldown:
+                    continue
+                self._last_alert[key] = timestamp
+
+                event = {
+                    'herd_id': key[0],
+                    'animal_id': key[1],
+                    'zone_id': key[2] if key[2] >= 0 else None,
+                    'timestamp': timestamp,
+                    'lat': float(fixes['lat'][i]),
+                    'lon': float(fixes['lon'][i]),
+                    'reasons': reason_names(int(flags[i]))
+                }
+                self.recent.append(event)
+                new_events.append(event)
+
+            if len(self._last_alert) > MAX_ALERT_KEYS:
+                self._prune_alerts(float(fixes['timestamp'][violating].max()))
+        return new_events
+
+    def _prune_alerts(self, now):
+        """Forget cooldowns that have run out, then the oldest if still over MAX_ALERT_KEYS"""
+        alerts = {key: t for key, t in self._last_alert.items() if now - t < self.cooldown}
+        if len(alerts) > MAX_ALERT_KEYS:
+            newest = sorted(alerts.items(), key=lambda item: item[1])[-MAX_ALERT_KEYS:]
+            alerts = dict(newest)
+        self._last_alert = alerts
@@ -0,0 +1,253 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+DEFAULT_FLUSH_INTERVAL = 0.05   # Seconds between write-behind flushes
+DEFAULT_CACHE_HERDS = 1024      # Herds whose state is kept in memory
+MAX_PENDING_HERDS = 5000        # Herds with pending updates that trigger an early flush
+BUSY_TIMEOUT_MS = 5000          # How long a writer waits for another worker's transaction
+
+# Herd used by requests that don't name one (the dashboard's simulated herd)
+DEFAULT_HERD = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS zone_usage (
+    region TEXT NOT NULL,
+    herd_id INTEGER NOT NULL,
+    zone_id INTEGER NOT NULL,
+    days INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (region, herd_id, zone_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS herd_position (
+    region TEXT NOT NULL,
+    herd_id INTEGER NOT NULL,
+    current_zone INTEGER,
+    zone_entered_at REAL,
+    last_fix_timestamp REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (region, herd_id)
+) WITHOUT ROWID;
+"""
+
+
+class HerdStateStore:
+    """Herd zone usage and collar positions persisted in SQLite (WAL mode)
+
+    Updates are applied to an in-memory overlay and written in batches by
+    a background thread, one transaction per flush. Usage counts are
+    written as increments (`days = days + ?`), so several worker processes
+    sharing the file never lose each other's updates. Reads come from an
+    LRU cache of hot herds plus this process's unflushed updates; the
+    cache is dropped whenever SQLite reports another connection committed
+    (`PRAGMA data_version`), so workers see each other's changes within
+    one flush interval.
+    """
+
+    def __init__(self, path, region, flush_interval=DEFAULT_FLUSH_INTERVAL, cache_herds=DEFAULT_CACHE_HERDS):
+        self.path = path
+        self.region = region
+        self.flush_interval = flush_interval
+        self.cache_herds = cache_herds
+
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._data_version = None
+        self._usage_cache = OrderedDict()     # herd -> {zone: days} as stored
+        self._position_cache = OrderedDict()  # herd -> position row as stored, or None
+        self._pending_usage = defaultdict(lambda: defaultdict(int))  # herd -> {zone: days} not yet written
+        self._pending_positions = {}          # herd -> latest unwritten position
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+
+        self.flushes = 0
+        self.rows_written = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.invalidations = 0
+
+    def _connect(self):
+        """Connection for the current process, opened lazily (a forked worker gets its own)"""
+        if self._connection is None or self._pid != os.getpid():
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._connection = connection
+            self._pid = os.getpid()
+            self._data_version = None
+            self._usage_cache.clear()
+            self._position_cache.clear()
+            self._thread = None
+        if self._thread is None and self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name=f'herd-state-{self.region}', daemon=True)
+            self._thread.start()
+        return self._connection
+
+    def _check_external_writes(self, connection):
+        """Drop cached rows if another connection has committed since the last check"""
+        version = connection.execute('PRAGMA data_version').fetchone()[0]
+        if version != self._data_version:
+            if self._data_version is not None:
+                self.invalidations += 1
+            self._usage_cache.clear()
+            self._position_cache.clear()
+            self._data_version = version
+
+    def _cached(self, cache, herd_id, load):
+        if herd_id in cache:
+            cache.move_to_end(herd_id)
+            self.cache_hits += 1
+            return cache[herd_id]
+        self.cache_misses += 1
+        value = cache[herd_id] = load()
+        while len(cache) > self.cache_herds:
+            cache.popitem(last=False)
+        return value
+
+    # Zone usage
+
+    def record_zone_day(self, herd_id, zone_id, days=1):
+        """Count days a herd has grazed a zone"""
+        with self._lock:
+            self._pending_usage[herd_id][zone_id] += days
+            pending = len(self._pending_usage) + len(self._pending_positions)
+        if pending >= MAX_PENDING_HERDS:
+            self._wake.set()
+
+    def zone_usage(self, herd_id=DEFAULT_HERD):
+        """{zone_id: days} for a herd, including updates not yet written"""
+        with self._lock:
+            connection = self._connect()
+            self._check_external_writes(connection)
+            stored = self._cached(self._usage_cache, herd_id, lambda: dict(connection.execute(
+                'SELECT zone_id, days FROM zone_usage WHERE region = ? AND herd_id = ?',
+                (self.region, herd_id)).fetchall()))
+            usage = dict(stored)
+            for zone_id, days in self._pending_usage.get(herd_id, {}).items():
+                usage[zone_id] = usage.get(zone_id, 0) + days
+        return usage
+
+    # Collar positions
+
+    def record_position(self, herd_id, current_zone, zone_entered_at, last_fix_timestamp):
+        """Latest zone state derived from a herd's telemetry; later calls replace earlier ones"""
+        with self._lock:
+            self._pending_positions[herd_id] = {
+                'current_zone': current_zone,
+                'zone_entered_at': zone_entered_at,
+                'last_fix_timestamp': last_fix_timestamp
+            }
+            pending = len(self._pending_usage) + len(self._pending_positions)
+        if pending >= MAX_PENDING_HERDS:
+            self._wake.set()
+
+    def position(self, herd_id):
+        """Last recorded zone state of a herd, or None if it has never reported"""
+        with self._lock:
+            pending = self._pending_positions.get(herd_id)
+            if pending is not None:
+                return dict(pending)
+            connection = self._connect()
+            self._check_external_writes(connection)
+
+            def load():
+                row = connection.execute(
+                    'SELECT current_zone, zone_entered_at, last_fix_timestamp FROM herd_position '
+                    'WHERE region = ? AND herd_id = ?', (self.region, herd_id)).fetchone()
+                if row is None:
+                    return None
+                return {'current_zone': row[0], 'zone_entered_at': row[1], 'last_fix_timestamp': row[2]}
+
+            stored = self._cached(self._position_cache, herd_id, load)
+        return None if stored is None else dict(stored)
+
+    # Write-behind
+
+    def flush(self):
+        """Write all pending updates in one transaction"""
+        with self._lock:
+            if not self._pending_usage and not self._pending_positions:
+                return 0
+            connection = self._connect()
+            usage, self._pending_usage = self._pending_usage, defaultdict(lambda: defaultdict(int))
+            rows = [(herd, zone, days) for herd, zones in usage.items() for zone, days in zones.items()]
+            positions, self._pending_positions = self._pending_positions, {}
+            now = time.time()
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.executemany(
+                    'INSERT INTO zone_usage (region, herd_id, zone_id, days, updated_at) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (region, herd_id, zone_id) DO UPDATE SET '
+                    'days = days + excluded.days, updated_at = excluded.updated_at',
+                    [(self.region, herd, zone, days, now) for herd, zone, days in rows])
+                connection.executemany(
+                    'INSERT OR REPLACE INTO herd_position '
+                    '(region, herd_id, current_zone, zone_entered_at, last_fix_timestamp, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(self.region, herd, p['current_zone'], p['zone_entered_at'], p['last_fix_timestamp'], now)
+                     for herd, p in positions.items()])
+                connection.execute('COMMIT')
+            except sqlite3.Error:
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+                # Keep the updates for the next attempt, behind anything recorded since
+                for herd, zone, days in rows:
+                    self._pending_usage[herd][zone] += days
+                for herd, p in positions.items():
+                    self._pending_positions.setdefault(herd, p)
+                raise
+
+            # Our own commits don't change data_version, so update the cache in place
+            for herd, zone, days in rows:
+                if herd in self._usage_cache:
+                    self._usage_cache[herd][zone] = self._usage_cache[herd].get(zone, 0) + days
+            for herd, p in positions.items():
+                if herd in self._position_cache:
+                    self._position_cache[herd] = p
+            self.flushes += 1
+            self.rows_written += len(rows) + len(positions)
+            return len(rows) + len(positions)
+
+    def _run(self):
+        pid = os.getpid()
+        while not self._closed and self._pid == pid:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"⚠️ Herd state flush for '{self.region}' failed, retrying: {e}")
+
+    def close(self):
+        """Write what is pending and release the database"""
+        self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                if self._connection is not None and self._pid == os.getpid():
+                    self._connection.close()
+                self._connection = None
+
+    def stats(self):
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'path': self.path,
+            'pending_updates': len(self._pending_usage) + len(self._pending_positions),
+            'cached_herds': len(self._usage_cache) + len(self._position_cache),
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'cache_hit_rate': round(self.cache_hits / lookups, 4) if lookups else None,
+            'invalidations': self.invalidations,
+            'flush_interval_ms': self.flush_interval * 1000
+        }
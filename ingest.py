@@ -0,0 +1,240 @@
+import argparse
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+# Column order used when a data file is created from scratch
+WEATHER_COLUMNS = ['date', 'temperature', 'humidity', 'rainfall', 'description']
+VEGETATION_COLUMNS = ['date', 'zone_id', 'ndvi', 'biomass_kg_per_hectare',
+                      'carrying_capacity_sheep_per_hectare', 'grass_quality',
+                      'accessible', 'restriction_reason']
+TRACKING_COLUMNS = ['date', 'herd_id', 'current_zone', 'grazing_hours', 'distance_traveled_km',
+                    'animals_lost', 'predator_encounters', 'days_in_zone', 'zone_accessible',
+                    'constraint_violation']
+
+# Plausible ranges for incoming observations
+WEATHER_RANGES = {'temperature': (-50, 60), 'humidity': (0, 100), 'rainfall': (0, 500)}
+VEGETATION_RANGES = {'ndvi': (-1, 1), 'biomass_kg_per_hectare': (0, 20000),
+                     'carrying_capacity_sheep_per_hectare': (0, 100)}
+TRACKING_RANGES = {'grazing_hours': (0, 24), 'distance_traveled_km': (0, 200),
+                   'animals_lost': (0, 100000), 'predator_encounters': (0, 10000)}
+
+DEFAULT_MAX_SHEEP_PER_HECTARE = 8
+
+
+class IngestError(ValueError):
+    """Raised when new observations fail validation"""
+
+
+def grass_quality_for(ndvi):
+    """Grass quality labels as assigned by GrazingDataGenerator"""
+    return np.select([ndvi > 0.6, ndvi > 0.4, ndvi > 0.2],
+                     ['excellent', 'good', 'poor'], default='very_poor')
+
+
+def _check_ranges(df, ranges):
+    for column, (low, high) in ranges.items():
+        values = df[column]
+        bad = values.isna() | (values < low) | (values > high)
+        if bad.any():
+            raise IngestError(f"{column} out of range [{low}, {high}] on {bad.sum()} row(s)")
+
+
+def _prepare(rows, required, numeric):
+    df = rows.copy() if isinstance(rows, pd.DataFrame) else pd.DataFrame(list(rows))
+    if df.empty:
+        return df
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise IngestError(f"Missing column(s): {', '.join(missing)}")
+    try:
+        df['date'] = pd.to_datetime(df['date'])
+        for column in numeric:
+            if column in df.columns:
+                df[column] = pd.to_numeric(df[column])
+    except (ValueError, TypeError) as e:
+        raise IngestError(f"Unparseable value: {e}")
+    return df
+
+
+def _check_append_only(df, keys, last_date):
+    if df.duplicated(keys).any():
+        raise IngestError(f"Duplicate rows for {', '.join(keys)}")
+    if last_date is not None and (df['date'] <= last_date).any():
+        raise IngestError(f"Rows must be newer than the last stored date {pd.Timestamp(last_date).date()}")
+
+
+def validate_weather(rows, last_date=None):
+    """Validate and normalise new weather rows (one per day)"""
+    df = _prepare(rows, ['date', 'temperature', 'rainfall'], WEATHER_RANGES)
+    if df.empty:
+        return df
+    if 'humidity' not in df.columns:
+        df['humidity'] = np.nan
+    df['humidity'] = df['humidity'].fillna(65.0)
+    if 'description' not in df.columns:
+        df['description'] = 'measured_data'
+
+    _check_ranges(df, WEATHER_RANGES)
+    _check_append_only(df, ['date'], last_date)
+    return df.sort_values('date').reset_index(drop=True)
+
+
+def validate_vegetation(rows, last_date=None, zone_count=None, max_sheep_per_hectare=DEFAULT_MAX_SHEEP_PER_HECTARE):
+    """Validate and normalise new vegetation rows (one per zone and date)"""
+    df = _prepare(rows, ['date', 'zone_id', 'ndvi'], VEGETATION_RANGES)
+    if df.empty:
+        return df
+
+    if not (df['zone_id'] == df['zone_id'].round()).all():
+        raise IngestError("zone_id must be an integer")
+    df['zone_id'] = df['zone_id'].astype(int)
+    if (df['zone_id'] < 1).any() or (zone_count is not None and (df['zone_id'] > zone_count).any()):
+        raise IngestError(f"zone_id must be between 1 and {zone_count}")
+
+    # Derived columns follow the generator when a feed only provides NDVI
+    if 'biomass_kg_per_hectare' not in df.columns:
+        df['biomass_kg_per_hectare'] = (df['ndvi'] * 1200).round(1)
+    if 'carrying_capacity_sheep_per_hectare' not in df.columns:
+        df['carrying_capacity_sheep_per_hectare'] = np.minimum(df['ndvi'] * 12, max_sheep_per_hectare).round(1)
+    if 'grass_quality' not in df.columns:
+        df['grass_quality'] = grass_quality_for(df['ndvi'].to_numpy())
+    if 'accessible' not in df.columns:
+        df['accessible'] = True
+    df['accessible'] = df['accessible'].astype(bool)
+    if 'restriction_reason' not in df.columns:
+        df['restriction_reason'] = None
+
+    _check_ranges(df, VEGETATION_RANGES)
+    _check_append_only(df, ['date', 'zone_id'], last_date)
+    return df.sort_values(['date', 'zone_id']).reset_index(drop=True)
+
+
+def validate_tracking(rows, zone_count=None):
+    """Validate and normalise new livestock tracking rows (one per herd and date)
+
+    Herds report independently, so rows only have to be unique per herd
+    and date, not newer than what is stored.
+    """
+    df = _prepare(rows, ['date', 'herd_id', 'current_zone'],
+                  ['herd_id', 'current_zone', 'days_in_zone', *TRACKING_RANGES])
+    if df.empty:
+        return df
+
+    for column in ('herd_id', 'current_zone'):
+        if not (df[column] == df[column].round()).all():
+            raise IngestError(f"{column} must be an integer")
+        df[column] = df[column].astype(int)
+    if (df['current_zone'] < 1).any() or (zone_count is not None and (df['current_zone'] > zone_count).any()):
+        raise IngestError(f"current_zone must be between 1 and {zone_count}")
+
+    for column in TRACKING_RANGES:
+        if column not in df.columns:
+            df[column] = 0
+    if 'days_in_zone' not in df.columns:
+        df['days_in_zone'] = None
+    if 'zone_accessible' not in df.columns:
+        df['zone_accessible'] = True
+    if 'constraint_violation' not in df.columns:
+        df['constraint_violation'] = False
+    for column in ('zone_accessible', 'constraint_violation'):
+        df[column] = df[column].astype(bool)
+
+    _check_ranges(df, TRACKING_RANGES)
+    if df.duplicated(['date', 'herd_id']).any():
+        raise IngestError("Duplicate rows for date, herd_id")
+    return df.sort_values(['date', 'herd_id']).reset_index(drop=True)
+
+
+def read_header(path):
+    """Column names from the first line of a CSV file"""
+    with open(path, 'r') as f:
+        return f.readline().strip().split(',')
+
+
+def last_stored_date(path):
+    """Date of the last row of a CSV file, read from the end of the file"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        chunk = b''
+        # Read backwards until a full last line is available
+        while position > 0 and chunk.rstrip(b'\n').count(b'\n') < 1:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            chunk = f.read(step) + chunk
+    last = chunk.rstrip(b'\n').split(b'\n')[-1].decode('utf-8')
+    if last.startswith('date'):  # Header only
+        return None
+    return pd.Timestamp(last.split(',')[0])
+
+
+def append_csv(path, df, default_columns):
+    """Append rows to a CSV file without reading or rewriting what is there"""
+    exists = os.path.exists(path) and os.path.getsize(path) > 0
+    columns = read_header(path) if exists else default_columns
+    out = df.reindex(columns=columns)
+    out['date'] = pd.to_datetime(out['date']).dt.strftime('%Y-%m-%d')
+
+    if exists:
+        # Make sure the new rows start on their own line
+        with open(path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+        if needs_newline:
+            with open(path, 'a') as f:
+                f.write('\n')
+    out.to_csv(path, mode='a', header=not exists, index=False)
+
+
+def read_appended_rows(path, offset):
+    """Parse only the rows written after byte `offset` of a CSV file"""
+    columns = read_header(path)
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        tail = f.read()
+    if not tail.strip():
+        return pd.DataFrame(columns=columns)
+    df = pd.read_csv(io.BytesIO(tail), header=None, names=columns)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Append new weather, vegetation and tracking observations')
+    parser.add_argument('--data-folder', default='grazing_data')
+    parser.add_argument('--weather', help='CSV of new weather rows')
+    parser.add_argument('--vegetation', help='CSV of new vegetation rows')
+    parser.add_argument('--tracking', help='CSV of new livestock tracking rows')
+    parser.add_argument('--zones', type=int, default=None, help='Number of zones for zone_id validation')
+    args = parser.parse_args()
+
+    if args.weather:
+        path = os.path.join(args.data_folder, 'weather_data.csv')
+        rows = validate_weather(pd.read_csv(args.weather), last_stored_date(path))
+        append_csv(path, rows, WEATHER_COLUMNS)
+        print(f"✓ Appended {len(rows)} weather rows to {path}")
+
+    if args.vegetation:
+        path = os.path.join(args.data_folder, 'vegetation_data.csv')
+        rows = validate_vegetation(pd.read_csv(args.vegetation), last_stored_date(path), args.zones)
+        append_csv(path, rows, VEGETATION_COLUMNS)
+        print(f"✓ Appended {len(rows)} vegetation rows to {path}")
+
+    if args.tracking:
+        path = os.path.join(args.data_folder, 'livestock_tracking.csv')
+        rows = validate_tracking(pd.read_csv(args.tracking), args.zones)
+        append_csv(path, rows, TRACKING_COLUMNS)
+        print(f"✓ Appended {len(rows)} tracking rows to {path}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except IngestError as e:
+        raise SystemExit(f"❌ Rejected: {e}")
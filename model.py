@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+
+try:
+    import torch
+    import torch.nn as nn
+    import torch.nn.functional as F
+except ImportError:  # Predictions can still be served from a policy table
+    torch = None
+
+
+if torch is not None:
+    class SimpleNetwork(nn.Module):
+        """Recreate the exact same network architecture from your training code"""
+        def __init__(self, state_dim, action_dim, hidden_dim=32):
+            super(SimpleNetwork, self).__init__()
+            self.state_dim = state_dim
+            self.action_dim = action_dim  # One action per zone
+            self.hidden_dim = hidden_dim
+
+            # Must match your training code exactly
+            self.shared = nn.Sequential(
+                nn.Linear(state_dim, hidden_dim),
+                nn.ReLU(),
+                nn.Linear(hidden_dim, hidden_dim // 2),
+                nn.ReLU()
+            )
+
+            self.actor = nn.Linear(hidden_dim // 2, action_dim)
+            self.critic = nn.Linear(hidden_dim // 2, 1)
+
+        def forward(self, state):
+            features = self.shared(state)
+            return features
+
+        def get_action_probs(self, state):
+            features = self.forward(state)
+            logits = self.actor(features)
+            return F.softmax(logits, dim=-1)
+
+        def get_value(self, state):
+            features = self.forward(state)
+            return self.critic(features)
+
+
+def load_model(model_path='simple_model_final.pth'):
+    """Load the trained model, returning None if it is unavailable"""
+    if torch is None:
+        print("❌ torch is not installed; only policy table predictions are available")
+        return None
+
+    if not os.path.exists(model_path):
+        print(f"❌ Model file '{model_path}' not found!")
+        print("Make sure you have:")
+        print("1. Trained your model and saved it as 'simple_model_final.pth'")
+        print("2. Placed the model file in the same directory as this server")
+        return None
+
+    try:
+        # Load the saved state
+        checkpoint = torch.load(model_path, map_location="cpu", weights_only=False)
+
+        # Handle different save formats
+        if isinstance(checkpoint, dict) and 'policy_state_dict' in checkpoint:
+            state_dict = checkpoint['policy_state_dict']
+            print("✅ Loaded model from checkpoint format")
+        else:
+            state_dict = checkpoint
+            print("✅ Loaded model from direct state_dict format")
+
+        # Create the model with the sizes it was trained with; the action count is the zone count
+        hidden_dim, state_dim = state_dict['shared.0.weight'].shape
+        action_dim = state_dict['actor.weight'].shape[0]
+        model = SimpleNetwork(state_dim=state_dim, action_dim=action_dim, hidden_dim=hidden_dim)
+        model.load_state_dict(state_dict)
+
+        model.eval()  # Set to evaluation mode
+
+        print("🎯 Model loaded successfully!")
+        return model
+
+    except Exception as e:
+        print(f"❌ Error loading model: {e}")
+        return None
+
+
+def predict_action(model, state_vector):
+    """Use the trained model to predict the best action"""
+    if model is None:
+        raise Exception("Model not loaded")
+
+    try:
+        # Convert to tensor
+        state_tensor = torch.tensor(state_vector, dtype=torch.float32).unsqueeze(0)
+
+        with torch.no_grad():
+            # Get action probabilities
+            action_probs = model.get_action_probs(state_tensor)
+            state_value = model.get_value(state_tensor)
+
+            # Get the recommended action (highest probability)
+            recommended_action = torch.argmax(action_probs, dim=1).item()
+            confidence = action_probs[0][recommended_action].item()
+
+            return {
+                'recommended_action': int(recommended_action),
+                'confidence': float(confidence),
+                'action_probabilities': [float(x) for x in action_probs[0].tolist()],
+                'state_value': float(state_value.item()),
+                'expected_reward': float(state_value.item())
+            }
+
+    except Exception as e:
+        raise Exception(f"Prediction error: {str(e)}")
+
+
+def predict_probabilities(model, state_vectors):
+    """Action probabilities for a batch of state vectors in one forward pass"""
+    state_tensor = torch.tensor(np.asarray(state_vectors), dtype=torch.float32)
+    with torch.no_grad():
+        return model.get_action_probs(state_tensor).numpy()
@@ -0,0 +1,333 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from environment import BASE_DATE, day_of_year
+from reloader import file_signature
+from timeindex import NEAREST, LOOKUP_MODES
+
+TABLE_FILE = 'table.npy'
+META_FILE = 'meta.json'
+DEFAULT_BATCH_SIZE = 65536
+DEFAULT_ERROR_SAMPLES = 5000
+
+DAYS = 365
+DAY_FEATURE = 'day_of_year'  # How table days become the model's day input, recorded in the metadata
+
+# Quantised inputs: axis -> (low, high, default number of levels); a high of None is the zone count
+AXES = {
+    'herd_health': (0.0, 100.0, 6),
+    'days_in_zone': (0.0, 20.0, 6),
+    'cumulative_reward': (-500.0, 500.0, 5),
+    'zones_used': (0.0, None, 6)
+}
+
+
+def entry_dtype(actions):
+    """One table entry: argmax action, probabilities in 1/255 steps, state value"""
+    return np.dtype([
+        ('action', '<u2'),
+        ('probs', 'u1', (actions,)),
+        ('value', '<f2')
+    ])
+
+# Data files whose contents are baked into the table
+DATA_FILES = ('grazing_constraints.json', 'vegetation_data.csv', 'weather_data.csv')
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def grid_levels(axes, zone_count):
+    """Grid points per axis from {axis: number of levels}"""
+    return {
+        name: np.linspace(low, zone_count if high is None else high, axes[name])
+        for name, (low, high, _) in AXES.items()
+    }
+
+
+def day_features(start_date):
+    """Model day input of each table day: its day of year, as /predict derives it from a date"""
+    return np.array([day_of_year(start_date + timedelta(days=d)) for d in range(DAYS)])
+
+
+def build_state_batch(zone_count, zone, day, env, herd_health, days_in_zone, cumulative_reward, zones_used):
+    """Vectorised EnvironmentalDataManager.build_state_vector over broadcast arrays
+
+    `env` holds temperature, rainfall, ndvi and carrying_capacity already
+    looked up for each (zone, day).
+    """
+    zone, day, herd_health, days_in_zone, cumulative_reward, zones_used, temperature, rainfall, ndvi, capacity = \
+        np.broadcast_arrays(zone, day, herd_health, days_in_zone, cumulative_reward, zones_used,
+                            env['temperature'], env['rainfall'], env['ndvi'], env['carrying_capacity'])
+    return np.stack([
+        zone / max(zone_count - 1, 1),
+        day / 365.0,
+        np.clip(temperature / 30.0, 0, 1),
+        np.minimum(rainfall / 30.0, 1),
+        ndvi,
+        np.minimum(capacity / 15.0, 1),
+        herd_health / 100.0,
+        np.minimum(days_in_zone / 20.0, 1),
+        np.clip(cumulative_reward / 500.0, -1, 1),
+        np.minimum(zones_used / zone_count, 1),
+        np.sin(2 * np.pi * day / 365),
+        (day % 7) / 7.0
+    ], axis=-1).astype(np.float32)
+
+
+def environment_grid(snapshot, start_date, mode=NEAREST):
+    """Temperature, rainfall, NDVI and capacity for every (zone, day) of the table"""
+    zones = snapshot.zone_count
+    dates = np.array([start_date + timedelta(days=d) for d in range(DAYS)], dtype='datetime64[D]')
+    vegetation = snapshot.vegetation_batch(np.arange(zones)[:, None], dates[None, :], mode)
+    weather = snapshot.weather_batch(dates, mode)
+    return {
+        'temperature': np.broadcast_to(weather['temperature'][None, :], (zones, DAYS)),
+        'rainfall': np.broadcast_to(weather['rainfall'][None, :], (zones, DAYS)),
+        'ndvi': vegetation['ndvi'],
+        'carrying_capacity': vegetation['carrying_capacity']
+    }
+
+
+def evaluate(model, states):
+    """Probabilities and values of the network for a (n, 12) float32 batch"""
+    import torch
+
+    with torch.no_grad():
+        x = torch.from_numpy(states)
+        features = model.forward(x)
+        probs = torch.softmax(model.actor(features), dim=-1).numpy()
+        values = model.critic(features)[:, 0].numpy()
+    return probs, values
+
+
+class PolicyTable:
+    """Memory-mapped table of quantised-state predictions
+
+    Lookups snap each input to the nearest grid level and read one entry;
+    no torch is needed to serve from it.
+    """
+
+    def __init__(self, directory, table, meta):
+        self.directory = directory
+        self.table = table
+        self.meta = meta
+        self.start_date = datetime.fromisoformat(meta['start_date'])
+        self.lookup_mode = meta['lookup_mode']
+        self.levels = {name: np.asarray(values) for name, values in meta['levels'].items()}
+        self.zone_count = table.shape[0]
+
+    @classmethod
+    def open(cls, meta_path):
+        directory = os.path.dirname(meta_path)
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        table = np.load(os.path.join(directory, TABLE_FILE), mmap_mode='r')
+        return cls(directory, table, meta)
+
+    def memory_bytes(self):
+        # Pages are mapped from the file and live in the shared page cache
+        return 0
+
+    def stale_reason(self, model_path, data_folder, zone_count=None):
+        """Why the table no longer matches the model, data or zone definitions, or None"""
+        if zone_count is not None and zone_count != self.zone_count:
+            return f'built for {self.zone_count} zones, region has {zone_count}'
+        # Older tables fed the table day index as the day input, which is only right from BASE_DATE
+        if self.meta.get('day_feature') != DAY_FEATURE and self.start_date != BASE_DATE:
+            return 'day inputs offset from its start date; distil again'
+        if os.path.exists(model_path) and file_sha256(model_path) != self.meta['model_sha256']:
+            return 'model changed since distillation'
+        for name, signature in self.meta['data_files'].items():
+            current = file_signature(os.path.join(data_folder, name))
+            if current is not None and list(current) != signature:
+                return f'{name} changed since distillation'
+        return None
+
+    def day_index(self, current_date):
+        day = (current_date - self.start_date).days
+        return day if 0 <= day < DAYS else None
+
+    def covers(self, zone, current_date, mode, current_day=None):
+        """Whether a request falls inside the table's zones, dates and lookup mode
+
+        A request's `current_day` (the model's day input) must also be the
+        day of year of its date, which day numbers past the first year are not.
+        """
+        if current_day is not None and current_day != day_of_year(current_date):
+            return False
+        return (mode == self.lookup_mode and 0 <= zone < self.zone_count and
+                self.day_index(current_date) is not None)
+
+    def quantise(self, name, value):
+        levels = self.levels[name]
+        low, high = levels[0], levels[-1]
+        position = (np.clip(value, low, high) - low) / (high - low) * (len(levels) - 1)
+        return np.rint(position).astype(np.intp)
+
+    def entries(self, zone, day, herd_health, days_in_zone, cumulative_reward, zones_used):
+        """Entries for broadcast arrays of inputs; `day` is the table day index"""
+        return self.table[
+            np.asarray(zone, dtype=np.intp),
+            np.asarray(day, dtype=np.intp),
+            self.quantise('herd_health', herd_health),
+            self.quantise('days_in_zone', days_in_zone),
+            self.quantise('cumulative_reward', cumulative_reward),
+            self.quantise('zones_used', zones_used)
+        ]
+
+    def predict(self, zone, current_date, herd_health, days_in_zone, cumulative_reward, zones_used):
+        """Prediction in the same shape as backend.predict_action"""
+        entry = self.entries(zone, self.day_index(current_date), herd_health, days_in_zone,
+                             cumulative_reward, zones_used)
+        probs = entry['probs'] / 255.0
+        action = int(entry['action'])
+        value = float(entry['value'])
+        return {
+            'recommended_action': action,
+            'confidence': float(probs[action]),
+            'action_probabilities': [float(p) for p in probs],
+            'state_value': value,
+            'expected_reward': value
+        }
+
+
+def distill(model, snapshot, out_dir, model_path, data_folder, levels=None, start_date=None,
+            mode=NEAREST, batch_size=DEFAULT_BATCH_SIZE):
+    """Evaluate the network over the whole grid and write the table to out_dir"""
+    zone_count = snapshot.zone_count
+    levels = grid_levels({name: n for name, (_, _, n) in AXES.items()} if levels is None else levels, zone_count)
+    start_date = start_date or BASE_DATE
+    names = list(AXES)
+    shape = (zone_count, DAYS) + tuple(len(levels[name]) for name in names)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Every combination of the quantised axes, flattened
+    mesh = np.meshgrid(*[levels[name] for name in names], indexing='ij')
+    combos = {name: grid.ravel() for name, grid in zip(names, mesh)}
+    per_day = len(combos[names[0]])
+    days_per_batch = max(1, batch_size // per_day)
+    env = environment_grid(snapshot, start_date, mode)
+    day_input = day_features(start_date)
+
+    tmp_path = os.path.join(out_dir, TABLE_FILE + '.tmp')
+    table = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=entry_dtype(model.action_dim), shape=shape)
+    started = time.perf_counter()
+    for zone in range(zone_count):
+        for d0 in range(0, DAYS, days_per_batch):
+            days = np.arange(d0, min(d0 + days_per_batch, DAYS))
+            zone_env = {k: v[zone, days][:, None] for k, v in env.items()}
+            states = build_state_batch(zone_count, zone, day_input[days][:, None], zone_env,
+                                       *(combos[name][None, :] for name in names))
+            probs, values = evaluate(model, states.reshape(-1, states.shape[-1]))
+
+            block = table[zone, d0:d0 + len(days)].reshape(-1)
+            block['action'] = probs.argmax(axis=1)
+            block['probs'] = np.rint(probs * 255)
+            block['value'] = values
+    table.flush()
+    del table
+    os.replace(tmp_path, os.path.join(out_dir, TABLE_FILE))
+    elapsed = time.perf_counter() - started
+
+    meta = {
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'start_date': start_date.date().isoformat(),
+        'day_feature': DAY_FEATURE,
+        'lookup_mode': mode,
+        'shape': list(shape),
+        'axes': ['zone', 'day'] + names,
+        'levels': {name: levels[name].tolist() for name in names},
+        'entries': int(np.prod(shape)),
+        'distill_seconds': round(elapsed, 2),
+        'model_sha256': file_sha256(model_path),
+        'data_files': {
+            name: list(file_signature(os.path.join(data_folder, name)) or [])
+            for name in DATA_FILES
+        }
+    }
+    with open(os.path.join(out_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def error_report(table, model, snapshot, samples=DEFAULT_ERROR_SAMPLES, seed=0):
+    """Compare table lookups at random off-grid states with the live network"""
+    rng = np.random.default_rng(seed)
+    zone_count = table.zone_count
+    zone = rng.integers(0, zone_count, samples)
+    day = rng.integers(0, DAYS, samples)
+    inputs = {
+        'herd_health': rng.uniform(0, 100, samples),
+        'days_in_zone': rng.integers(0, 21, samples).astype(np.float64),
+        'cumulative_reward': rng.uniform(-500, 500, samples),
+        'zones_used': rng.integers(0, zone_count + 1, samples).astype(np.float64)
+    }
+
+    env = environment_grid(snapshot, table.start_date, table.lookup_mode)
+    env_at = {k: v[zone, day] for k, v in env.items()}
+    states = build_state_batch(zone_count, zone, day_features(table.start_date)[day], env_at, *inputs.values())
+    probs, values = evaluate(model, states)
+
+    entries = table.entries(zone, day, *inputs.values())
+    table_probs = entries['probs'] / 255.0
+    table_values = entries['value'].astype(np.float64)
+    return {
+        'samples': samples,
+        'action_agreement': round(float((entries['action'] == probs.argmax(axis=1)).mean()), 4),
+        'probability_mae': round(float(np.abs(table_probs - probs).mean()), 5),
+        'probability_max_error': round(float(np.abs(table_probs - probs).max()), 5),
+        'value_mae': round(float(np.abs(table_values - values).mean()), 5),
+        'value_max_error': round(float(np.abs(table_values - values).max()), 5)
+    }
+
+
+def main():
+    from environment import EnvironmentalDataManager
+    from model import load_model
+    from regions import load_region_configs, DEFAULT_REGION, REGIONS_FILE
+    from telemetry import ZoneLocator
+
+    parser = argparse.ArgumentParser(description='Distil the grazing policy network into a lookup table')
+    parser.add_argument('--region', default=DEFAULT_REGION)
+    parser.add_argument('--out', help='Output directory (default: the region\'s policy_table)')
+    parser.add_argument('--start-date', default='2024-01-01', help='Date of table day 0')
+    parser.add_argument('--mode', default=NEAREST, choices=LOOKUP_MODES, help='Environment lookup mode')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--error-samples', type=int, default=DEFAULT_ERROR_SAMPLES)
+    for name, (_, _, n) in AXES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}-levels", type=int, default=n, dest=name)
+    args = parser.parse_args()
+
+    config = load_region_configs(REGIONS_FILE)[args.region]
+    out_dir = args.out or config['policy_table']
+    model = load_model(config['model_path'])
+    if model is None:
+        raise SystemExit("❌ Cannot distil without the model")
+    zone_count = ZoneLocator.from_zones_file(config['zones_file']).zone_count
+    env_data = EnvironmentalDataManager(config['data_folder'], zone_count=zone_count)
+
+    levels = {name: getattr(args, name) for name in AXES}
+    meta = distill(model, env_data.data, out_dir, config['model_path'], config['data_folder'], levels,
+                   datetime.fromisoformat(args.start_date), args.mode, args.batch_size)
+    print(f"✓ Wrote {meta['entries']:,} entries {meta['shape']} in {meta['distill_seconds']}s")
+
+    table = PolicyTable.open(os.path.join(out_dir, META_FILE))
+    meta['error_report'] = error_report(table, model, env_data.data, args.error_samples)
+    with open(os.path.join(out_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    print("📊 Error against the live model:")
+    for key, value in meta['error_report'].items():
+        print(f"   {key}: {value}")
+
+
+if __name__ == '__main__':
+    main()
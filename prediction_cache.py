@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CACHE_SIZE = 10000     # Entries kept before evicting the least recently used
+DEFAULT_CACHE_TTL = 300.0      # Seconds an entry stays valid
+DEFAULT_RESOLUTION = 0.01      # State vector quantisation step (features are ~0-1)
+
+
+class PredictionCache:
+    """LRU cache of predictions keyed by quantised state vector and model version
+
+    States closer than `resolution` in every feature share an entry, so
+    herds and dashboards asking about the same zone, day and health band
+    reuse one forward pass. A size of 0 disables the cache.
+    """
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, resolution=DEFAULT_RESOLUTION):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.resolution = resolution
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def key(self, state_vector, version):
+        quantised = np.rint(np.asarray(state_vector, dtype=np.float64) / self.resolution).astype(np.int64)
+        return (version, quantised.tobytes())
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after a model or data reload"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'resolution': self.resolution,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations
+        }
@@ -0,0 +1,151 @@
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+DEFAULT_SAMPLE_INTERVAL = 0.001   # Seconds between stack samples
+DEFAULT_ENDPOINTS = ('predict', 'get_zones_data', 'simulate_day')
+MAX_STACK_DEPTH = 128
+RECENT_PROFILES = 200             # Per-request profiles kept for download
+
+
+def fold_stack(frame):
+    """Collapse a frame chain into 'file:function;...' from the outermost call"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samples the stacks of selected request threads while a session is active
+
+    Nothing runs while no session is active: request hooks only read
+    `active`, and the sampling thread exists only during a session.
+    Stacks are kept per request and aggregated into collapsed-stack text
+    ("frame;frame;frame count"), the input format of flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.active = False
+        self.session = None
+        self.aggregate = Counter()
+        self.recent = deque(maxlen=RECENT_PROFILES)
+        self._running = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, fraction=1.0, duration=None, endpoints=DEFAULT_ENDPOINTS, interval=None):
+        """Profile `fraction` of matching requests, for `duration` seconds if given"""
+        with self._lock:
+            self.interval = interval or self.interval
+            self.session = {
+                'fraction': min(max(fraction, 0.0), 1.0),
+                'endpoints': set(endpoints),
+                'started_at': time.time(),
+                'expires_at': time.time() + duration if duration else None,
+                'requests': 0,
+                'samples': 0
+            }
+            self.aggregate = Counter()
+            self.recent.clear()
+            self.active = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self.active = False
+
+    def should_profile(self, endpoint):
+        session = self.session
+        if session is None or endpoint not in session['endpoints']:
+            return False
+        if session['expires_at'] is not None and time.time() >= session['expires_at']:
+            self.active = False
+            return False
+        return random.random() < session['fraction']
+
+    def begin(self, endpoint, path):
+        """Start sampling the calling thread; returns a token for `end`"""
+        profile = {
+            'id': next(self._ids),
+            'endpoint': endpoint,
+            'path': path,
+            'started_at': time.time(),
+            'stacks': Counter()
+        }
+        with self._lock:
+            self._running[threading.get_ident()] = profile
+        return profile
+
+    def end(self, profile):
+        profile['duration_ms'] = round((time.time() - profile['started_at']) * 1000, 3)
+        with self._lock:
+            self._running.pop(threading.get_ident(), None)
+            for stack, count in profile['stacks'].items():
+                self.aggregate[f"{profile['endpoint']};{stack}"] += count
+            self.recent.append(profile)
+            if self.session is not None:
+                self.session['requests'] += 1
+
+    def _run(self):
+        while self.active:
+            time.sleep(self.interval)
+            expires_at = self.session['expires_at']
+            if expires_at is not None and time.time() >= expires_at:
+                self.active = False
+                break
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, profile in self._running.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profile['stacks'][fold_stack(frame)] += 1
+                        self.session['samples'] += 1
+            del frames
+
+    def collapsed(self, profile_id=None):
+        """Collapsed stacks for one recent request, or aggregated over the session"""
+        with self._lock:
+            if profile_id is None:
+                stacks = Counter(self.aggregate)
+            else:
+                profile = next((p for p in self.recent if p['id'] == profile_id), None)
+                if profile is None:
+                    return None
+                stacks = Counter({f"{profile['endpoint']};{s}": c for s, c in profile['stacks'].items()})
+        return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    def stats(self):
+        session = self.session
+        return {
+            'active': self.active,
+            'interval_ms': self.interval * 1000,
+            'session': None if session is None else {
+                'fraction': session['fraction'],
+                'endpoints': sorted(session['endpoints']),
+                'started_at': session['started_at'],
+                'expires_at': session['expires_at'],
+                'requests': session['requests'],
+                'samples': session['samples']
+            },
+            'recent': [
+                {
+                    'id': p['id'],
+                    'endpoint': p['endpoint'],
+                    'path': p['path'],
+                    'duration_ms': p.get('duration_ms'),
+                    'samples': sum(p['stacks'].values())
+                }
+                for p in list(self.recent)[::-1]
+            ]
+        }
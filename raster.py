@@ -0,0 +1,384 @@
+import argparse
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from ingest import (IngestError, validate_vegetation, append_csv, last_stored_date, VEGETATION_COLUMNS)
+from telemetry import ZoneLocator
+
+NDVI_BINS = 2000                 # Histogram bins over [-1, 1] for percentiles (0.001 NDVI wide)
+PERCENTILES = (10, 50, 90)
+TILE_BYTES = 8 * 1024 * 1024     # Raster bytes read per tile (working memory is ~16x this for int16)
+MIN_COVERAGE = 0.2               # Zones with less valid (cloud-free) area get no row
+LABEL_CACHE_DIR = 'raster_cache'
+LABEL_CACHE_SIZE = 4             # Label masks kept in memory
+
+# TIFF tags read by the GeoTIFF reader
+TIFF_TAGS = {
+    256: 'width', 257: 'height', 258: 'bits', 259: 'compression', 273: 'strip_offsets',
+    277: 'samples', 278: 'rows_per_strip', 279: 'strip_byte_counts', 284: 'planar', 322: 'tile_width',
+    339: 'sample_format', 33550: 'pixel_scale', 33922: 'tiepoint', 42113: 'nodata'
+}
+TIFF_TYPES = {1: 'B', 2: 's', 3: 'H', 4: 'I', 11: 'f', 12: 'd', 16: 'Q'}
+TIFF_SAMPLE_FORMATS = {1: 'u', 2: 'i', 3: 'f'}
+
+
+class RasterError(ValueError):
+    """Raised for raster files the reader can't map"""
+
+
+class Raster:
+    """A single-band raster mapped from disk, on a north-up lat/lon grid
+
+    `transform` is (lon0, lat0, dlon, dlat): the outer corner of pixel
+    (0, 0) and the pixel size, dlat negative for north-up images. Pixel
+    data is never read as a whole: `read` copies one window at a time out
+    of the memory map.
+    """
+
+    def __init__(self, array, transform, nodata=None, path=None):
+        self.array = array
+        self.transform = tuple(float(v) for v in transform)
+        self.nodata = nodata
+        self.path = path
+
+    @classmethod
+    def open(cls, path):
+        """Map a GeoTIFF, a .npy array or a raw array with a JSON sidecar"""
+        extension = os.path.splitext(path)[1].lower()
+        if extension in ('.tif', '.tiff'):
+            return cls.open_geotiff(path)
+
+        # Georeferencing (and dtype/shape for raw files) lives in <path>.json
+        sidecar = path + '.json'
+        if not os.path.exists(sidecar):
+            raise RasterError(f"{path}: no georeferencing sidecar {sidecar}")
+        with open(sidecar, 'r') as f:
+            meta = json.load(f)
+        if extension == '.npy':
+            array = np.load(path, mmap_mode='r')
+        else:
+            array = np.memmap(path, dtype=np.dtype(meta['dtype']), mode='r', offset=meta.get('offset', 0),
+                              shape=tuple(meta['shape']))
+        if array.ndim != 2:
+            raise RasterError(f"{path}: expected a single band, got shape {array.shape}")
+        return cls(array, meta['transform'], meta.get('nodata'), path)
+
+    @classmethod
+    def open_geotiff(cls, path):
+        """Map an uncompressed, single-band, strip-organised GeoTIFF in EPSG:4326
+
+        Those are what `gdalwarp -t_srs EPSG:4326 -co COMPRESS=NONE` writes;
+        compressed or tiled files have to be converted first, since their
+        pixels can't be addressed in place.
+        """
+        with open(path, 'rb') as f:
+            header = f.read(8)
+            order = {b'II': '<', b'MM': '>'}.get(header[:2])
+            if order is None or struct.unpack(order + 'H', header[2:4])[0] != 42:
+                raise RasterError(f"{path}: not a classic TIFF (BigTIFF is not supported)")
+            tags = read_tiff_tags(f, order, struct.unpack(order + 'I', header[4:8])[0])
+
+        if tags.get('compression', [1])[0] != 1:
+            raise RasterError(f"{path}: compressed TIFF, convert with -co COMPRESS=NONE")
+        if 'tile_width' in tags:
+            raise RasterError(f"{path}: tiled TIFF, convert with -co TILED=NO")
+        if tags.get('samples', [1])[0] != 1:
+            raise RasterError(f"{path}: expected a single band")
+        if 'pixel_scale' not in tags or 'tiepoint' not in tags:
+            raise RasterError(f"{path}: no GeoTIFF georeferencing")
+
+        width, height = tags['width'][0], tags['height'][0]
+        kind = TIFF_SAMPLE_FORMATS[tags.get('sample_format', [1])[0]]
+        dtype = np.dtype(f"{order}{kind}{tags['bits'][0] // 8}")
+        offsets, counts = tags['strip_offsets'], tags['strip_byte_counts']
+        contiguous = all(offsets[i] + counts[i] == offsets[i + 1] for i in range(len(offsets) - 1))
+        if not contiguous or sum(counts) != width * height * dtype.itemsize:
+            raise RasterError(f"{path}: strips are not stored contiguously")
+        array = np.memmap(path, dtype=dtype, mode='r', offset=offsets[0], shape=(height, width))
+
+        # Tiepoint (i, j, k, lon, lat, z) ties raster pixel (i, j) to a coordinate
+        i, j, _, lon, lat, _ = tags['tiepoint'][:6]
+        scale_x, scale_y = tags['pixel_scale'][:2]
+        transform = (lon - i * scale_x, lat + j * scale_y, scale_x, -scale_y)
+        nodata = tags.get('nodata')
+        nodata = float(nodata.strip('\x00')) if nodata else None
+        return cls(array, transform, nodata, path)
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    @property
+    def grid_key(self):
+        return self.shape + self.transform
+
+    def window_for(self, lat_min, lat_max, lon_min, lon_max):
+        """(row0, row1, col0, col1) of the pixels overlapping a lat/lon box, clipped to the raster"""
+        lon0, lat0, dlon, dlat = self.transform
+        rows = sorted([(lat_max - lat0) / dlat, (lat_min - lat0) / dlat])
+        cols = sorted([(lon_min - lon0) / dlon, (lon_max - lon0) / dlon])
+        height, width = self.shape
+        row0, row1 = max(int(np.floor(rows[0])), 0), min(int(np.ceil(rows[1])), height)
+        col0, col1 = max(int(np.floor(cols[0])), 0), min(int(np.ceil(cols[1])), width)
+        return row0, max(row0, row1), col0, max(col0, col1)
+
+    def pixel_centres(self, row0, row1, col0, col1):
+        """Latitudes of the window's rows and longitudes of its columns"""
+        lon0, lat0, dlon, dlat = self.transform
+        return lat0 + (np.arange(row0, row1) + 0.5) * dlat, lon0 + (np.arange(col0, col1) + 0.5) * dlon
+
+    def read(self, row0, row1, col0, col1, scale=1.0, offset=0.0):
+        """Float32 copy of a window with nodata as NaN"""
+        values = np.asarray(self.array[row0:row1, col0:col1], dtype=np.float32)
+        if self.nodata is not None:
+            values[values == self.nodata] = np.nan
+        if scale != 1.0 or offset != 0.0:
+            values = values * np.float32(scale) + np.float32(offset)
+        return values
+
+
+def read_tiff_tags(f, order, ifd_offset):
+    """Values of the TIFF_TAGS present in the first image directory"""
+    f.seek(ifd_offset)
+    count = struct.unpack(order + 'H', f.read(2))[0]
+    entries = f.read(count * 12)
+    tags = {}
+    for n in range(count):
+        tag, kind, length, value = struct.unpack(order + 'HHI4s', entries[n * 12:(n + 1) * 12])
+        if tag not in TIFF_TAGS or kind not in TIFF_TYPES:
+            continue
+        code = TIFF_TYPES[kind]
+        size = struct.calcsize(code) * length
+        if size > 4:
+            position = f.tell()
+            f.seek(struct.unpack(order + 'I', value)[0])
+            value = f.read(size)
+            f.seek(position)
+        if code == 's':
+            tags[TIFF_TAGS[tag]] = value[:length].decode('ascii')
+        else:
+            tags[TIFF_TAGS[tag]] = list(struct.unpack(f"{order}{length}{code}", value[:size]))
+    return tags
+
+
+def rasterise_zones(raster, window, locator):
+    """Zone index of every pixel in a window, -1 outside all zones
+
+    Zones are the locator's circles; where circles overlap the nearest
+    centre wins, as in ZoneLocator.locate. Distances are separable in the
+    local projection, so each zone only touches its own bounding box.
+    """
+    row0, row1, col0, col1 = window
+    dtype = np.int8 if locator.zone_count < 127 else np.int16
+    labels = np.full((row1 - row0, col1 - col0), -1, dtype=dtype)
+    best = np.full(labels.shape, np.inf, dtype=np.float32)
+    lats, lons = raster.pixel_centres(row0, row1, col0, col1)
+    ys = (lats - locator.lat0) * locator.ky
+    xs = (lons - locator.lon0) * locator.kx
+    radius2 = locator.radius_km ** 2
+
+    for zone, (cx, cy) in enumerate(locator.center_xy.tolist()):
+        rows = np.flatnonzero(np.abs(ys - cy) <= locator.radius_km)
+        cols = np.flatnonzero(np.abs(xs - cx) <= locator.radius_km)
+        if len(rows) == 0 or len(cols) == 0:
+            continue
+        r = slice(rows[0], rows[-1] + 1)
+        c = slice(cols[0], cols[-1] + 1)
+        d2 = ((ys[r] - cy) ** 2)[:, None].astype(np.float32) + ((xs[c] - cx) ** 2)[None, :].astype(np.float32)
+        closer = (d2 <= radius2) & (d2 < best[r, c])
+        labels[r, c][closer] = zone
+        best[r, c][closer] = d2[closer]
+    return labels
+
+
+class LabelMaskCache:
+    """Zone label masks per raster grid, in memory and as .npy files on disk
+
+    Rasterising is done once per grid (shape, transform and zone layout);
+    later scenes on the same grid map the stored mask instead.
+    """
+
+    def __init__(self, folder=LABEL_CACHE_DIR, max_entries=LABEL_CACHE_SIZE):
+        self.folder = folder
+        self.max_entries = max_entries
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, raster, window, locator):
+        digest = hashlib.sha1()
+        digest.update(repr((raster.grid_key, window, locator.radius_km)).encode())
+        digest.update(np.ascontiguousarray(locator.centers).tobytes())
+        return digest.hexdigest()[:20]
+
+    def get(self, raster, window, locator):
+        key = self.key(raster, window, locator)
+        with self._lock:
+            labels = self._masks.get(key)
+            if labels is not None:
+                self._masks.move_to_end(key)
+                return labels
+
+        path = os.path.join(self.folder, f'labels_{key}.npy') if self.folder else None
+        if path and os.path.exists(path):
+            labels = np.load(path, mmap_mode='r')
+        else:
+            labels = rasterise_zones(raster, window, locator)
+            if path:
+                os.makedirs(self.folder, exist_ok=True)
+                # Written under a temporary name so a concurrent reader never sees half a file
+                tmp = f'{path}.{os.getpid()}.tmp.npy'
+                np.save(tmp, labels)
+                os.replace(tmp, path)
+
+        with self._lock:
+            self._masks[key] = labels
+            while len(self._masks) > self.max_entries:
+                self._masks.popitem(last=False)
+        return labels
+
+
+def zones_window(raster, locator):
+    """Raster window covering every zone"""
+    dlat = locator.radius_km / locator.ky
+    dlon = locator.radius_km / locator.kx
+    lats, lons = locator.centers[:, 0], locator.centers[:, 1]
+    return raster.window_for(lats.min() - dlat, lats.max() + dlat, lons.min() - dlon, lons.max() + dlon)
+
+
+def zonal_ndvi(locator, ndvi=None, red=None, nir=None, scale=1.0, offset=0.0, label_cache=None,
+               tile_bytes=TILE_BYTES):
+    """Per-zone NDVI mean, percentiles and valid coverage from one scene
+
+    Pass an NDVI raster, or red and NIR rasters on the same grid. Only the
+    window around the zones is read, in row tiles of about `tile_bytes`,
+    and every tile is reduced with one bincount per statistic, so memory
+    stays bounded by the tile size and the label mask.
+    """
+    started = time.perf_counter()
+    bands = [ndvi] if ndvi is not None else [red, nir]
+    if any(band is None for band in bands):
+        raise RasterError("Need an NDVI raster, or both red and NIR rasters")
+    grid = bands[0]
+    if any(band.grid_key != grid.grid_key for band in bands):
+        raise RasterError("Red and NIR rasters must share one grid")
+
+    window = zones_window(grid, locator)
+    row0, row1, col0, col1 = window
+    zone_count = locator.zone_count
+    label_cache = label_cache or LabelMaskCache(folder=None)
+    labels = label_cache.get(grid, window, locator)
+
+    zone_pixels = np.zeros(zone_count, dtype=np.int64)
+    sums = np.zeros(zone_count)
+    histogram = np.zeros(zone_count * NDVI_BINS, dtype=np.int64)
+    itemsize = sum(band.array.dtype.itemsize for band in bands)
+    tile_rows = max(1, tile_bytes // max(1, (col1 - col0) * itemsize))
+
+    for start in range(row0, row1, tile_rows):
+        stop = min(start + tile_rows, row1)
+        tile_labels = np.asarray(labels[start - row0:stop - row0])
+        inside = tile_labels >= 0
+        if not inside.any():
+            continue
+        zone_pixels += np.bincount(tile_labels[inside].astype(np.int64), minlength=zone_count)
+        if ndvi is not None:
+            values = ndvi.read(start, stop, col0, col1, scale, offset)[inside]
+        else:
+            r = red.read(start, stop, col0, col1, scale, offset)[inside]
+            n = nir.read(start, stop, col0, col1, scale, offset)[inside]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                values = (n - r) / (n + r)
+        zones = tile_labels[inside].astype(np.int64)
+
+        valid = np.isfinite(values) & (values >= -1) & (values <= 1)
+        values, zones = values[valid], zones[valid]
+        sums += np.bincount(zones, weights=values, minlength=zone_count)
+        bins = ((values + np.float32(1)) * np.float32(NDVI_BINS / 2)).astype(np.int64)
+        histogram += np.bincount(zones * NDVI_BINS + np.minimum(bins, NDVI_BINS - 1, out=bins),
+                                 minlength=zone_count * NDVI_BINS)
+
+    # Counts and percentiles from each zone's cumulative histogram, at bin centres
+    cumulative = histogram.reshape(zone_count, NDVI_BINS).cumsum(axis=1)
+    counts = cumulative[:, -1]
+    centres = (np.arange(NDVI_BINS) + 0.5) / (NDVI_BINS / 2) - 1
+    percentiles = {}
+    for q in PERCENTILES:
+        rank = np.ceil(counts * q / 100).clip(min=1)
+        position = (cumulative < rank[:, None]).sum(axis=1).clip(max=NDVI_BINS - 1)
+        percentiles[q] = np.where(counts > 0, centres[position], np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(counts > 0, sums / counts, np.nan)
+        coverage = np.where(zone_pixels > 0, counts / zone_pixels, 0.0)
+    stats = pd.DataFrame({
+        'zone_id': np.arange(1, zone_count + 1),
+        'ndvi': mean.round(4),
+        **{f'ndvi_p{q}': values.round(3) for q, values in percentiles.items()},
+        'coverage': coverage.round(4),
+        'valid_pixels': counts,
+        'zone_pixels': zone_pixels
+    })
+    stats.attrs['window'] = window
+    stats.attrs['seconds'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def vegetation_rows(stats, date, min_coverage=MIN_COVERAGE):
+    """Vegetation rows for the zones a scene covers well enough"""
+    covered = stats[stats['coverage'] >= min_coverage]
+    return pd.DataFrame({
+        'date': pd.Timestamp(date),
+        'zone_id': covered['zone_id'].to_numpy(),
+        'ndvi': covered['ndvi'].round(3).to_numpy()
+    })
+
+
+def open_bands(ndvi=None, red=None, nir=None):
+    """Open the rasters named by paths, leaving missing ones as None"""
+    return tuple(Raster.open(path) if path else None for path in (ndvi, red, nir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Append per-zone NDVI computed from a raster scene')
+    parser.add_argument('--date', required=True, help='Acquisition date of the scene')
+    parser.add_argument('--ndvi', help='NDVI raster')
+    parser.add_argument('--red', help='Red band raster (Sentinel-2 B04)')
+    parser.add_argument('--nir', help='NIR band raster (Sentinel-2 B08)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier applied to raw pixel values')
+    parser.add_argument('--offset', type=float, default=0.0, help='Added to scaled pixel values')
+    parser.add_argument('--zones-file', default='public/zones.json')
+    parser.add_argument('--data-folder', default='grazing_data')
+    parser.add_argument('--min-coverage', type=float, default=MIN_COVERAGE)
+    parser.add_argument('--cache-dir', default=LABEL_CACHE_DIR)
+    parser.add_argument('--dry-run', action='store_true', help='Print the statistics without appending')
+    args = parser.parse_args()
+
+    locator = ZoneLocator.from_zones_file(args.zones_file)
+    ndvi, red, nir = open_bands(args.ndvi, args.red, args.nir)
+    stats = zonal_ndvi(locator, ndvi=ndvi, red=red, nir=nir, scale=args.scale, offset=args.offset,
+                       label_cache=LabelMaskCache(args.cache_dir))
+    print(stats.to_string(index=False))
+    print(f"✓ Zonal statistics in {stats.attrs['seconds']}s over window {stats.attrs['window']}")
+    if args.dry_run:
+        return
+
+    path = os.path.join(args.data_folder, 'vegetation_data.csv')
+    rows = validate_vegetation(vegetation_rows(stats, args.date, args.min_coverage), last_stored_date(path),
+                               locator.zone_count)
+    append_csv(path, rows, VEGETATION_COLUMNS)
+    print(f"✓ Appended {len(rows)} vegetation rows to {path}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except (IngestError, RasterError) as e:
+        raise SystemExit(f"❌ Rejected: {e}")
@@ -0,0 +1,249 @@
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+DEFAULT_REGION = 'ifrane'
+DEFAULT_MEMORY_BUDGET_MB = 1024
+
+# Region definitions (data folder, zones file and model per region)
+REGIONS_FILE = os.environ.get('REGIONS_FILE', 'regions.json')
+
+# Used when no regions file exists: the single Ifrane deployment
+DEFAULT_REGION_CONFIG = {
+    'data_folder': 'grazing_data',
+    'zones_file': 'public/zones.json',
+    'model_path': 'simple_model_final.pth',
+    'policy_table': 'policy_table',
+    'herd_state': 'herd_state.db'
+}
+# Per-region state written by the region itself; other regions get their own copy
+REGION_STATE_PATHS = {
+    'policy_table': 'policy_table_{region}',
+    'herd_state': 'herd_state_{region}.db'
+}
+
+
+class UnknownRegionError(KeyError):
+    """Raised when a request names a region that is not configured"""
+
+
+def default_region_config(region_id):
+    """Defaults for a region, with its herd store and policy table named after it
+
+    The default region keeps the unsuffixed paths it has always used.
+    """
+    config = dict(DEFAULT_REGION_CONFIG)
+    if region_id != DEFAULT_REGION:
+        config.update({key: path.format(region=region_id) for key, path in REGION_STATE_PATHS.items()})
+    return config
+
+
+def load_region_configs(path):
+    """Read region id -> config from a JSON file, falling back to the default region"""
+    if not os.path.exists(path):
+        return {DEFAULT_REGION: default_region_config(DEFAULT_REGION)}
+
+    with open(path, 'r') as f:
+        configs = json.load(f)
+    return {
+        region_id: {**default_region_config(region_id), **config}
+        for region_id, config in configs.items()
+    }
+
+
+def estimate_bytes(obj):
+    """Rough resident size of a loaded structure"""
+    if hasattr(obj, 'memory_usage'):  # pandas DataFrame
+        return int(obj.memory_usage(deep=True).sum())
+    if hasattr(obj, 'parameters'):  # torch module
+        return sum(p.numel() * p.element_size() for p in obj.parameters())
+    if hasattr(obj, 'nbytes'):  # numpy array
+        return int(obj.nbytes)
+    if hasattr(obj, 'memory_bytes'):
+        return obj.memory_bytes()
+    try:
+        return len(json.dumps(obj))
+    except TypeError:
+        return sys.getsizeof(obj)
+
+
+def file_key(path):
+    """Identity of a file's current contents for deduplication"""
+    stat = os.stat(path)
+    return (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+
+
+class SharedResources:
+    """Reference-counted cache of read-only structures shared between regions
+
+    Regions that point at the same file (same weather feed, same model
+    checkpoint) get the same loaded object; it is dropped once the last
+    region using it is evicted. Loads run under a lock per file, so a
+    slow load only blocks the regions waiting for that same file.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}   # Key -> [lock, waiters]
+
+    def acquire(self, path, loader):
+        key = (loader.__name__,) + file_key(path)
+        with self._lock:
+            if self._take(key):
+                return key, self._entries[key]['value']
+            load_lock = self._load_locks.setdefault(key, [threading.Lock(), 0])
+            load_lock[1] += 1
+
+        try:
+            with load_lock[0]:
+                with self._lock:
+                    if self._take(key):
+                        return key, self._entries[key]['value']
+                value = loader(path)
+                size = estimate_bytes(value)
+                with self._lock:
+                    self._entries[key] = {'value': value, 'refs': 1, 'bytes': size}
+                return key, value
+        finally:
+            with self._lock:
+                load_lock[1] -= 1
+                if load_lock[1] == 0:
+                    self._load_locks.pop(key, None)
+
+    def _take(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        entry['refs'] += 1
+        return True
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry['refs'] -= 1
+            if entry['refs'] <= 0:
+                del self._entries[key]
+
+    @property
+    def total_bytes(self):
+        return sum(entry['bytes'] for entry in self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RegionRegistry:
+    """Loads regions on first use and evicts the least recently used ones
+
+    `loader(region_id, config, shared)` builds a region object exposing
+    `private_bytes()` and `close()`. Eviction keeps the total of private
+    and shared bytes under the memory budget, but never evicts the region
+    being requested. Telemetry ring buffers are lost when a region is
+    evicted; herd zone state is flushed to the region's herd store first.
+
+    Requests take regions with `hold` and give them back with `release`.
+    A region evicted while requests still hold it stops being served but
+    is only closed when the last of them releases it.
+    """
+
+    def __init__(self, configs, loader, memory_budget_bytes=DEFAULT_MEMORY_BUDGET_MB * 1024 * 1024):
+        self.configs = configs
+        self.loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.shared = SharedResources()
+        self._regions = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {region_id: threading.Lock() for region_id in configs}
+        self._holds = {}        # Region -> requests holding it
+        self._retired = set()   # Evicted regions waiting for their last release
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, region_id):
+        if region_id not in self.configs:
+            raise UnknownRegionError(region_id)
+
+        with self._lock:
+            region = self._regions.get(region_id)
+            if region is not None:
+                self._regions.move_to_end(region_id)
+                # Live state (telemetry) grows, so re-check the budget on hits too
+                self._evict(keep=region_id)
+                return region
+
+        # Load outside the registry lock so other regions keep serving
+        with self._load_locks[region_id]:
+            with self._lock:
+                region = self._regions.get(region_id)
+            if region is None:
+                region = self.loader(region_id, self.configs[region_id], self.shared)
+                with self._lock:
+                    self._regions[region_id] = region
+                    self.loads += 1
+                    self._evict(keep=region_id)
+        return region
+
+    def hold(self, region_id):
+        """Like `get`, but the region stays open until a matching `release`"""
+        while True:
+            region = self.get(region_id)
+            with self._lock:
+                # Evicted between get() and here: take the region that replaces it
+                if region in self._retired or self._regions.get(region_id) is not region:
+                    continue
+                self._holds[region] = self._holds.get(region, 0) + 1
+                return region
+
+    def release(self, region):
+        with self._lock:
+            holds = self._holds.get(region, 0) - 1
+            if holds > 0:
+                self._holds[region] = holds
+                return
+            self._holds.pop(region, None)
+            if region not in self._retired:
+                return
+            self._retired.discard(region)
+        region.close()
+
+    def peek(self, region_id):
+        """Return a loaded region without loading or touching LRU order"""
+        return self._regions.get(region_id)
+
+    def loaded(self):
+        with self._lock:
+            return list(self._regions.items())
+
+    def total_bytes(self):
+        return self.shared.total_bytes + sum(r.private_bytes() for r in list(self._regions.values()))
+
+    def _evict(self, keep):
+        while len(self._regions) > 1 and self.total_bytes() > self.memory_budget_bytes:
+            region_id = next(iter(self._regions))
+            if region_id == keep:
+                self._regions.move_to_end(region_id)
+                region_id = next(iter(self._regions))
+            region = self._regions.pop(region_id)
+            if self._holds.get(region):
+                self._retired.add(region)
+            else:
+                region.close()
+            self.evictions += 1
+            print(f"♻️ Evicted region '{region_id}' to stay within memory budget")
+
+    def stats(self):
+        return {
+            'configured': sorted(self.configs),
+            'loaded': list(self._regions),
+            'closing': len(self._retired),
+            'memory_bytes': self.total_bytes(),
+            'memory_budget_bytes': self.memory_budget_bytes,
+            'shared_resources': len(self.shared),
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
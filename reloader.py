@@ -0,0 +1,126 @@
+import os
+import threading
+
+DEFAULT_RELOAD_INTERVAL = 5.0  # Seconds between checks of the watched files
+TAIL_BYTES = 64  # Trailing bytes remembered per file to recognise pure appends
+
+
+def file_signature(path):
+    """(mtime, size) of a file, or None while it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def read_tail(path, size):
+    """The TAIL_BYTES bytes ending at offset `size`, or None if unreadable"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(max(size - TAIL_BYTES, 0))
+            return f.read(min(size, TAIL_BYTES))
+    except OSError:
+        return None
+
+
+class DataWatcher:
+    """Polls data files and hands the changed ones to a reload callback
+
+    Callbacks run on the watcher thread, so request threads never wait on
+    a reload. A callback that raises (e.g. a file caught half-written)
+    leaves its signatures untouched and is retried on the next poll.
+
+    The callback receives {filename: offset}. When a file only grew and
+    its previous end is unchanged, offset is the old size so the callback
+    can read just the appended bytes; otherwise it is None.
+    """
+
+    def __init__(self, interval=DEFAULT_RELOAD_INTERVAL):
+        self.interval = interval
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _snapshot(folder, filenames):
+        signatures, tails = {}, {}
+        for name in filenames:
+            path = os.path.join(folder, name)
+            signatures[name] = signature = file_signature(path)
+            tails[name] = read_tail(path, signature[1]) if signature else None
+        return signatures, tails
+
+    def watch(self, key, folder, filenames, callback):
+        signatures, tails = self._snapshot(folder, filenames)
+        with self._lock:
+            self._watches[key] = {'folder': folder, 'signatures': signatures, 'tails': tails,
+                                  'callback': callback}
+
+    def acknowledge(self, key, filenames):
+        """Record the current state of files the owner changed itself"""
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                return
+            signatures, tails = self._snapshot(watch['folder'], filenames)
+            watch['signatures'].update(signatures)
+            watch['tails'].update(tails)
+
+    def unwatch(self, key):
+        with self._lock:
+            self._watches.pop(key, None)
+
+    @staticmethod
+    def _append_offset(path, old, new, old_tail):
+        """Old size when the file only grew past an unchanged end, else None"""
+        if old is None or new[1] <= old[1] or old_tail is None:
+            return None
+        return old[1] if read_tail(path, old[1]) == old_tail else None
+
+    def poll(self):
+        """Check every watch once, returning {key: changed filenames} that reloaded"""
+        with self._lock:
+            watches = list(self._watches.items())
+
+        reloaded = {}
+        for key, watch in watches:
+            folder = watch['folder']
+            current = {
+                name: file_signature(os.path.join(folder, name))
+                for name in watch['signatures']
+            }
+            changed = {
+                name: self._append_offset(os.path.join(folder, name), watch['signatures'][name],
+                                          signature, watch['tails'][name])
+                for name, signature in current.items()
+                if signature is not None and signature != watch['signatures'][name]
+            }
+            if not changed:
+                continue
+
+            try:
+                watch['callback'](changed)
+            except Exception as e:
+                print(f"⚠️ Reload of {key} failed, keeping previous data: {e}")
+                continue
+
+            for name in changed:
+                watch['signatures'][name] = current[name]
+                watch['tails'][name] = read_tail(os.path.join(folder, name), current[name][1])
+            reloaded[key] = sorted(changed)
+        return reloaded
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='data-watcher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
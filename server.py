@@ -0,0 +1,445 @@
+import mmap
+import os
+import pickle
+import resource
+import selectors
+import signal
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+from werkzeug.serving import make_server
+from werkzeug.wsgi import ClosingIterator
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+GRACEFUL_TIMEOUT = 30.0    # Seconds a stopping worker gets to finish in-flight requests
+HEARTBEAT_INTERVAL = 1.0   # Seconds between worker heartbeats
+HEARTBEAT_TIMEOUT = 30.0   # A worker silent for longer is killed and replaced
+MASTER_TICK = 0.5          # Seconds between master checks
+RELAY_TIMEOUT = 5.0        # Seconds a relay message may take to send before the receiving side is dropped
+
+# Relay messages are pickled and framed by a 4-byte length
+RELAY_HEADER = struct.Struct('!I')
+
+# One slot per worker in memory shared by the master and every worker
+WORKER_DTYPE = np.dtype([
+    ('pid', 'i8'),
+    ('generation', 'i8'),
+    ('started_at', 'f8'),
+    ('heartbeat', 'f8'),       # 0 until the worker is serving
+    ('requests', 'i8'),
+    ('in_flight', 'i8'),
+    ('rss_bytes', 'i8'),
+    ('private_bytes', 'i8')    # Pages this worker no longer shares with the master
+])
+
+
+def memory_usage():
+    """(rss, private) bytes of the calling process; private is what copy-on-write has copied"""
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        kb = {name: int(value.split()[0]) for name, value in fields.items() if value.strip().endswith('kB')}
+        return kb['Rss'] * 1024, (kb['Private_Clean'] + kb['Private_Dirty']) * 1024
+    except (OSError, KeyError, ValueError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return rss, rss
+
+
+class WorkerBoard:
+    """Worker health slots in an anonymous shared mapping, created before forking"""
+
+    def __init__(self, slots):
+        self._buffer = mmap.mmap(-1, slots * WORKER_DTYPE.itemsize)
+        self.slots = np.frombuffer(self._buffer, dtype=WORKER_DTYPE)
+        self._lock = threading.Lock()  # Guards counters updated by one worker's threads
+
+    def free_slot(self):
+        free = np.flatnonzero(self.slots['pid'] == 0)
+        return int(free[0]) if len(free) else None
+
+    def claim(self, slot, pid, generation):
+        self.slots[slot] = (pid, generation, time.time(), 0.0, 0, 0, 0, 0)
+
+    def release(self, slot):
+        self.slots[slot] = np.zeros((), dtype=WORKER_DTYPE)
+
+    def count(self, slot, delta, in_flight=True):
+        with self._lock:
+            if delta > 0:
+                self.slots[slot]['requests'] += 1
+            if in_flight:
+                self.slots[slot]['in_flight'] += delta
+
+    def beat(self, slot):
+        rss, private = memory_usage()
+        record = self.slots[slot]
+        record['heartbeat'] = time.time()
+        record['rss_bytes'] = rss
+        record['private_bytes'] = private
+
+    def snapshot(self):
+        now = time.time()
+        workers = []
+        for slot, record in enumerate(self.slots.tolist()):
+            pid, generation, started_at, heartbeat, requests, in_flight, rss, private = record
+            if pid == 0:
+                continue
+            workers.append({
+                'slot': slot,
+                'pid': pid,
+                'generation': generation,
+                'uptime_seconds': round(now - started_at, 1),
+                'ready': heartbeat > 0,
+                'heartbeat_age_seconds': round(now - heartbeat, 1) if heartbeat else None,
+                'requests': requests,
+                'in_flight': in_flight,
+                'rss_bytes': rss,
+                'private_bytes': private
+            })
+        return workers
+
+
+def send_message(sock, message):
+    payload = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(RELAY_HEADER.pack(len(payload)) + payload)
+
+
+def read_messages(buffer):
+    """Unpickle the complete messages at the start of a bytearray, removing them from it"""
+    messages = []
+    while len(buffer) >= RELAY_HEADER.size:
+        (size,) = RELAY_HEADER.unpack_from(buffer)
+        end = RELAY_HEADER.size + size
+        if len(buffer) < end:
+            break
+        messages.append(pickle.loads(bytes(buffer[RELAY_HEADER.size:end])))
+        del buffer[:end]
+    return messages
+
+
+class PreforkServer:
+    """Pre-forking HTTP server: load once in the master, serve from N forked workers
+
+    Everything loaded before `run` (model weights, data frames, time
+    indexes) is inherited by the workers and shared copy-on-write; the
+    master calls `before_fork` (e.g. to freeze the GC so it doesn't touch
+    the shared objects) before every fork. Workers are threaded werkzeug
+    servers on one inherited listening socket.
+
+    Signals to the master: SIGHUP replaces the workers one at a time,
+    starting each replacement before the old worker is stopped; SIGTERM
+    or SIGINT stops them all. A stopping worker finishes its in-flight
+    requests first; requests to `stream_paths` (long-lived streams such as
+    server-sent events) are not waited for and are cut off when the worker
+    exits, so clients reconnect to another worker. Dead workers, and
+    workers whose heartbeat stops, are replaced. `poll`, if given, runs in the master every `poll_interval`
+    seconds and a true result rolls the workers, so a master-side reload
+    reaches them without each worker reloading on its own.
+
+    State that requests change after the fork (pushed events, ingested
+    telemetry) is kept in step through the master: `broadcast(message)`
+    in a worker sends a picklable message to the master, which passes it
+    to `on_message` in its own process and forwards it to every other
+    worker's `on_message`. The master applies every message, so workers
+    forked later (replacements, rolling restarts) inherit the state. A
+    worker whose relay breaks exits and is replaced.
+    """
+
+    def __init__(self, app, host='0.0.0.0', port=5000, workers=DEFAULT_WORKERS, before_fork=None,
+                 worker_init=None, worker_exit=None, poll=None, poll_interval=0,
+                 graceful_timeout=GRACEFUL_TIMEOUT, heartbeat_timeout=HEARTBEAT_TIMEOUT, stream_paths=(),
+                 on_message=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.worker_count = max(1, workers)
+        self.before_fork = before_fork
+        self.worker_init = worker_init
+        self.worker_exit = worker_exit
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.graceful_timeout = graceful_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.stream_paths = frozenset(stream_paths)
+        self.on_message = on_message
+
+        # Twice the slots so replacements can start before old workers leave
+        self.board = WorkerBoard(2 * self.worker_count)
+        self.slot = None            # Set in a worker to its own slot
+        self.generation = 0
+        self._workers = {}          # pid -> slot, for workers the master keeps alive
+        self._retiring = {}         # pid -> time asked to stop
+        self._stopping = False
+        self._restart_requested = False
+        self._socket = None
+        self._relays = {}           # pid -> (master end of the worker's relay socket, read buffer)
+        self._selector = None
+        self._relay = None          # Set in a worker to its end of the relay socket
+        self._relay_lock = threading.Lock()
+        self._stop_worker = None    # Set in a worker to the function that stops it
+
+    # Master
+
+    def run(self):
+        self._socket = socket.create_server((self.host, self.port), backlog=1024)
+        # Non-blocking so an idle worker that loses the accept race returns to its loop
+        self._socket.setblocking(False)
+        self._socket.set_inheritable(True)
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_restart)
+        self._selector = selectors.DefaultSelector()
+        print(f"🚀 Serving on {self.host}:{self.port} with {self.worker_count} workers (master {os.getpid()})")
+
+        for _ in range(self.worker_count):
+            self._spawn()
+        next_poll = time.monotonic() + self.poll_interval
+        try:
+            while not self._stopping:
+                self._pump(MASTER_TICK)
+                self._reap()
+                self._check_heartbeats()
+                if self.poll is not None and self.poll_interval > 0 and time.monotonic() >= next_poll:
+                    next_poll = time.monotonic() + self.poll_interval
+                    if self.poll():
+                        self._restart_requested = True
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self.rolling_restart()
+        finally:
+            self._stop_all()
+            self._socket.close()
+            self._selector.close()
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _request_restart(self, signum, frame):
+        self._restart_requested = True
+
+    def _spawn(self, slot=None):
+        slot = self.board.free_slot() if slot is None else slot
+        if self.before_fork is not None:
+            self.before_fork()
+        self.generation += 1
+        master_end, worker_end = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # Only the master talks to the other workers
+                master_end.close()
+                for sock, _ in self._relays.values():
+                    sock.close()
+                self._relays = {}
+                self._selector.close()
+                self._relay = worker_end
+                self._worker(slot)
+            finally:
+                os._exit(0)
+        worker_end.close()
+        master_end.settimeout(RELAY_TIMEOUT)
+        self._relays[pid] = (master_end, bytearray())
+        self._selector.register(master_end, selectors.EVENT_READ, pid)
+        self.board.claim(slot, pid, self.generation)
+        self._workers[pid] = slot
+        return pid
+
+    def _pump(self, timeout):
+        """Wait up to `timeout` seconds for relay messages from workers and pass them on"""
+        if not self._relays:
+            time.sleep(timeout)
+            return
+        for key, _ in self._selector.select(timeout):
+            pid = key.data
+            sock, buffer = self._relays[pid]
+            try:
+                data = sock.recv(1 << 16)
+            except OSError:
+                data = b''
+            if not data:
+                self._drop_relay(pid)
+                continue
+            buffer += data
+            for message in read_messages(buffer):
+                self._deliver(message)
+                self._forward(message, exclude=pid)
+
+    def _deliver(self, message):
+        if self.on_message is None:
+            return
+        try:
+            self.on_message(message)
+        except Exception as e:
+            print(f"⚠️ Process {os.getpid()} could not apply a relayed message: {e}")
+
+    def _forward(self, message, exclude=None):
+        for pid, (sock, _) in list(self._relays.items()):
+            if pid == exclude:
+                continue
+            try:
+                send_message(sock, message)
+            except OSError as e:
+                # Partly sent or stuck: the worker is out of step, replace it
+                print(f"⚠️ Relay to worker {pid} failed ({e}), killing it")
+                self._drop_relay(pid)
+                self._kill(pid, signal.SIGKILL)
+
+    def _drop_relay(self, pid):
+        relay = self._relays.pop(pid, None)
+        if relay is not None:
+            self._selector.unregister(relay[0])
+            relay[0].close()
+
+    def broadcast(self, message):
+        """Pass a message to `on_message` in every other process
+
+        A worker sends it through the master; the master sends it
+        straight to every worker.
+        """
+        if self._relay is None:
+            if self._selector is not None:
+                self._forward(message)
+            return
+        try:
+            with self._relay_lock:
+                send_message(self._relay, message)
+        except OSError as e:
+            print(f"⚠️ Relay to the master failed ({e}), stopping worker {os.getpid()}")
+            self._stop_worker()
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            slot = self._workers.pop(pid, None)
+            self._drop_relay(pid)
+            if pid in self._retiring:
+                self._retiring.pop(pid)
+                slot = int(np.flatnonzero(self.board.slots['pid'] == pid)[0])
+                self.board.release(slot)
+            elif slot is not None:
+                self.board.release(slot)
+                if not self._stopping:
+                    print(f"⚠️ Worker {pid} exited ({os.waitstatus_to_exitcode(status)}), starting a replacement")
+                    self._spawn(slot)
+
+    def _check_heartbeats(self):
+        now = time.time()
+        for pid, slot in list(self._workers.items()):
+            record = self.board.slots[slot]
+            last = record['heartbeat'] or record['started_at']
+            if now - last > self.heartbeat_timeout:
+                print(f"⚠️ Worker {pid} missed its heartbeat for {now - last:.0f}s, killing it")
+                self._kill(pid, signal.SIGKILL)
+        for pid, since in list(self._retiring.items()):
+            if time.monotonic() - since > self.graceful_timeout + HEARTBEAT_INTERVAL:
+                self._kill(pid, signal.SIGKILL)
+
+    @staticmethod
+    def _kill(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _retire(self, pid):
+        self._workers.pop(pid, None)
+        self._retiring[pid] = time.monotonic()
+        self._kill(pid, signal.SIGTERM)
+
+    def rolling_restart(self):
+        """Replace every worker, one at a time, without dropping capacity"""
+        print(f"🔄 Restarting {len(self._workers)} workers")
+        for old_pid in list(self._workers):
+            if self._stopping:
+                return
+            new_pid = self._spawn()
+            slot = self._workers[new_pid]
+            deadline = time.monotonic() + self.heartbeat_timeout
+            while self.board.slots[slot]['heartbeat'] == 0 and time.monotonic() < deadline:
+                self._pump(0.05)
+                self._reap()
+                if new_pid not in self._workers:
+                    break
+            self._retire(old_pid)
+
+    def _stop_all(self):
+        for pid in list(self._workers):
+            self._retire(pid)
+        deadline = time.monotonic() + self.graceful_timeout + HEARTBEAT_INTERVAL
+        while self._retiring and time.monotonic() < deadline:
+            self._pump(0.05)
+            self._reap()
+        for pid in list(self._retiring):
+            self._kill(pid, signal.SIGKILL)
+        print("👋 Server stopped")
+
+    # Worker
+
+    def _counted(self, environ, start_response):
+        """Track requests and in-flight requests (until the response body is closed)"""
+        slot = self.slot
+        in_flight = environ.get('PATH_INFO') not in self.stream_paths
+        self.board.count(slot, 1, in_flight)
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self.board.count(slot, -1, in_flight)
+            raise
+        return ClosingIterator(response, [lambda: self.board.count(slot, -1, in_flight)])
+
+    def _worker(self, slot):
+        self.slot = slot
+        master = os.getppid()
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the master, which stops us
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        np.random.seed()  # Don't share the master's random state
+
+        if self.worker_init is not None:
+            self.worker_init(slot)
+        server = make_server(self.host, self.port, self._counted, threaded=True, fd=self._socket.fileno())
+        stopping = threading.Event()
+
+        def stop(*_):
+            if not stopping.is_set():
+                stopping.set()
+                # shutdown() waits for serve_forever, so it can't run on this thread
+                threading.Thread(target=server.shutdown, daemon=True).start()
+
+        def heartbeat():
+            while not stopping.wait(HEARTBEAT_INTERVAL):
+                if os.getppid() != master:
+                    stop()  # Master is gone
+                    return
+                self.board.beat(slot)
+
+        def receive():
+            relay = self._relay.makefile('rb')
+            while True:
+                header = relay.read(RELAY_HEADER.size)
+                if len(header) < RELAY_HEADER.size:
+                    return  # Master closed the relay
+                (size,) = RELAY_HEADER.unpack(header)
+                self._deliver(pickle.loads(relay.read(size)))
+
+        self._stop_worker = stop
+        signal.signal(signal.SIGTERM, stop)
+        self.board.beat(slot)
+        threading.Thread(target=heartbeat, name='worker-heartbeat', daemon=True).start()
+        threading.Thread(target=receive, name='worker-relay', daemon=True).start()
+        server.serve_forever(poll_interval=MASTER_TICK)
+
+        # No new connections; let requests already running finish
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.board.slots[slot]['in_flight'] > 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if self.worker_exit is not None:
+            self.worker_exit(slot)
@@ -13,6 +13,7 @@ export const FlockCounter = () => {
   const [selectedImage, setSelectedImage] = useState<File | null>(null);
   const [modelStatus, setModelStatus] = useState<'loading' | 'online' | 'offline'>('loading');
   const { toast } = useToast();
+  const API_BASE_URL = 'http://127.0.0.1:5000';
 
   useEffect(() => {
     checkModelStatus();
@@ -20,8 +21,9 @@ export const FlockCounter = () => {
 
   const checkModelStatus = async () => {
     try {
-      const response = await fetch('https://3545dfda8ae6.ngrok-free.app/');
-      if (response.ok) {
+      const response = await fetch(`${API_BASE_URL}/detector/status`);
+      const status = response.ok ? await response.json() : null;
+      if (status && status.model_loaded) {
         setModelStatus('online');
       } else {
         setModelStatus('offline');
@@ -56,7 +58,7 @@ export const FlockCounter = () => {
       const formData = new FormData();
       formData.append('file', imageFile);
 
-      const response = await fetch('https://3545dfda8ae6.ngrok-free.app/detect_predators', {
+      const response = await fetch(`${API_BASE_URL}/detect_predators`, {
         method: 'POST',
         body: formData,
       });
@@ -40,13 +40,17 @@ export const GrazingMap = () => {
   // Backend API configuration
   const API_BASE_URL = 'http://127.0.0.1:5000';
 
+  // Latest zone snapshot version seen, read by the push channel listeners
+  const snapshotVersionRef = useRef<string | null>(null);
+
   // Enhanced environmental data state
   const [environmentalData, setEnvironmentalData] = useState({
     zones: [] as any[],
     currentDay: 150,
     modelLoaded: false,
     lastPrediction: null as any,
-    zoneUsageHistory: {} as Record<number, number>
+    zoneUsageHistory: {} as Record<number, number>,
+    snapshotVersion: null as string | null
   });
 
   // AI Model Configuration
@@ -113,6 +117,30 @@ export const GrazingMap = () => {
     }
   };
 
+  // Merge pushed zone changes (backend zone_id is 0-based) into map zones
+  const applyZoneChanges = (currentZones: any[], changes: any[]) => {
+    return currentZones.map(zone => {
+      const change = changes.find((c: any) => c.zone_id + 1 === zone.id);
+      if (!change) return zone;
+
+      const updated = { ...zone };
+      if (change.quality !== undefined) updated.quality = change.quality;
+      if (change.ndvi !== undefined) updated.ndvi = change.ndvi;
+      if (change.temperature !== undefined) updated.temperature = change.temperature;
+      if (change.rainfall !== undefined) updated.rainfall = change.rainfall;
+      if (change.carrying_capacity !== undefined) updated.carryingCapacity = change.carrying_capacity;
+      if (change.accessible !== undefined) {
+        updated.accessible = change.accessible;
+        updated.accessibility = change.accessible;
+      }
+      if (change.risk !== undefined) {
+        updated.risk = change.risk;
+        updated.constraints = { ...updated.constraints, flood_risk: change.risk === 'high' };
+      }
+      return updated;
+    });
+  };
+
   // Load configuration and zones from JSON files
   const loadConfiguration = async () => {
     try {
@@ -191,7 +219,8 @@ export const GrazingMap = () => {
         },
         body: JSON.stringify({
           current_day: environmentalData.currentDay,
-          selected_zone: aiModelConfig.currentZone
+          selected_zone: aiModelConfig.currentZone,
+          since_version: environmentalData.snapshotVersion
         })
       });
 
@@ -200,10 +229,15 @@ export const GrazingMap = () => {
       }
 
       const result = await response.json();
+      snapshotVersionRef.current = result.version;
       setEnvironmentalData(prev => ({
         ...prev,
         currentDay: result.new_day,
-        zoneUsageHistory: result.zone_usage_history
+        // Delta responses only carry the usage entries that changed
+        zoneUsageHistory: result.delta
+          ? { ...prev.zoneUsageHistory, ...result.zone_usage_history }
+          : result.zone_usage_history,
+        snapshotVersion: result.version
       }));
       
       // Update environmental data
@@ -245,11 +279,38 @@ export const GrazingMap = () => {
       loadConfiguration();
     });
 
-    // Set up periodic backend status checks
-    const interval = setInterval(checkBackendStatus, 30000);
+    // Subscribe to backend pushes instead of polling status and zones
+    const events = new EventSource(`${API_BASE_URL}/events`);
+    events.addEventListener('status', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      setEnvironmentalData(prev => ({ ...prev, modelLoaded: data.model_loaded }));
+      setModelStatus(data.model_loaded ? 'active' : 'loading');
+    });
+    events.addEventListener('zones', (event) => {
+      const data = JSON.parse((event as MessageEvent).data);
+      // Versions are opaque tokens from the worker that issued them; only equality is meaningful
+      const knownVersion = snapshotVersionRef.current;
+      if (data.version === knownVersion) return;
+      snapshotVersionRef.current = data.version;
+
+      if (knownVersion !== data.base_version) {
+        // Missed an update or it came from another worker - resync from the full zone payload
+        setEnvironmentalData(prev => ({ ...prev, currentDay: data.day, snapshotVersion: data.version }));
+        loadEnvironmentalData(data.day);
+        return;
+      }
+      setEnvironmentalData(prev => ({
+        ...prev,
+        currentDay: data.day,
+        zones: applyZoneChanges(prev.zones, data.zones),
+        zoneUsageHistory: { ...prev.zoneUsageHistory, ...data.zone_usage_history },
+        snapshotVersion: data.version
+      }));
+    });
+    events.onerror = () => setModelStatus('offline');
 
     return () => {
-      clearInterval(interval);
+      events.close();
       mapInstance.remove();
     };
   }, []);
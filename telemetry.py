@@ -0,0 +1,272 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Wire format for binary uploads: packed little-endian records, 32 bytes each
+BINARY_FIX_DTYPE = np.dtype([
+    ('herd', '<i4'),
+    ('animal', '<i4'),
+    ('timestamp', '<f8'),  # Unix epoch seconds
+    ('lat', '<f8'),
+    ('lon', '<f8')
+])
+
+# Per-herd ring buffer record
+FIX_DTYPE = np.dtype([
+    ('animal', '<i4'),
+    ('timestamp', '<f8'),
+    ('lat', '<f8'),
+    ('lon', '<f8'),
+    ('zone', '<i2')
+])
+
+RING_CAPACITY = 65536         # Fixes kept per herd
+ZONE_RADIUS_KM = 1.0          # Fixes further than this from every zone centre are outside
+HERD_ZONE_WINDOW_SECONDS = 900  # Recent fixes used to decide which zone a herd is in
+
+KM_PER_DEG_LAT = 110.57
+KM_PER_DEG_LON_EQUATOR = 111.32
+
+
+class ZoneLocator:
+    """Vectorised point-in-zone lookup against the zone centres"""
+
+    def __init__(self, centers, radius_km=ZONE_RADIUS_KM):
+        centers = np.asarray(centers, dtype=np.float64)
+        self.centers = centers
+        self.radius_km = radius_km
+
+        # Local equirectangular projection around the region centre
+        self.lat0 = float(centers[:, 0].mean())
+        self.lon0 = float(centers[:, 1].mean())
+        self.kx = KM_PER_DEG_LON_EQUATOR * np.cos(np.radians(self.lat0))
+        self.ky = KM_PER_DEG_LAT
+        self.center_xy = self.project(centers[:, 0], centers[:, 1])
+
+    @classmethod
+    def from_zones_file(cls, path, radius_km=ZONE_RADIUS_KM):
+        with open(path, 'r') as f:
+            zones = json.load(f)
+        zones = sorted(zones, key=lambda z: z['id'])
+        return cls([z['center'] for z in zones], radius_km)
+
+    @property
+    def zone_count(self):
+        return len(self.centers)
+
+    def project(self, lat, lon):
+        """Project lat/lon arrays to local (x, y) kilometres"""
+        x = (np.asarray(lon, dtype=np.float64) - self.lon0) * self.kx
+        y = (np.asarray(lat, dtype=np.float64) - self.lat0) * self.ky
+        return np.stack([x, y], axis=-1)
+
+    def locate(self, lat, lon):
+        """Return the 0-based zone index for each point, -1 when outside all zones"""
+        points = self.project(lat, lon)
+        diff = points[:, None, :] - self.center_xy[None, :, :]
+        dist2 = np.einsum('ijk,ijk->ij', diff, diff)
+        nearest = dist2.argmin(axis=1)
+        inside = dist2[np.arange(len(points)), nearest] <= self.radius_km ** 2
+        return np.where(inside, nearest, -1).astype(np.int16)
+
+
+class HerdTrack:
+    """Fixed-size ring buffer of collar fixes plus the herd's current zone"""
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.fixes = np.zeros(capacity, dtype=FIX_DTYPE)
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+        self.current_zone = None
+        self.zone_entered_at = None
+        self.last_timestamp = None
+
+    def append(self, batch):
+        """Append a FIX_DTYPE batch, overwriting the oldest fixes when full"""
+        n = len(batch)
+        if n >= self.capacity:
+            batch = batch[-self.capacity:]
+            n = self.capacity
+
+        end = self.head + n
+        if end <= self.capacity:
+            self.fixes[self.head:end] = batch
+        else:
+            split = self.capacity - self.head
+            self.fixes[self.head:] = batch[:split]
+            self.fixes[:end - self.capacity] = batch[split:]
+
+        self.head = end % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def latest(self, n=None):
+        """Return the most recent fixes in chronological order"""
+        n = self.count if n is None else min(n, self.count)
+        idx = (self.head - n + np.arange(n)) % self.capacity
+        return self.fixes[idx]
+
+    def update_zone(self, batch):
+        """Move the herd to the most common zone among its recent fixes"""
+        last_ts = float(batch['timestamp'][-1])
+        recent = batch[batch['timestamp'] >= last_ts - HERD_ZONE_WINDOW_SECONDS]
+        zones = recent['zone'][recent['zone'] >= 0]
+        self.last_timestamp = last_ts
+        if len(zones) == 0:
+            return
+
+        zone = int(np.bincount(zones).argmax())
+        if zone != self.current_zone:
+            self.current_zone = zone
+            self.zone_entered_at = float(recent['timestamp'][recent['zone'] == zone][0])
+
+    @property
+    def days_in_zone(self):
+        if self.current_zone is None:
+            return 0
+        return int((self.last_timestamp - self.zone_entered_at) // 86400) + 1
+
+
+class TelemetryStore:
+    """Ingests batched collar fixes into per-herd ring buffers"""
+
+    def __init__(self, locator, capacity=RING_CAPACITY, geofence=None, state_store=None):
+        self.locator = locator
+        self.geofence = geofence
+        self.state_store = state_store
+        self.capacity = capacity
+        self.herds = {}
+        self.total_fixes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_binary(payload):
+        """Zero-copy view of a packed binary upload"""
+        if len(payload) % BINARY_FIX_DTYPE.itemsize:
+            raise ValueError(f"Binary payload must be a multiple of {BINARY_FIX_DTYPE.itemsize} bytes")
+        return np.frombuffer(payload, dtype=BINARY_FIX_DTYPE)
+
+    @staticmethod
+    def parse_ndjson(payload):
+        """Parse newline-delimited JSON fixes into a structured array
+
+        Timestamps are Unix epoch seconds or ISO-8601 strings ('Z', an
+        offset, or naive UTC). A fix with a missing, null or malformed
+        field gets a NaN timestamp, so `ingest` counts it as rejected
+        instead of failing the whole upload.
+        """
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        rows = [json.loads(line) for line in payload.splitlines() if line.strip()]
+
+        fixes = np.zeros(len(rows), dtype=BINARY_FIX_DTYPE)
+        if not rows:
+            return fixes
+        if not all(isinstance(row, dict) for row in rows):
+            raise ValueError("Each line must be a JSON object")
+
+        frame = pd.DataFrame.from_records(rows)
+        missing = pd.Series(np.nan, index=frame.index)
+        columns = {
+            name: pd.to_numeric(frame[name] if name in frame else missing, errors='coerce')
+            for name in ('herd', 'animal', 'lat', 'lon')
+        }
+
+        raw = frame['timestamp'] if 'timestamp' in frame else missing
+        timestamps = pd.to_numeric(raw, errors='coerce').astype(np.float64)
+        text = raw.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+        if text.any():
+            parsed = pd.to_datetime(raw[text], utc=True, errors='coerce', format='ISO8601')
+            timestamps[text] = (parsed - pd.Timestamp(0, tz='UTC')).dt.total_seconds()
+
+        invalid = timestamps.isna().to_numpy().copy()
+        for name, values in columns.items():
+            invalid |= values.isna().to_numpy()
+            fixes[name] = values.fillna(0).to_numpy()
+        fixes['timestamp'] = np.where(invalid, np.nan, timestamps.to_numpy())
+        return fixes
+
+    def ingest(self, fixes, replica=False):
+        """Append a batch of BINARY_FIX_DTYPE fixes and update herd zone state
+
+        A `replica` batch was already ingested and stored by another
+        worker; it updates the buffers here without writing the herd store.
+        """
+        valid = (
+            np.isfinite(fixes['timestamp']) &
+            (np.abs(fixes['lat']) <= 90) &
+            (np.abs(fixes['lon']) <= 180)
+        )
+        rejected = int(len(fixes) - valid.sum())
+        fixes = fixes[valid]
+
+        zones = self.locator.locate(fixes['lat'], fixes['lon'])
+
+        # Group by herd, chronological within each herd
+        order = np.lexsort((fixes['timestamp'], fixes['herd']))
+        fixes = fixes[order]
+        zones = zones[order]
+
+        records = np.empty(len(fixes), dtype=FIX_DTYPE)
+        records['animal'] = fixes['animal']
+        records['timestamp'] = fixes['timestamp']
+        records['lat'] = fixes['lat']
+        records['lon'] = fixes['lon']
+        records['zone'] = zones
+
+        herd_ids, starts = np.unique(fixes['herd'], return_index=True)
+        bounds = list(starts[1:]) + [len(fixes)]
+
+        with self._lock:
+            for herd_id, start, end in zip(herd_ids.tolist(), starts.tolist(), bounds):
+                track = self.herds.get(herd_id)
+                if track is None:
+                    track = self.herds[herd_id] = self._new_track(herd_id)
+                batch = records[start:end]
+                track.append(batch)
+                track.update_zone(batch)
+                if self.state_store is not None and not replica:
+                    self.state_store.record_position(herd_id, track.current_zone, track.zone_entered_at,
+                                                     track.last_timestamp)
+            self.total_fixes += len(records)
+
+        violations = self.geofence.check(fixes, zones) if self.geofence is not None else []
+
+        return {
+            'accepted': int(len(records)),
+            'rejected': rejected,
+            'herds': [int(h) for h in herd_ids],
+            'outside_zones': int((zones < 0).sum()),
+            'violations': violations
+        }
+
+    def _new_track(self, herd_id):
+        """Empty ring buffer that resumes the herd's stored zone state, if any"""
+        track = HerdTrack(self.capacity)
+        stored = self.state_store.position(herd_id) if self.state_store is not None else None
+        if stored is not None:
+            track.current_zone = stored['current_zone']
+            track.zone_entered_at = stored['zone_entered_at']
+            track.last_timestamp = stored['last_fix_timestamp']
+        return track
+
+    def memory_bytes(self):
+        return sum(track.fixes.nbytes for track in list(self.herds.values()))
+
+    def herd_state(self, herd_id):
+        """Current zone state for a herd, or None if it has never reported"""
+        track = self.herds.get(herd_id)
+        if track is None:
+            # Reported before a restart or to another worker
+            if self.state_store is None or self.state_store.position(herd_id) is None:
+                return None
+            track = self._new_track(herd_id)
+        return {
+            'herd_id': herd_id,
+            'current_zone': track.current_zone,
+            'days_in_zone': track.days_in_zone,
+            'last_fix_timestamp': track.last_timestamp,
+            'buffered_fixes': track.count
+        }
@@ -0,0 +1,58 @@
+import generation_benchmark as gb
+
+
+def synthetic_cases(axes, stage_seconds):
+    """Cases for every benchmark case of `axes`, timed by `stage_seconds(stage, params, rows)`"""
+    base, params_list = gb.benchmark_cases(axes)
+    cases = []
+    for params in params_list:
+        stages = {}
+        for stage in gb.STAGES:
+            rows = 365 * params['years'] * params['herds']
+            seconds = stage_seconds(stage, params, rows)
+            stages[stage] = {'rows': rows, 'seconds': seconds, 'median_seconds': seconds * 1.05}
+        cases.append({'case': gb.case_key(params), 'params': params, 'stages': stages})
+    return base, cases
+
+
+def flagged(report):
+    return {
+        (stage, axis)
+        for stage, fits in report.items()
+        for axis, fit in fits.items()
+        if fit['super_linear']
+    }
+
+
+def test_scaling_flags_only_the_quadratic_stage():
+    axes = {'years': (1, 4, 16), 'zones': (10, 40), 'herds': (1, 2), 'grid': (50, 200)}
+    # Tracking filters the whole history for every herd-day; the other stages are linear with
+    # up to 15% timer noise, which must not be flagged however long they run
+    noise = {50: 1.0, 200: 1.15, 10: 1.0, 40: 0.9}
+
+    def stage_seconds(stage, params, rows):
+        jitter = noise[params['grid']] * noise[params['zones']]
+        if stage == 'livestock_tracking':
+            return rows * 0.0025 * (1 + 0.05 * (params['years'] - 1)) * jitter
+        return rows * 0.001 * jitter
+
+    base, cases = synthetic_cases(axes, stage_seconds)
+    assert flagged(gb.scaling(cases, base, axes)) == {('livestock_tracking', 'years')}
+
+
+def test_scaling_ignores_a_single_noisy_fastest_run():
+    axes = {'years': (1, 4), 'zones': (10,), 'herds': (1,), 'grid': (50,)}
+    base, cases = synthetic_cases(axes, lambda stage, params, rows: rows * 0.001)
+    # One lucky fast run at the small size; the median shows no growth
+    small = cases[0]['stages']['weather']
+    small['seconds'] /= 1.5
+    report = gb.scaling(cases, base, axes)
+    assert report['weather']['years']['time_per_row_growth'] >= gb.SUPER_LINEAR_GROWTH
+    assert not report['weather']['years']['super_linear']
+
+
+def test_benchmark_flags_livestock_tracking_along_years():
+    # The real generator: only the per-herd-day filtering grows faster than its output
+    axes = {'years': (1, 16), 'zones': (10,), 'herds': (1,), 'grid': (20,)}
+    report = gb.run_benchmark(axes, repeat=2, memory=False, log=lambda message: None)
+    assert flagged(report['scaling']) == {('livestock_tracking', 'years')}
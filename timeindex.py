@@ -0,0 +1,291 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Lookup modes for dates that fall between samples
+NEAREST = 'nearest'
+INTERPOLATE = 'interpolate'
+LOOKUP_MODES = (NEAREST, INTERPOLATE)
+
+# Composite (zone slot, day) sort keys: slot * ZONE_KEY_STRIDE + day + DAY_KEY_BIAS
+ZONE_KEY_STRIDE = 1 << 32
+DAY_KEY_BIAS = 1 << 31
+
+
+class UnknownLookupModeError(ValueError):
+    """Raised when a lookup mode other than LOOKUP_MODES is requested"""
+
+
+def check_mode(mode):
+    if mode not in LOOKUP_MODES:
+        raise UnknownLookupModeError(mode)
+    return mode
+
+
+def to_days(dates):
+    """Dates (datetimes, Timestamps, ISO strings or arrays of them) as int64 days since 1970-01-01"""
+    try:
+        days = np.asarray(dates, dtype='datetime64[D]')
+    except (TypeError, ValueError):
+        dates = np.asarray(dates)
+        days = pd.DatetimeIndex(pd.to_datetime(dates.ravel())).values.astype('datetime64[D]').reshape(dates.shape)
+    return np.atleast_1d(days).astype(np.int64)
+
+
+def from_day(day):
+    return pd.Timestamp(np.datetime64(int(day), 'D'))
+
+
+class TimeSeriesIndex:
+    """Sorted day numbers with aligned float columns for one series
+
+    Lookups binary-search the day array, so they cost O(log n) per date
+    however many years are indexed. Versions are immutable for readers:
+    `extend` writes past the end of the shared buffers (or into a larger
+    copy) and returns a new index that sees the extra rows, while older
+    versions keep seeing only their own length.
+    """
+
+    def __init__(self, days, columns, length=None, filled=None, lock=None):
+        self._days = days
+        self._columns = columns
+        self.length = len(days) if length is None else length
+        # Shared by every version over the same buffers: how far they are written
+        self._filled = filled if filled is not None else [self.length]
+        self._lock = lock or threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df, value_columns):
+        """Index a frame with a 'date' column; later rows win on duplicate dates"""
+        days = to_days(df['date']) if len(df) else np.empty(0, dtype=np.int64)
+        order = np.argsort(days, kind='stable')
+        days = days[order]
+        keep = np.ones(len(days), dtype=bool)
+        keep[:-1] = days[:-1] != days[1:]
+        columns = {
+            name: df[name].to_numpy(dtype=np.float64, na_value=np.nan)[order][keep]
+            for name in value_columns
+        }
+        return cls(days[keep], columns)
+
+    @property
+    def days(self):
+        return self._days[:self.length]
+
+    def column(self, name):
+        return self._columns[name][:self.length]
+
+    @property
+    def last_day(self):
+        return int(self._days[self.length - 1]) if self.length else None
+
+    def __len__(self):
+        return self.length
+
+    def memory_bytes(self):
+        return self._days.nbytes + sum(c.nbytes for c in self._columns.values())
+
+    def extend(self, days, columns):
+        """New version with rows for later days appended, amortised O(k)"""
+        days = np.asarray(days, dtype=np.int64)
+        k = len(days)
+        if k == 0:
+            return self
+        if np.any(np.diff(days) <= 0) or (self.length and days[0] <= self.last_day):
+            raise ValueError("Appended days must be increasing and after the last indexed day")
+
+        n = self.length
+        with self._lock:
+            in_place = self._filled[0] == n and n + k <= len(self._days)
+            if in_place:
+                self._filled[0] = n + k
+        if in_place:
+            buffers_days, buffers, filled, lock = self._days, self._columns, self._filled, self._lock
+        else:
+            # Another version already wrote past our end, or we ran out of room
+            capacity = max(2 * len(self._days), n + k, 16)
+            buffers_days = np.empty(capacity, dtype=np.int64)
+            buffers_days[:n] = self.days
+            buffers = {}
+            for name, values in self._columns.items():
+                buffers[name] = np.empty(capacity, dtype=np.float64)
+                buffers[name][:n] = values[:n]
+            filled, lock = [n + k], None
+
+        buffers_days[n:n + k] = days
+        for name, values in buffers.items():
+            values[n:n + k] = np.asarray(columns[name], dtype=np.float64)
+        return TimeSeriesIndex(buffers_days, buffers, n + k, filled, lock)
+
+    def _neighbours(self, query_days):
+        """Positions of the samples at or before and after each query day"""
+        days = self.days
+        right = np.searchsorted(days, query_days, side='left')
+        # An exact hit is both the sample before and after
+        exact = (right < len(days)) & (days[np.minimum(right, len(days) - 1)] == query_days)
+        return np.where(exact, right, right - 1), right
+
+    def _gaps(self, query_days):
+        days = self.days
+        last = len(days) - 1
+        left, right = self._neighbours(query_days)
+        left_c, right_c = np.maximum(left, 0), np.minimum(right, last)
+        far = np.iinfo(np.int64).max
+        gap_left = np.where(left >= 0, query_days - days[left_c], far)
+        gap_right = np.where(right <= last, days[right_c] - query_days, far)
+        return left_c, right_c, gap_left, gap_right
+
+    def nearest(self, query_days, max_gap):
+        """Index of the closest sample within max_gap days of each query, -1 if none"""
+        query_days = np.asarray(query_days, dtype=np.int64)
+        if self.length == 0:
+            return np.full(query_days.shape, -1, dtype=np.int64)
+        left, right, gap_left, gap_right = self._gaps(query_days)
+        # Ties go to the earlier sample
+        best = np.where(gap_left <= gap_right, left, right)
+        return np.where(np.minimum(gap_left, gap_right) <= max_gap, best, -1)
+
+    def take(self, name, positions):
+        """Column values at positions from `nearest`, NaN where -1"""
+        values = self.column(name)
+        if len(values) == 0:
+            return np.full(np.shape(positions), np.nan)
+        return np.where(positions >= 0, values[np.maximum(positions, 0)], np.nan)
+
+    def lookup(self, names, query_days, max_gap, mode=NEAREST):
+        """Values of several columns at each query day, NaN where there is no data
+
+        NEAREST takes the closest sample within max_gap days. INTERPOLATE
+        blends linearly between the samples either side when both lie
+        within max_gap, and otherwise falls back to the nearest sample.
+        """
+        query_days = np.asarray(query_days, dtype=np.int64)
+        positions = self.nearest(query_days, max_gap)
+        values = {name: self.take(name, positions) for name in names}
+        if mode != INTERPOLATE or self.length < 2:
+            return values
+
+        days = self.days
+        left, right, gap_left, gap_right = self._gaps(query_days)
+        bracketed = (right > left) & (gap_left <= max_gap) & (gap_right <= max_gap)
+        weight = (query_days - days[left]) / np.maximum(days[right] - days[left], 1)
+        for name in names:
+            column = self.column(name)
+            blended = column[left] + weight * (column[right] - column[left])
+            values[name] = np.where(bracketed, blended, values[name])
+        return values
+
+
+class ZoneTimeIndex:
+    """One TimeSeriesIndex per zone id
+
+    Batched lookups run over a flat copy of every zone's samples, sorted
+    by a composite (zone, day) key, so one binary search serves all the
+    requested zones. The flat copy is built on first lookup of each
+    version.
+    """
+
+    def __init__(self, zones):
+        self.zones = zones
+        self._flat = None
+
+    @classmethod
+    def from_frame(cls, df, value_columns, zone_column='zone_id'):
+        zones = {}
+        if len(df):
+            for zone_id, rows in df.groupby(zone_column, sort=True):
+                zones[int(zone_id)] = TimeSeriesIndex.from_frame(rows, value_columns)
+        return cls(zones)
+
+    @property
+    def last_day(self):
+        days = [index.last_day for index in self.zones.values() if len(index)]
+        return max(days) if days else None
+
+    def memory_bytes(self):
+        flat = self._flat
+        extra = flat['keys'].nbytes * 2 + sum(c.nbytes for c in flat['columns'].values()) if flat else 0
+        return sum(index.memory_bytes() for index in self.zones.values()) + extra
+
+    def extend(self, df, value_columns, zone_column='zone_id'):
+        """New version with each zone's rows appended"""
+        zones = dict(self.zones)
+        for zone_id, rows in df.groupby(zone_column, sort=True):
+            rows = rows.sort_values('date')
+            columns = {name: rows[name].to_numpy(dtype=np.float64, na_value=np.nan) for name in value_columns}
+            index = zones.get(int(zone_id))
+            if index is None:
+                zones[int(zone_id)] = TimeSeriesIndex(to_days(rows['date']), columns)
+            else:
+                zones[int(zone_id)] = index.extend(to_days(rows['date']), columns)
+        return ZoneTimeIndex(zones)
+
+    def _flatten(self):
+        """Every zone's days and columns end to end, with each zone's start and length"""
+        flat = self._flat
+        if flat is not None:
+            return flat
+
+        zone_ids = sorted(self.zones)
+        indexes = [self.zones[zone_id] for zone_id in zone_ids]
+        lengths = np.array([len(index) for index in indexes], dtype=np.int64)
+        days = np.concatenate([index.days for index in indexes]) if indexes else np.empty(0, dtype=np.int64)
+        names = indexes[0]._columns if indexes else {}
+        flat = self._flat = {
+            'zone_ids': np.array(zone_ids, dtype=np.int64),
+            'starts': np.cumsum(lengths) - lengths,
+            'lengths': lengths,
+            'days': days,
+            'keys': np.repeat(np.arange(len(indexes), dtype=np.int64), lengths) * ZONE_KEY_STRIDE +
+                    days + DAY_KEY_BIAS,
+            'columns': {name: np.concatenate([index.column(name) for index in indexes]) for name in names}
+        }
+        return flat
+
+    def lookup(self, names, zone_ids, query_days, max_gap, mode=NEAREST):
+        """Batched lookup of several columns for (zone, day) pairs
+
+        `zone_ids` and `query_days` broadcast against each other. Returns
+        {name: float array}, NaN where a zone has no sample in range.
+        Same rules as TimeSeriesIndex.lookup, applied within each zone.
+        """
+        zone_ids, query_days = np.broadcast_arrays(np.asarray(zone_ids, dtype=np.int64),
+                                                   np.asarray(query_days, dtype=np.int64))
+        shape = zone_ids.shape
+        out = {name: np.full(shape, np.nan) for name in names}
+        flat = self._flatten()
+        days = flat['days']
+        if len(days) == 0:
+            return out
+        zone_ids, query_days = zone_ids.ravel(), query_days.ravel()
+
+        # Which zone's segment each query searches, and its bounds
+        slot = np.minimum(np.searchsorted(flat['zone_ids'], zone_ids), len(flat['zone_ids']) - 1)
+        start = flat['starts'][slot]
+        end = np.where(flat['zone_ids'][slot] == zone_ids, start + flat['lengths'][slot], start)
+
+        right = np.searchsorted(flat['keys'], slot * ZONE_KEY_STRIDE + query_days + DAY_KEY_BIAS, side='left')
+        last = len(days) - 1
+        # An exact hit is both the sample before and after
+        exact = (right < end) & (days[np.minimum(right, last)] == query_days)
+        left = np.where(exact, right, right - 1)
+        left_c = np.clip(left, start, last)
+        right_c = np.clip(right, 0, np.maximum(end - 1, 0))
+        far = np.iinfo(np.int64).max
+        gap_left = np.where((left >= start) & (left < end), query_days - days[left_c], far)
+        gap_right = np.where(right < end, days[right_c] - query_days, far)
+
+        # Ties go to the earlier sample
+        best = np.where(gap_left <= gap_right, left_c, right_c)
+        found = np.minimum(gap_left, gap_right) <= max_gap
+        bracketed = (right_c > left_c) & (gap_left <= max_gap) & (gap_right <= max_gap)
+        weight = (query_days - days[left_c]) / np.maximum(days[right_c] - days[left_c], 1)
+        for name in names:
+            column = flat['columns'][name]
+            values = np.where(found, column[best], np.nan)
+            if mode == INTERPOLATE:
+                blended = column[left_c] + weight * (column[right_c] - column[left_c])
+                values = np.where(bracketed, blended, values)
+            out[name] = values.reshape(shape)
+        return out
@@ -0,0 +1,457 @@
+import io
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:  # Detection is reported unavailable
+    torch = None
+
+try:
+    from PIL import Image
+except ImportError:  # Frames can't be decoded; detection is reported unavailable
+    Image = None
+
+DEFAULT_MODEL_PATH = 'detector_model.torchscript'
+DEFAULT_IMAGE_SIZE = 320        # Model input side when the model doesn't say
+DEFAULT_MAX_BATCH = 8           # Frames per model call
+DEFAULT_BATCH_WAIT = 0.02       # Seconds the first frame of a batch waits for others
+DEFAULT_QUEUE_SIZE = 64         # Frames decoding or waiting for the model
+DEFAULT_TIMEOUT = 2.0           # Seconds a request waits for its detections
+DEFAULT_DECODE_WORKERS = 2
+DEFAULT_CAMERA_RATE = 2.0       # Frames per second per camera...
+DEFAULT_CAMERA_BURST = 5        # ...with bursts up to this many frames
+MAX_CAMERAS = 10000             # Rate limiter buckets kept before dropping idle ones
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+CONFIDENCE_THRESHOLD = 0.25
+IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 300
+LETTERBOX_FILL = 114            # Grey used to pad frames to a square, as in training
+RECENT_FRAMES = 1024            # Recent frames kept for latency percentiles and throughput
+THROUGHPUT_WINDOW = 60          # Seconds of recent frames the throughput is measured over
+
+SHEEP_CLASSES = frozenset({'sheep', 'mouton'})
+PREDATOR_CLASSES = frozenset({'wolf', 'jackal', 'fox', 'dog', 'bear', 'lynx'})
+
+
+class VisionError(ValueError):
+    """Raised for frames that can't be decoded or are too large"""
+
+
+class DetectorUnavailable(RuntimeError):
+    """Raised when there is no model (or no torch / Pillow) to run"""
+
+
+class DetectorBusy(RuntimeError):
+    """Raised when a frame is shed: the queue is full or its deadline passed"""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(f"Detector busy ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RateLimited(RuntimeError):
+    """Raised when a camera sends frames faster than its rate"""
+
+    def __init__(self, camera_id, retry_after):
+        super().__init__(f"Camera {camera_id!r} is over its frame rate")
+        self.camera_id = camera_id
+        self.retry_after = retry_after
+
+
+class CameraRateLimiter:
+    """Token bucket per camera"""
+
+    def __init__(self, rate=DEFAULT_CAMERA_RATE, burst=DEFAULT_CAMERA_BURST, max_cameras=MAX_CAMERAS):
+        self.rate = rate
+        self.burst = burst
+        self.max_cameras = max_cameras
+        self._buckets = {}  # camera -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    def take(self, camera_id):
+        """Use one token, or raise RateLimited with the seconds until the next one"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(camera_id, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if len(self._buckets) >= self.max_cameras:
+                # Buckets are kept in last-use order; the oldest are full again by now
+                for stale in list(self._buckets)[:len(self._buckets) // 2]:
+                    del self._buckets[stale]
+            if tokens < 1:
+                self._buckets[camera_id] = (tokens, now)
+                raise RateLimited(camera_id, max(1, int(np.ceil((1 - tokens) / self.rate))))
+            self._buckets[camera_id] = (tokens - 1, now)
+
+
+def letterbox(data, size):
+    """Decode an encoded image into a size x size RGB uint8 array, aspect kept and padded
+
+    JPEGs are decoded straight at a reduced scale (`draft`), so a large
+    camera frame is never expanded to full resolution, and a frame that
+    already has the model's size is used as decoded. Returns the array,
+    the original (width, height) and the (scale, left, top) placement.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        image.draft('RGB', (size, size))
+        image = image.convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise VisionError("Unreadable image") from e
+
+    scale = min(size / width, size / height)
+    new_width, new_height = max(1, round(width * scale)), max(1, round(height * scale))
+    if image.size != (new_width, new_height):
+        image = image.resize((new_width, new_height), Image.BILINEAR)
+    pixels = np.asarray(image)
+    if (new_width, new_height) == (size, size):
+        return pixels, (width, height), (scale, 0, 0)
+
+    left, top = (size - new_width) // 2, (size - new_height) // 2
+    canvas = np.full((size, size, 3), LETTERBOX_FILL, dtype=np.uint8)
+    canvas[top:top + new_height, left:left + new_width] = pixels
+    return canvas, (width, height), (scale, left, top)
+
+
+def non_max_suppression(boxes, scores, classes, iou_threshold=IOU_THRESHOLD, limit=MAX_DETECTIONS):
+    """Indices of boxes (x1, y1, x2, y2) kept by greedy per-class NMS, best first"""
+    # Offsetting each class far apart keeps boxes of different classes from suppressing each other
+    offset = boxes + (classes * (boxes.max() + 1))[:, None]
+    x1, y1, x2, y2 = offset.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while len(order) and len(keep) < limit:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        height = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        overlap = width * height
+        iou = overlap / np.maximum(areas[best] + areas[rest] - overlap, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class _Frame:
+    __slots__ = ('camera_id', 'future', 'queued_at', 'deadline', 'pixels', 'size', 'placement', 'decode_ms')
+
+    def __init__(self, camera_id, timeout):
+        self.camera_id = camera_id
+        self.future = Future()
+        self.queued_at = time.monotonic()
+        self.deadline = self.queued_at + timeout
+        self.pixels = None
+        self.size = None
+        self.placement = None
+        self.decode_ms = None
+
+
+class FlockDetector:
+    """Sheep and predator detection for many cameras, batched into one CPU model call
+
+    The model is a TorchScript export of a YOLOv8-style detector (input
+    (N, 3, S, S) in 0-1, output (N, 4 + classes, anchors) with boxes as
+    centre x, y, width, height); class names and input size are read
+    from the metadata the exporter stores with it. Frames are decoded and
+    letterboxed in a thread pool, then a single batching thread feeds up
+    to `max_batch` of them at a time to the model, waiting at most
+    `batch_wait` for a batch to fill. Each request waits at most
+    `timeout`: frames still queued at their deadline are dropped without
+    running, so a backlog sheds load instead of growing latency.
+
+    Threads and the model are started on first use in each process, so
+    a detector created before the server forks works in every worker.
+    """
+
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, max_batch=DEFAULT_MAX_BATCH, batch_wait=DEFAULT_BATCH_WAIT,
+                 queue_size=DEFAULT_QUEUE_SIZE, timeout=DEFAULT_TIMEOUT, decode_workers=DEFAULT_DECODE_WORKERS,
+                 camera_rate=DEFAULT_CAMERA_RATE, camera_burst=DEFAULT_CAMERA_BURST):
+        self.model_path = model_path
+        self.max_batch = max(1, max_batch)
+        self.batch_wait = batch_wait
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.decode_workers = decode_workers
+        self.limiter = CameraRateLimiter(camera_rate, camera_burst)
+
+        self.model = None
+        self.class_names = []
+        self.image_size = DEFAULT_IMAGE_SIZE
+        self.load_error = None
+
+        self._lock = threading.Lock()
+        self._pid = None
+        self._frames = None
+        self._decoder = None
+        self._thread = None
+        self._buffer = None
+        self._pending = 0
+
+        self.frames_done = 0
+        self.batches = 0
+        self.rejected = {}
+        self._batch_sizes = deque(maxlen=RECENT_FRAMES)
+        self._inference_ms = deque(maxlen=RECENT_FRAMES)
+        self._recent = deque(maxlen=RECENT_FRAMES)  # (finished at, queue ms, total ms)
+
+    # Setup
+
+    def load(self):
+        """Load the model; returns whether one is available"""
+        if self.model is not None:
+            return True
+        if torch is None or Image is None:
+            self.load_error = 'torch and Pillow are required for detection'
+            return False
+        if not os.path.exists(self.model_path):
+            self.load_error = f'no detector model at {self.model_path}'
+            return False
+        try:
+            extra_files = {'config.txt': ''}
+            model = torch.jit.load(self.model_path, map_location='cpu', _extra_files=extra_files)
+            model.eval()
+            metadata = json.loads(extra_files['config.txt'] or '{}')
+        except (RuntimeError, ValueError) as e:
+            self.load_error = f'could not load {self.model_path}: {e}'
+            print(f"⚠️ Detector model: {self.load_error}")
+            return False
+
+        names = metadata.get('names', {})
+        if isinstance(names, dict):
+            names = [names[key] for key in sorted(names, key=int)]
+        image_size = metadata.get('imgsz', DEFAULT_IMAGE_SIZE)
+        self.image_size = int(image_size[0] if isinstance(image_size, (list, tuple)) else image_size)
+        self.class_names = list(names)
+        self.model = model
+        self.load_error = None
+        print(f"✅ Detector model loaded: {len(self.class_names)} classes at {self.image_size}px")
+        return True
+
+    def _start(self):
+        """Queue, decode pool and batching thread for the current process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if not self.load():
+                raise DetectorUnavailable(self.load_error)
+            self._frames = queue.Queue()
+            self._decoder = ThreadPoolExecutor(self.decode_workers, thread_name_prefix='frame-decode')
+            self._buffer = np.empty((self.max_batch, self.image_size, self.image_size, 3), dtype=np.uint8)
+            self._pending = 0
+            self._thread = threading.Thread(target=self._run, name='detector-batches', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    # Requests
+
+    def _reject(self, reason):
+        with self._lock:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    def detect(self, camera_id, data, timeout=None):
+        """Detections for one encoded frame; raises VisionError, RateLimited, DetectorBusy or DetectorUnavailable"""
+        if len(data) == 0:
+            raise VisionError("Empty image")
+        if len(data) > MAX_IMAGE_BYTES:
+            raise VisionError(f"Image larger than {MAX_IMAGE_BYTES // (1024 * 1024)} MB")
+        self._start()
+        try:
+            self.limiter.take(camera_id)
+        except RateLimited:
+            self._reject('rate_limited')
+            raise
+        with self._lock:
+            if self._pending >= self.queue_size:
+                self.rejected['queue_full'] = self.rejected.get('queue_full', 0) + 1
+                raise DetectorBusy('queue_full', retry_after=max(1, int(np.ceil(self.timeout))))
+            self._pending += 1
+
+        frame = _Frame(camera_id, self.timeout if timeout is None else timeout)
+        self._decoder.submit(self._decode, frame, data)
+        try:
+            return frame.future.result(max(frame.deadline - time.monotonic(), 0) + self.batch_wait)
+        except FutureTimeout:
+            frame.future.cancel()
+            self._reject('timeout')
+            raise DetectorBusy('timeout', retry_after=max(1, int(np.ceil(self.timeout))))
+
+    def _done(self, frame, result=None, error=None):
+        with self._lock:
+            self._pending -= 1
+        if frame.future.set_running_or_notify_cancel():
+            if error is None:
+                frame.future.set_result(result)
+            else:
+                frame.future.set_exception(error)
+
+    def _decode(self, frame, data):
+        started = time.perf_counter()
+        try:
+            frame.pixels, frame.size, frame.placement = letterbox(data, self.image_size)
+        except VisionError as e:
+            self._reject('bad_image')
+            self._done(frame, error=e)
+            return
+        frame.decode_ms = (time.perf_counter() - started) * 1000
+        self._frames.put(frame)
+
+    # Batching
+
+    def _next_batch(self):
+        """Block for one frame, then take more until the batch is full or batch_wait has passed"""
+        batch = [self._frames.get()]
+        fill_by = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch:
+            remaining = fill_by - time.monotonic()
+            try:
+                batch.append(self._frames.get(timeout=remaining) if remaining > 0 else self._frames.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            now = time.monotonic()
+            live = []
+            for frame in batch:
+                if frame.future.cancelled() or now > frame.deadline:
+                    # Nobody is waiting any more; don't spend model time on it
+                    self._done(frame, error=DetectorBusy('timeout'))
+                else:
+                    live.append(frame)
+            if not live:
+                continue
+            try:
+                results = self._infer(live)
+            except Exception as e:  # A model failure fails this batch, not the service
+                print(f"⚠️ Detector batch failed: {e}")
+                for frame in live:
+                    self._done(frame, error=e)
+                continue
+            for frame, result in zip(live, results):
+                self._done(frame, result=result)
+
+    def _infer(self, frames):
+        started = time.monotonic()
+        n = len(frames)
+        pixels = self._buffer[:n]
+        for i, frame in enumerate(frames):
+            pixels[i] = frame.pixels
+        with torch.inference_mode():
+            # NHWC uint8 buffer viewed as NCHW without copying; only the float conversion allocates
+            inputs = torch.from_numpy(pixels).permute(0, 3, 1, 2).float().div_(255.0)
+            outputs = self.model(inputs)
+        if isinstance(outputs, (list, tuple)):
+            outputs = outputs[0]
+        outputs = outputs.numpy()
+        finished = time.monotonic()
+        inference_ms = (finished - started) * 1000
+
+        results = [self._detections(output, frame) for output, frame in zip(outputs, frames)]
+        with self._lock:
+            self.batches += 1
+            self.frames_done += n
+            self._batch_sizes.append(n)
+            self._inference_ms.append(inference_ms)
+            for frame, result in zip(frames, results):
+                queue_ms = (started - frame.queued_at) * 1000 - frame.decode_ms
+                total_ms = (finished - frame.queued_at) * 1000
+                result['timing_ms'] = {
+                    'decode': round(frame.decode_ms, 2),
+                    'queue': round(queue_ms, 2),
+                    'inference': round(inference_ms, 2),
+                    'total': round(total_ms, 2)
+                }
+                result['batch_size'] = n
+                self._recent.append((finished, queue_ms, total_ms))
+        return results
+
+    def _detections(self, output, frame):
+        """Boxes, sheep count and predators for one frame from the raw model output"""
+        classes = len(self.class_names)
+        if classes and output.shape[0] != 4 + classes and output.shape[1] == 4 + classes:
+            output = output.T  # Exported as (anchors, 4 + classes)
+        scores = output[4:]
+        class_ids = scores.argmax(axis=0)
+        confidence = scores[class_ids, np.arange(scores.shape[1])]
+        candidates = np.flatnonzero(confidence >= CONFIDENCE_THRESHOLD)
+
+        cx, cy, w, h = output[:4, candidates]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+        keep = candidates[non_max_suppression(boxes, confidence[candidates], class_ids[candidates])] \
+            if len(candidates) else candidates
+
+        # Back from the letterboxed square to percentages of the original frame
+        (width, height), (scale, left, top) = frame.size, frame.placement
+        detections = []
+        for anchor in keep.tolist():
+            cx, cy, w, h = output[:4, anchor].tolist()
+            x1 = min(max((cx - w / 2 - left) / scale, 0), width)
+            y1 = min(max((cy - h / 2 - top) / scale, 0), height)
+            x2 = min(max((cx + w / 2 - left) / scale, 0), width)
+            y2 = min(max((cy + h / 2 - top) / scale, 0), height)
+            class_id = int(class_ids[anchor])
+            detections.append({
+                'class': self.class_names[class_id] if class_id < classes else f'class_{class_id}',
+                'confidence': round(float(confidence[anchor]), 4),
+                'x': round(x1 / width * 100, 2),
+                'y': round(y1 / height * 100, 2),
+                'width': round((x2 - x1) / width * 100, 2),
+                'height': round((y2 - y1) / height * 100, 2)
+            })
+
+        predators = [
+            {'name': d['class'], 'confidence': d['confidence']}
+            for d in detections if d['class'] in PREDATOR_CLASSES
+        ]
+        return {
+            'camera_id': frame.camera_id,
+            'sheep_count': sum(1 for d in detections if d['class'] in SHEEP_CLASSES),
+            'predators_detected': predators,
+            'detections': detections,
+            'image_size': list(frame.size)
+        }
+
+    # Metrics
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            recent = [r for r in self._recent if now - r[0] <= THROUGHPUT_WINDOW]
+            span = max(now - recent[0][0], 1.0) if recent else 1.0
+            queue_ms = np.array([r[1] for r in recent])
+            total_ms = np.array([r[2] for r in recent])
+            inference_ms = np.array(self._inference_ms)
+            return {
+                'model_loaded': self.model is not None,
+                'model_path': self.model_path,
+                'load_error': self.load_error,
+                'classes': self.class_names,
+                'image_size': self.image_size,
+                'max_batch': self.max_batch,
+                'pending_frames': self._pending,
+                'frames': self.frames_done,
+                'batches': self.batches,
+                'mean_batch_size': round(float(np.mean(self._batch_sizes)), 2) if self._batch_sizes else None,
+                'frames_per_second': round(len(recent) / span, 3),
+                'rejected': dict(self.rejected),
+                'inference_ms_p50': round(float(np.percentile(inference_ms, 50)), 2) if len(inference_ms) else None,
+                'queue_ms_p95': round(float(np.percentile(queue_ms, 95)), 2) if len(queue_ms) else None,
+                'latency_ms_p50': round(float(np.percentile(total_ms, 50)), 2) if len(total_ms) else None,
+                'latency_ms_p99': round(float(np.percentile(total_ms, 99)), 2) if len(total_ms) else None
+            }
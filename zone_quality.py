@@ -0,0 +1,168 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+# Quality and risk categories, stored as codes into these tuples
+QUALITY_LEVELS = ('restricted', 'poor', 'fair', 'good', 'excellent')
+RISK_LEVELS = ('low', 'medium', 'high')
+RESTRICTED = 0
+NDVI_THRESHOLDS = (0.3, 0.5, 0.7)   # Lower NDVI bounds of fair, good and excellent
+RISK_BY_QUALITY = np.array([2, 2, 1, 0, 0], dtype=np.uint8)
+
+# Per-zone part of a zone quality record; the weather is shared by all zones on a date
+ZONE_DTYPE = np.dtype([
+    ('ndvi', 'f8'),
+    ('carrying_capacity', 'f8'),
+    ('quality', 'u1'),
+    ('risk', 'u1'),
+    ('accessible', '?')
+])
+ZONE_FIELD_POSITIONS = {name: i for i, name in enumerate(ZONE_DTYPE.names)}
+WEATHER_FIELDS = ('temperature', 'rainfall', 'humidity')
+FIELDS = ('ndvi', 'carrying_capacity') + WEATHER_FIELDS + ('quality', 'risk', 'accessible')
+
+
+class ZoneTable:
+    """Quality of a set of zones on one date: one structured row per zone
+
+    This is what the per-date memo holds, about 20 bytes per zone plus
+    the date's weather, instead of a dict of boxed floats per zone.
+    Indexing returns a `ZoneQuality` view; `to_dicts` builds the plain
+    dicts that go into JSON responses.
+    """
+
+    __slots__ = ('zone_ids', 'rows', 'weather')
+
+    def __init__(self, zone_ids, ndvi, carrying_capacity, accessible, flooded, weather):
+        """`accessible` is the vegetation flag and `flooded` marks flood-prone zones under heavy rain"""
+        self.zone_ids = tuple(np.asarray(zone_ids, dtype=np.int64).tolist())
+        self.weather = tuple(float(weather[name]) for name in WEATHER_FIELDS)
+
+        rows = np.empty(len(self.zone_ids), dtype=ZONE_DTYPE)
+        rows['ndvi'] = ndvi
+        rows['carrying_capacity'] = carrying_capacity
+        restricted = ~np.asarray(accessible, dtype=bool) | np.asarray(flooded, dtype=bool)
+        quality = np.searchsorted(NDVI_THRESHOLDS, rows['ndvi'], side='right') + 1
+        rows['quality'] = np.where(restricted, RESTRICTED, quality)
+        rows['risk'] = RISK_BY_QUALITY[rows['quality']]
+        rows['accessible'] = ~restricted
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.zone_ids)
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self.zone_ids):
+            raise IndexError(position)
+        return ZoneQuality(self, position)
+
+    def __iter__(self):
+        return (ZoneQuality(self, position) for position in range(len(self.zone_ids)))
+
+    def memory_bytes(self):
+        return self.rows.nbytes
+
+    def to_dicts(self, with_ids=True, **columns):
+        """Plain dicts per zone (with 'zone_id' unless with_ids is False), as returned by the API
+
+        Extra `columns` (one value per zone, e.g. map coordinates) are
+        added to each dict under their keyword names.
+        """
+        temperature, rainfall, humidity = self.weather
+        extra = [(name, np.asarray(values).tolist()) for name, values in columns.items()]
+        records = []
+        for position, (ndvi, capacity, quality, risk, accessible) in enumerate(self.rows.tolist()):
+            record = {
+                'ndvi': ndvi,
+                'carrying_capacity': capacity,
+                'temperature': temperature,
+                'rainfall': rainfall,
+                'humidity': humidity,
+                'quality': QUALITY_LEVELS[quality],
+                'risk': RISK_LEVELS[risk],
+                'accessible': accessible
+            }
+            if with_ids:
+                record['zone_id'] = self.zone_ids[position]
+            for name, values in extra:
+                record[name] = values[position]
+            records.append(record)
+        return records
+
+    def changes_since(self, other):
+        """Fields that differ from another table over the same zones, as dicts with 'zone_id'
+
+        Rows are compared field by field across all zones at once; only
+        the zones that changed are turned into dicts.
+        """
+        changed = {name: self.rows[name] != other.rows[name] for name in ZONE_DTYPE.names}
+        weather = [name for name, old, new in zip(WEATHER_FIELDS, other.weather, self.weather) if old != new]
+        if weather:
+            zones = np.arange(len(self.zone_ids))
+        else:
+            zones = np.flatnonzero(np.logical_or.reduce(list(changed.values())))
+
+        changes = []
+        for position in zones.tolist():
+            zone = self[position]
+            record = {
+                name: zone[name] for name in FIELDS
+                if name in weather or (name in changed and changed[name][position])
+            }
+            record['zone_id'] = zone['zone_id']
+            changes.append(record)
+        return changes
+
+
+class ZoneQuality(Mapping):
+    """Read-only view of one zone's row in a `ZoneTable`, usable like the record dict"""
+
+    __slots__ = ('_table', '_position', '_row')
+
+    def __init__(self, table, position):
+        self._table = table
+        self._position = position
+        # The row as one tuple of Python values, without a numpy scalar per field
+        self._row = table.rows.item(position)
+
+    def __getitem__(self, key):
+        if key in WEATHER_FIELDS:
+            return self._table.weather[WEATHER_FIELDS.index(key)]
+        if key == 'zone_id':
+            return self._table.zone_ids[self._position]
+        field = ZONE_FIELD_POSITIONS.get(key)
+        if field is None:
+            raise KeyError(key)
+        value = self._row[field]
+        if key == 'quality':
+            return QUALITY_LEVELS[value]
+        if key == 'risk':
+            return RISK_LEVELS[value]
+        return value
+
+    def __iter__(self):
+        return iter(FIELDS + ('zone_id',))
+
+    def to_dict(self, with_id=True):
+        """A plain, mutable copy of the record"""
+        ndvi, capacity, quality, risk, accessible = self._row
+        temperature, rainfall, humidity = self._table.weather
+        record = {
+            'ndvi': ndvi,
+            'carrying_capacity': capacity,
+            'temperature': temperature,
+            'rainfall': rainfall,
+            'humidity': humidity,
+            'quality': QUALITY_LEVELS[quality],
+            'risk': RISK_LEVELS[risk],
+            'accessible': accessible
+        }
+        if with_id:
+            record['zone_id'] = self._table.zone_ids[self._position]
+        return record
+
+    def __len__(self):
+        return len(FIELDS) + 1
+
+    def __repr__(self):
+        return f"ZoneQuality({dict(self)!r})"